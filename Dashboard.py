@@ -51,100 +51,94 @@ st.markdown(header_html, unsafe_allow_html=True)
 # -------------------------------------------------------
 # FIXED SIDEBAR MENU USING SESSION STATE
 # -------------------------------------------------------
+# The menu items are Streamlit buttons: a click runs a callback that switches
+# active_tab in place, so session state survives (no page reload).
 sidebar_html = """
     <style>
-        .side-menu {
+        .st-key-side_menu {
             position: fixed;
             top: 60px;
             left: 0;
             width: 180px;
             height: 100%;
             background-color: #f4f7fb;
-            padding-top: 20px;
+            padding: 20px 10px 0 10px;
             border-right: 1px solid #ddd;
+            z-index: 998;
         }
-        .menu-item {
-            padding: 12px 18px;
-            margin: 4px 10px;
+        .st-key-side_menu button {
+            justify-content: flex-start;
             font-size: 16px;
             font-weight: 600;
-            color: #333;
+            border: none;
             border-radius: 6px;
-            cursor: pointer;
         }
-        .menu-item:hover {
+        .st-key-side_menu button[kind="secondary"] {
+            background-color: transparent;
+            color: #333;
+        }
+        .st-key-side_menu button[kind="secondary"]:hover {
             background-color: #e5e9f1;
         }
-        .menu-active {
+        .st-key-side_menu button[kind="primary"] {
             background-color: #2c6bed;
-            color: white !important;
+            color: white;
         }
     </style>
 """
 st.markdown(sidebar_html, unsafe_allow_html=True)
 
-# SIDEBAR MENU ITEMS
-menu_container = st.container()
-
-with menu_container:
-    st.markdown(
-        f"""
-        <div class="side-menu">
-            <div class="menu-item {'menu-active' if st.session_state.active_tab=='Dashboard' else ''}"
-                 onclick="window.location.href='?clicked=Dashboard'">
-                Dashboard
-            </div>
-
-            <div class="menu-item {'menu-active' if st.session_state.active_tab=='Reports' else ''}"
-                 onclick="window.location.href='?clicked=Reports'">
-                Reports
-            </div>
-
-            <div class="menu-item {'menu-active' if st.session_state.active_tab=='Settings' else ''}"
-                 onclick="window.location.href='?clicked=Settings'">
-                Settings
-            </div>
-        </div>
-        """,
-        unsafe_allow_html=True
-    )
+tab_names = ["Dashboard", "Reports", "Settings"]
 
-# -------------------------------------------------------
-# HANDLE MENU CLICK
-# -------------------------------------------------------
+
+def select_tab(name):
+    st.session_state.active_tab = name
+
+
+# Old ?clicked=<tab> links still open the right view
 params = st.query_params
-if "clicked" in params:
+if params.get("clicked") in tab_names:
     st.session_state.active_tab = params["clicked"]
-    # Clear parameters so URL stays clean
     st.query_params.clear()
 
+# SIDEBAR MENU ITEMS
+with st.container(key="side_menu"):
+    for name in tab_names:
+        st.button(
+            name,
+            key=f"menu_{name}",
+            on_click=select_tab,
+            args=(name,),
+            type="primary" if st.session_state.active_tab == name else "secondary",
+            width="stretch",
+        )
+
+
 # -------------------------------------------------------
 # MAIN CONTENT CONTROLLED BY ACTIVE TAB
 # -------------------------------------------------------
-st.markdown("<div class='content'>", unsafe_allow_html=True)
+# Only the active view's function runs on a rerun.
+def dashboard_view():
+    st.header("📊 Dashboard")
+    a, b = st.tabs(["Production", "Quality"])
+    a.write("Production KPIs...")
+    b.write("Quality KPIs...")
 
-tab_names = ["Dashboard", "Reports", "Settings"]
 
-# Select correct tab index
-tab_index = tab_names.index(st.session_state.active_tab)
+def reports_view():
+    st.header("📁 Reports")
+    st.write("Report listing...")
+
 
-tabs = st.tabs(tab_names)
+def settings_view():
+    st.header("⚙️ Settings")
+    st.write("System configuration...")
 
-with tabs[0]:
-    if st.session_state.active_tab == "Dashboard":
-        st.header("📊 Dashboard")
-        a, b = st.tabs(["Production", "Quality"])
-        a.write("Production KPIs...")
-        b.write("Quality KPIs...")
 
-with tabs[1]:
-    if st.session_state.active_tab == "Reports":
-        st.header("📁 Reports")
-        st.write("Report listing...")
+views = {"Dashboard": dashboard_view, "Reports": reports_view, "Settings": settings_view}
+
+st.markdown("<div class='content'>", unsafe_allow_html=True)
 
-with tabs[2]:
-    if st.session_state.active_tab == "Settings":
-        st.header("⚙️ Settings")
-        st.write("System configuration...")
+views[st.session_state.active_tab]()
 
 st.markdown("</div>", unsafe_allow_html=True)
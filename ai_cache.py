@@ -0,0 +1,235 @@
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import tracing
+from ai_stream import chunk_text, fake_chunks
+
+# ---------------- GEMINI RESPONSE CACHE ----------------
+# A small SQLite-backed LRU + TTL cache shared by every session (and every process)
+# using the same file. Keys combine the call type, model name, a hash of the prompt
+# and any extra config that should invalidate a response (e.g. the expiry date).
+
+DEFAULT_PATH = os.environ.get("AI_CACHE_PATH", os.path.join(".market_cache", "ai_responses.sqlite3"))
+
+# Seconds a response stays fresh, per call type
+DEFAULT_TTLS = {
+    "sentiment": 60 * 60,
+    "vix": 15 * 60,
+    "report": 6 * 60 * 60,
+}
+
+
+def make_key(kind, model_name, prompt, **config):
+    """Stable cache key for a model call."""
+    payload = json.dumps(
+        {
+            "kind": kind,
+            "model": model_name,
+            "prompt": hashlib.sha256(prompt.encode("utf-8")).hexdigest(),
+            "config": {k: str(v) for k, v in sorted(config.items())},
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Disk-backed LRU + TTL store for model responses, with hit/miss counters."""
+
+    def __init__(self, path=DEFAULT_PATH, max_entries=500, ttls=None, clock=time.time):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._stats = {}
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, kind TEXT, model TEXT, text TEXT,"
+                " created REAL, last_access REAL)"
+            )
+
+    @contextlib.contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=10)
+        try:
+            with db:  # commits on success, rolls back on error
+                yield db
+        finally:
+            db.close()
+
+    def _count(self, kind, field):
+        with self._lock:
+            counters = self._stats.setdefault(kind, {"hits": 0, "misses": 0, "refreshes": 0})
+            counters[field] += 1
+
+    def get(self, key, kind):
+        """Cached text for `key`, or None if missing or older than the TTL for `kind`."""
+        now = self.clock()
+        with self._connect() as db:
+            row = db.execute("SELECT text, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] <= self.ttls.get(kind, 0):
+                db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+                self._count(kind, "hits")
+                return row[0]
+            if row is not None:
+                db.execute("DELETE FROM responses WHERE key = ?", (key,))
+        self._count(kind, "misses")
+        return None
+
+    def put(self, key, kind, model_name, text):
+        """Store a response and evict the least recently used entries past `max_entries`."""
+        now = self.clock()
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO responses (key, kind, model, text, created, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, kind, model_name, text, now, now),
+            )
+            db.execute(
+                "DELETE FROM responses WHERE key IN ("
+                " SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def note_refresh(self, kind):
+        self._count(kind, "refreshes")
+
+    def clear(self):
+        with self._connect() as db:
+            db.execute("DELETE FROM responses")
+
+    def size(self):
+        with self._connect() as db:
+            return db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def stats(self):
+        """Per call type hit/miss/refresh counters for this process."""
+        with self._lock:
+            return {kind: dict(counters) for kind, counters in self._stats.items()}
+
+
+# ---------------- MODELS ----------------
+def genai_model_factory(model_name):
+    import google.generativeai as genai
+
+    return genai.GenerativeModel(model_name)
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModel:
+    """
+    Offline stand-in for `genai.GenerativeModel`.
+
+    `responses` is a fixed string, a callable(prompt) -> str, or a dict whose first
+    key found in the prompt selects the reply. Every prompt is recorded in `calls`.
+    """
+
+    def __init__(self, responses="50", delay=0.0, chunk_size=40):
+        self.responses = responses
+        self.delay = delay
+        self.chunk_size = chunk_size
+        self.calls = []
+
+    def _reply(self, prompt):
+        if callable(self.responses):
+            return self.responses(prompt)
+        if isinstance(self.responses, dict):
+            for needle, text in self.responses.items():
+                if needle in prompt:
+                    return text
+            return ""
+        return self.responses
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        self.calls.append(prompt)
+        if stream:
+            # With streaming, `delay` is paid per chunk instead of once
+            return fake_chunks(self._reply(prompt), self.chunk_size, self.delay)
+        if self.delay:
+            time.sleep(self.delay)
+        return StubResponse(self._reply(prompt))
+
+
+def stub_model_factory(responses="50", delay=0.0, chunk_size=40):
+    """Model factory that hands out one shared StubModel (inspect it via `.model`)."""
+    model = StubModel(responses, delay, chunk_size)
+
+    def factory(model_name):
+        return model
+
+    factory.model = model
+    return factory
+
+
+def generate_cached(cache, kind, model_name, prompt, key_config=None, force_refresh=False,
+                    model_factory=genai_model_factory):
+    """
+    Return the model's text for `prompt`, served from `cache` while it is fresh.
+    `force_refresh` skips the lookup but still stores the new response.
+    Model errors propagate to the caller; empty responses are not cached.
+    """
+    with tracing.span(f"gemini.{kind}", "external", model=model_name) as sp:
+        key = make_key(kind, model_name, prompt, **(key_config or {}))
+        if force_refresh:
+            cache.note_refresh(kind)
+            sp.set(cache="refresh")
+        else:
+            cached = cache.get(key, kind)
+            if cached is not None:
+                return sp.set(cache="hit").result(cached)
+            sp.set(cache="miss")
+
+        resp = model_factory(model_name).generate_content(prompt)
+        text = resp.text or ""
+        if text.strip():
+            cache.put(key, kind, model_name, text)
+        return sp.result(text)
+
+
+def stream_cached(cache, kind, model_name, prompt, key_config=None, force_refresh=False,
+                  model_factory=genai_model_factory):
+    """
+    Streaming variant of `generate_cached`: yields text chunks as they arrive.
+    A cache hit yields the stored text as a single chunk. The full text is cached
+    only if the stream completes.
+    """
+    with tracing.span(f"gemini.{kind}", "external", model=model_name, stream=True) as sp:
+        key = make_key(kind, model_name, prompt, **(key_config or {}))
+        if force_refresh:
+            cache.note_refresh(kind)
+            sp.set(cache="refresh")
+        else:
+            cached = cache.get(key, kind)
+            if cached is not None:
+                sp.set(cache="hit").result(cached)
+                yield StubResponse(cached)
+                return
+            sp.set(cache="miss")
+
+        parts = []
+        started = time.perf_counter()
+        for chunk in model_factory(model_name).generate_content(prompt, stream=True):
+            text = chunk_text(chunk)
+            if text:
+                if not parts:
+                    sp.set(first_chunk_ms=round((time.perf_counter() - started) * 1000, 3))
+                parts.append(text)
+                yield chunk
+        text = "".join(parts)
+        sp.set(chunks=len(parts)).result(text)
+        if text.strip():
+            cache.put(key, kind, model_name, text)
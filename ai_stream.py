@@ -0,0 +1,87 @@
+import contextvars
+import threading
+import time
+
+# ---------------- STREAMED AI REPORT ----------------
+# A ReportStream drains a chunk iterator on a daemon thread and keeps the text
+# received so far. It lives in session_state, so a Streamlit rerun just picks up the
+# partial text again instead of discarding the request. The thread runs in a copy of
+# the creator's context, so the stream is traced as part of the run that started it.
+
+
+def chunk_text(chunk):
+    """Text of a streamed response chunk ('' for chunks without text parts)."""
+    try:
+        return chunk.text or ""
+    except (AttributeError, ValueError):
+        return ""
+
+
+class ReportStream:
+    """Consume `chunks` in the background; read `.text` at any time."""
+
+    def __init__(self, chunks, fallback_text=""):
+        self.fallback_text = fallback_text
+        self.started_at = time.perf_counter()
+        self.first_chunk_at = None
+        self.finished_at = None
+        self.error = None
+        self._parts = []
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=contextvars.copy_context().run, args=(self._drain, chunks),
+                                        daemon=True)
+        self._thread.start()
+
+    def _drain(self, chunks):
+        try:
+            for chunk in chunks:
+                text = chunk_text(chunk)
+                if not text:
+                    continue
+                with self._lock:
+                    if self.first_chunk_at is None:
+                        self.first_chunk_at = time.perf_counter()
+                    self._parts.append(text)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.finished_at = time.perf_counter()
+            self._done.set()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    @property
+    def text(self):
+        """Text received so far (the full report once `done`)."""
+        with self._lock:
+            return "".join(self._parts)
+
+    @property
+    def time_to_first_token(self):
+        if self.first_chunk_at is None:
+            return None
+        return self.first_chunk_at - self.started_at
+
+    def result(self):
+        """Final text; the fallback if the stream failed before producing anything."""
+        text = self.text.strip()
+        return text if text else self.fallback_text
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+
+def fake_chunks(text, chunk_size=40, delay=0.0):
+    """Yield `text` in chunk objects shaped like Gemini's streamed responses."""
+    for i in range(0, len(text), chunk_size):
+        if delay:
+            time.sleep(delay)
+        yield _FakeChunk(text[i:i + chunk_size])
+
+
+class _FakeChunk:
+    def __init__(self, text):
+        self.text = text
@@ -0,0 +1,208 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import tracing
+
+# ---------------- VECTORIZED BACKTEST ----------------
+# Everything (positions, costs, equity, drawdown, metrics, trade list) is computed in
+# one pass over NumPy views of the input columns; the input frame is never copied.
+# Results are memoized by a hash of the data and parameters, so Streamlit reruns
+# (switching tabs, moving a slider back) reuse earlier work. Each result holds several
+# n-length arrays, so the memo is bounded by their total size as well as by count.
+
+_MEMO_SIZE = 32
+_MEMO_BYTES = 256 * 2**20
+_memo = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+class BacktestResult:
+    """Arrays and summary metrics for one backtest run."""
+
+    def __init__(self, returns, position, strategy, equity, buy_hold, drawdown, trades, metrics):
+        self.returns = returns
+        self.position = position
+        self.strategy = strategy
+        self.equity = equity
+        self.buy_hold = buy_hold
+        self.drawdown = drawdown
+        self.trades = trades
+        self.metrics = metrics
+
+    @property
+    def total_return(self):
+        return self.metrics["total_return"]
+
+    @property
+    def nbytes(self):
+        """Memory held by the result's arrays and trade list."""
+        arrays = (self.returns, self.position, self.strategy, self.equity, self.buy_hold, self.drawdown)
+        size = sum(np.asarray(a).nbytes for a in arrays)
+        if isinstance(self.trades, pd.DataFrame):
+            size += int(self.trades.memory_usage(index=True).sum())
+        return size
+
+    def curves(self, dates=None):
+        """Equity, buy-and-hold and drawdown as a DataFrame (for charts)."""
+        return pd.DataFrame(
+            {"Strategy Returns": self.equity, "Buy & Hold Returns": self.buy_hold, "Drawdown": self.drawdown},
+            index=pd.DatetimeIndex(dates, name="Date") if dates is not None else None,
+        )
+
+
+def simple_returns(close):
+    """Bar-to-bar returns with 0 on the first bar and on gaps."""
+    close = np.asarray(close, dtype=np.float64)
+    returns = np.zeros(close.shape)
+    if close.shape[-1] > 1:
+        np.divide(close[..., 1:], close[..., :-1], out=returns[..., 1:])
+        returns[..., 1:] -= 1.0
+    returns[~np.isfinite(returns)] = 0.0
+    return returns
+
+
+def positions_from_signals(signal, hold=False):
+    """
+    Position held on each bar: the previous bar's signal (BUY=1, SELL=-1, HOLD=0).
+    With `hold`, a position is kept until the opposite signal instead of for one bar.
+    """
+    signal = np.asarray(signal, dtype=np.int8)
+    position = np.zeros(signal.shape, dtype=np.int8)
+    position[..., 1:] = signal[..., :-1]
+    if hold:
+        # Forward-fill non-zero positions along the bar axis
+        idx = np.where(position != 0, np.arange(position.shape[-1]), 0)
+        np.maximum.accumulate(idx, axis=-1, out=idx)
+        position = np.take_along_axis(position, idx, axis=-1)
+    return position
+
+
+def _trade_list(position, equity, dates):
+    """One row per run of constant non-zero position."""
+    change = np.flatnonzero(np.diff(position, prepend=0, append=0))
+    starts, ends = change[:-1], change[1:]
+    side = position[starts] if len(starts) else np.array([], dtype=np.int8)
+    keep = side != 0
+    starts, ends, side = starts[keep], ends[keep], side[keep]
+    if len(starts) == 0:
+        return pd.DataFrame(columns=["Entry", "Exit", "Side", "Bars", "Return"])
+    before = np.where(starts > 0, equity[np.maximum(starts - 1, 0)], 1.0)
+    trade_returns = equity[ends - 1] / before - 1.0
+    labels = dates if dates is not None else np.arange(len(position))
+    return pd.DataFrame({
+        "Entry": labels[starts],
+        "Exit": labels[ends - 1],
+        "Side": np.where(side > 0, "LONG", "SHORT"),
+        "Bars": ends - starts,
+        "Return": trade_returns,
+    })
+
+
+def annualized_ratio(mean, dev, periods_per_year):
+    """Sharpe/Sortino-style ratio of per-bar mean and deviation, annualized (NaN for no deviation)."""
+    return mean / dev * np.sqrt(periods_per_year) if dev > 0 else np.nan
+
+
+def run_backtest(close, signal, dates=None, cost_bps=0.0, slippage_bps=0.0, hold=False,
+                 periods_per_year=252):
+    """
+    Backtest int8 signal codes against close prices.
+
+    Costs and slippage (basis points) are charged on every unit of position change.
+    Returns a BacktestResult; with zero costs `total_return` equals the legacy
+    `(1 + returns * position).cumprod()[-1] - 1`.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    n = len(close)
+    returns = simple_returns(close)
+
+    position = positions_from_signals(signal, hold)
+    turnover = np.abs(np.diff(position, prepend=0).astype(np.float64))
+    costs = turnover * (cost_bps + slippage_bps) / 1e4
+    strategy = returns * position - costs
+
+    equity = np.cumprod(1.0 + strategy)
+    buy_hold = np.cumprod(1.0 + returns)
+    peak = np.maximum.accumulate(equity) if n else equity
+    drawdown = equity / peak - 1.0 if n else equity
+
+    trades = _trade_list(position, equity, None if dates is None else np.asarray(dates))
+    downside = strategy[strategy < 0]
+    metrics = {
+        "total_return": equity[-1] - 1.0 if n else 0.0,
+        "buy_hold_return": buy_hold[-1] - 1.0 if n else 0.0,
+        "max_drawdown": drawdown.min() if n else 0.0,
+        "sharpe": annualized_ratio(strategy.mean(), strategy.std(), periods_per_year) if n else np.nan,
+        "sortino": annualized_ratio(strategy.mean(),
+                                    np.sqrt(np.mean(downside ** 2)) if len(downside) else 0.0,
+                                    periods_per_year) if n else np.nan,
+        "volatility": strategy.std() * np.sqrt(periods_per_year) if n else np.nan,
+        "trades": len(trades),
+        "win_rate": (trades["Return"] > 0).mean() if len(trades) else np.nan,
+        "exposure": np.mean(position != 0) if n else 0.0,
+        "total_costs": costs.sum(),
+    }
+    return BacktestResult(returns, position, strategy, equity, buy_hold, drawdown, trades, metrics)
+
+
+def batch_metrics(returns, signals, cost_bps=0.0, slippage_bps=0.0, hold=False, periods_per_year=252):
+    """
+    Headline metrics for many signal sets at once.
+    `signals` is a (k, n) int8 matrix over the same (n,) `returns`; returns a dict of
+    (k,) arrays: total_return, sharpe, max_drawdown, trades, exposure.
+    """
+    position = positions_from_signals(np.atleast_2d(signals), hold)
+    changed = np.diff(position, axis=1, prepend=0) != 0
+    strategy = returns * position
+    strategy -= np.abs(np.diff(position, axis=1, prepend=0)) * ((cost_bps + slippage_bps) / 1e4)
+    equity = np.cumprod(1.0 + strategy, axis=1)
+    drawdown = equity / np.maximum.accumulate(equity, axis=1) - 1.0
+    mean, std = strategy.mean(axis=1), strategy.std(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe = np.where(std > 0, mean / std * np.sqrt(periods_per_year), np.nan)
+    return {
+        "total_return": equity[:, -1] - 1.0,
+        "sharpe": sharpe,
+        "max_drawdown": drawdown.min(axis=1),
+        "trades": (changed & (position != 0)).sum(axis=1),
+        "exposure": (position != 0).mean(axis=1),
+    }
+
+
+# ---------------- MEMOIZATION ----------------
+def fingerprint(*arrays, **params):
+    """Hex digest of the arrays' dtype, shape and bytes plus the parameters (None is allowed)."""
+    h = hashlib.blake2b(digest_size=16)
+    for a in arrays:
+        if a is None:
+            h.update(b"none")
+            continue
+        a = np.ascontiguousarray(a)
+        h.update(str((a.dtype, a.shape)).encode())
+        h.update(memoryview(a).cast("B"))
+    h.update(repr(sorted(params.items())).encode())
+    return h.hexdigest()
+
+
+def cached_backtest(close, signal, dates=None, **params):
+    """`run_backtest` memoized on the content of the inputs and the parameters."""
+    date_values = None if dates is None else np.asarray(dates).astype("datetime64[ns]").view(np.int64)
+    key = fingerprint(close, signal, date_values, **params)
+    with _memo_lock:
+        if key in _memo:
+            _memo.move_to_end(key)
+            tracing.annotate(cache="hit")
+            return _memo[key]
+    tracing.annotate(cache="miss")
+    result = run_backtest(close, signal, dates, **params)
+    with _memo_lock:
+        _memo[key] = result
+        total = sum(r.nbytes for r in _memo.values())
+        # The newest result is always kept, even on its own over the byte budget
+        while len(_memo) > 1 and (len(_memo) > _MEMO_SIZE or total > _MEMO_BYTES):
+            total -= _memo.popitem(last=False)[1].nbytes
+    return result
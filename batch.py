@@ -0,0 +1,166 @@
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_hub import build_hub
+from engine import EngineConfig, run_universe
+from feature_store import FeatureStore
+from india_vix import VixHistory, india_vix
+from option_chain import ChainFeed, SnapshotStore, total_pcr
+from portfolio import WEIGHTINGS, backtest_universe
+from price_store import PriceStore
+from universe import full_universe, nse_indices, nse_largecaps
+
+# ---------------- HEADLESS BATCH RUNNER ----------------
+# Runs the analysis engine over a whole universe without Streamlit, e.g. from cron
+# after the close:
+#   python batch.py --universe all --workers 4 --out batch_results
+# Writes summary.{parquet,json}, one signals/<ticker> file per symbol and run.json
+# (the config and the AI/VIX/PCR values used), into a timestamped run directory.
+# With --portfolio, also portfolio_{curves,weights,symbols} for the whole universe
+# traded as one portfolio, and its metrics in run.json.
+
+UNIVERSES = {"all": full_universe, "indices": lambda: nse_indices, "largecaps": lambda: nse_largecaps}
+log = logging.getLogger("batch")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run fetch -> indicators -> signals -> backtest for a universe.")
+    parser.add_argument("--universe", choices=sorted(UNIVERSES), default="all")
+    parser.add_argument("--symbols", nargs="+", metavar="TICKER", help="Explicit tickers instead of --universe.")
+    parser.add_argument("--start", default=None, help="Start date (default: config or 2023-01-01).")
+    parser.add_argument("--end", default=None, help="Exclusive end date (default: today).")
+    parser.add_argument("--config", help="JSON file of EngineConfig fields (thresholds, costs, ...).")
+    parser.add_argument("--interval", help="Download interval, e.g. 1d or 1h (default: config or 1d).")
+    parser.add_argument("--timeframe", help="Resample to this timeframe (5m/15m/1h/1d/1wk) before the signals.")
+    parser.add_argument("--confirm-timeframe", help="Keep only signals agreeing with this timeframe's EMA20 trend.")
+    parser.add_argument("--workers", type=int, default=None, help="Processes for the analysis (default: CPUs).")
+    parser.add_argument("--out", default="batch_results", help="Directory for the run's output.")
+    parser.add_argument("--format", choices=["parquet", "json"], default="parquet")
+    parser.add_argument("--ai", type=float, default=np.nan, help="AI sentiment for the latest bar.")
+    parser.add_argument("--vix", type=float, default=np.nan, help="India VIX for the latest bar.")
+    parser.add_argument("--pcr", type=float, default=np.nan, help="PCR for the latest bar.")
+    parser.add_argument("--market-features", action="store_true",
+                        help="Compute VIX and PCR from the live NIFTY option chain (unless given).")
+    parser.add_argument("--portfolio", choices=WEIGHTINGS,
+                        help="Also backtest the universe as one portfolio with this weighting.")
+    parser.add_argument("--max-weight", type=float, default=None, help="Cap per position, e.g. 0.1.")
+    parser.add_argument("--vol-lookback", type=int, default=20, help="Bars of returns for volatility weights.")
+    parser.add_argument("--offline", action="store_true", help="Synthetic prices instead of Yahoo Finance.")
+    parser.add_argument("--chain-recording", default=os.environ.get("OPTION_CHAIN_RECORDING"),
+                        help="Recorded NSE option-chain JSON (file or directory) to use instead of NSE.")
+    return parser.parse_args(argv)
+
+
+def load_config(args):
+    values = {}
+    if args.config:
+        with open(args.config) as f:
+            values = json.load(f)
+    for name in ("start", "end", "interval", "timeframe", "confirm_timeframe"):
+        if getattr(args, name):
+            values[name] = getattr(args, name)
+    return EngineConfig.from_dict(values)
+
+
+def market_features(hub, vix, pcr):
+    """VIX and PCR from the NIFTY chain where not given; failures leave NaN (neutral)."""
+    try:
+        chain = ChainFeed(hub.option_chain, SnapshotStore()).get("NIFTY")
+    except Exception as e:
+        log.warning("Option chain unavailable (%s); VIX/PCR left neutral.", e)
+        return vix, pcr
+    if np.isnan(vix):
+        try:
+            record = india_vix(chain)
+            VixHistory().append(record)
+            vix = round(float(record["VIX"]), 2)
+        except ValueError as e:
+            log.warning("India VIX could not be computed (%s).", e)
+    if np.isnan(pcr):
+        pcr = total_pcr(chain)
+    return vix, pcr
+
+
+def write_table(df, path, fmt):
+    if fmt == "parquet":
+        df.to_parquet(path + ".parquet", index=False)
+    else:
+        df.to_json(path + ".json", orient="records", date_format="iso", indent=1)
+
+
+def write_results(out_dir, fmt, summary, frames, meta, portfolio=None):
+    os.makedirs(os.path.join(out_dir, "signals"), exist_ok=True)
+    write_table(summary, os.path.join(out_dir, "summary"), fmt)
+    if portfolio is not None:
+        write_table(portfolio.curves().reset_index(), os.path.join(out_dir, "portfolio_curves"), fmt)
+        write_table(portfolio.weights_frame().rename_axis("Date").reset_index(),
+                    os.path.join(out_dir, "portfolio_weights"), fmt)
+        write_table(portfolio.symbol_summary(), os.path.join(out_dir, "portfolio_symbols"), fmt)
+    for ticker, frame in frames.items():
+        if frame.empty:
+            continue
+        name = re.sub(r"[^A-Za-z0-9_.-]", "_", ticker)
+        if fmt == "parquet":
+            frame.to_parquet(os.path.join(out_dir, "signals", name + ".parquet"), index=False)
+        else:
+            frame.astype({"signal": str}).to_json(os.path.join(out_dir, "signals", name + ".json"),
+                                                  orient="records", date_format="iso")
+    with open(os.path.join(out_dir, "run.json"), "w") as f:
+        json.dump(meta, f, indent=1, default=str)
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    args = parse_args(argv)
+    config = load_config(args)
+    universe = {s: s for s in args.symbols} if args.symbols else UNIVERSES[args.universe]()
+
+    hub = build_hub(offline=args.offline, chain_recording=args.chain_recording)
+    store = PriceStore(config.price_dir, downloader=hub.history)
+    vix, pcr = args.vix, args.pcr
+    if args.market_features:
+        vix, pcr = market_features(hub, vix, pcr)
+
+    started = time.perf_counter()
+    summary, frames = run_universe(universe, config, ai=args.ai, vix=vix, pcr=pcr, workers=args.workers,
+                                   batch_downloader=hub.batch_history, store=store)
+    elapsed = time.perf_counter() - started
+
+    # Record what the latest bar used, so later point-in-time runs see it too
+    values = {"ai": args.ai, "vix": vix, "pcr": pcr}
+    if any(not np.isnan(v) for v in values.values()):
+        features = FeatureStore(config.feature_dir)
+        for ticker in universe.values():
+            features.record(ticker, **{k: None if np.isnan(v) else v for k, v in values.items()})
+
+    portfolio = None
+    if args.portfolio:
+        try:
+            portfolio = backtest_universe(frames, weighting=args.portfolio, max_weight=args.max_weight,
+                                          vol_lookback=args.vol_lookback, **config.backtest_params)
+        except ValueError as e:
+            log.warning("Portfolio backtest skipped: %s", e)
+
+    out_dir = os.path.join(args.out, pd.Timestamp.now().strftime("%Y%m%dT%H%M%S"))
+    meta = {"config": config.to_dict(), "features": values, "symbols": len(universe),
+            "elapsed_seconds": round(elapsed, 3), "status": summary["Status"].value_counts().to_dict()}
+    if portfolio is not None:
+        meta["portfolio"] = {"weighting": args.portfolio, "max_weight": args.max_weight,
+                             "vol_lookback": args.vol_lookback, **portfolio.metrics}
+        log.info("Portfolio (%s): total return %.2f%%, max drawdown %.2f%%", args.portfolio,
+                 100 * portfolio.total_return, 100 * portfolio.metrics["max_drawdown"])
+    write_results(out_dir, args.format, summary, frames, meta, portfolio)
+    log.info("Analysed %d symbols in %.2fs -> %s (%s)", len(universe), elapsed, out_dir, meta["status"])
+    return 0 if (summary["Status"] != "missing").any() else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,240 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import backtest_engine  # noqa: E402
+from backtest_engine import run_backtest  # noqa: E402
+from engine import Engine, EngineConfig, add_indicators, apply_signals  # noqa: E402
+from feature_store import FeatureStore  # noqa: E402
+from signal_engine import DEFAULT_THRESHOLDS, signal_codes  # noqa: E402
+
+# ---------------- BENCHMARK SUITE ----------------
+# Times each analysis stage (indicators, signals, backtest) and the whole engine
+# pipeline on synthetic OHLCV with fake AI/VIX/PCR, and records peak traced memory.
+# Fully offline: no yfinance, NSE or Gemini.
+#
+#   python benchmarks/bench.py --save baseline            # writes baselines/baseline.json
+#   python benchmarks/bench.py --compare baseline         # exit 1 on a regression
+#   python benchmarks/bench.py --sizes 1k 100k --repeats 3
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+DEFAULT_SIZES = ["1k", "100k", "1M", "10M"]
+STAGES = ["indicators", "signals", "backtest", "pipeline"]
+FEATURE_EVERY = 390  # one fake AI/VIX/PCR record per 390 bars (a trading day of minutes)
+
+
+def parse_size(text):
+    text = text.strip().lower()
+    scale = {"k": 10**3, "m": 10**6}.get(text[-1], 1)
+    return int(float(text.rstrip("km")) * scale)
+
+
+def synthetic_ohlcv(rows, seed=0):
+    """Minute bars from 2000-01-03 as a random walk, in the engine's frame layout."""
+    rng = np.random.default_rng(seed)
+    close = 100.0 * np.exp(np.cumsum(rng.normal(0.0, 0.001, rows)))
+    open_ = np.r_[close[:1], close[:-1]]
+    spread = np.abs(rng.normal(0.0, 0.0005, rows)) * close
+    return pd.DataFrame({
+        "Date": pd.date_range("2000-01-03", periods=rows, freq="min"),
+        "Open": open_,
+        "High": np.maximum(open_, close) + spread,
+        "Low": np.minimum(open_, close) - spread,
+        "Close": close,
+        "Volume": rng.integers(10**3, 10**5, rows).astype(np.float64),
+    })
+
+
+def fake_features(dates, seed=1):
+    """Per-bar AI/VIX/PCR arrays plus the same values as feature-store records."""
+    rng = np.random.default_rng(seed)
+    stamps = dates.iloc[::FEATURE_EVERY].reset_index(drop=True)
+    records = pd.DataFrame({
+        "Timestamp": stamps,
+        "ai": rng.uniform(30, 80, len(stamps)),
+        "vix": rng.uniform(10, 25, len(stamps)),
+        "pcr": rng.uniform(0.6, 1.5, len(stamps)),
+    })
+    per_bar = {name: np.repeat(records[name].to_numpy(), FEATURE_EVERY)[: len(dates)] for name in ("ai", "vix", "pcr")}
+    return per_bar, records
+
+
+class Case:
+    """Inputs for one size, built once and shared by every stage."""
+
+    def __init__(self, rows, feature_dir):
+        self.rows = rows
+        self.bars = synthetic_ohlcv(rows)
+        self.features, records = fake_features(self.bars["Date"])
+        self.indicators, _ = add_indicators(self.bars)
+        self.signals = apply_signals(self.indicators, DEFAULT_THRESHOLDS, features=self.features)
+        self.codes = signal_codes(self.signals["signal"])
+        self.store = FeatureStore(feature_dir)
+        self.store.record_many("BENCH", records)
+        config = EngineConfig(start=self.bars["Date"].iloc[0], end=self.bars["Date"].iloc[-1], interval="1m",
+                              point_in_time_features=True, price_dir=os.path.join(feature_dir, "prices"),
+                              feature_dir=feature_dir)
+        self.engine = Engine(config, feature_store=self.store)
+
+    def stage(self, name):
+        if name == "indicators":
+            return lambda: add_indicators(self.bars)
+        if name == "signals":
+            return lambda: apply_signals(self.indicators, DEFAULT_THRESHOLDS, features=self.features)
+        if name == "backtest":
+            return lambda: run_backtest(self.signals["Close"].to_numpy(), self.codes, self.signals["Date"].to_numpy())
+
+        def pipeline():
+            # A cold run: no incremental indicator state, no memoized backtest
+            self.engine.state_cache.clear()
+            backtest_engine._memo.clear()
+            return self.engine.analyze_frame("BENCH", self.bars, 62.0, 14.0, 1.1)
+
+        return pipeline
+
+
+def measure(fn, repeats):
+    """Best and mean wall time over `repeats` runs, then peak traced memory of one more run."""
+    times = []
+    for _ in range(repeats):
+        gc.collect()
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds": min(times), "mean_seconds": float(np.mean(times)), "peak_mb": peak / 2**20}
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    import numba
+
+    return {
+        "timestamp": pd.Timestamp.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "numba": numba.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def run(sizes, repeats, stages=STAGES):
+    results = []
+    # Compile the numba kernels first so no stage pays for JIT compilation
+    with tempfile.TemporaryDirectory() as tmp:
+        warm = Case(1000, tmp)
+        for name in stages:
+            warm.stage(name)()
+    for size in sizes:
+        rows = parse_size(size)
+        with tempfile.TemporaryDirectory() as tmp:
+            try:
+                case = Case(rows, tmp)
+            except MemoryError:
+                results.extend({"stage": name, "rows": rows, "error": "MemoryError"} for name in stages)
+                continue
+            for name in stages:
+                # Fewer repeats for the big sizes keeps a full run to a few minutes
+                n = repeats if rows <= 10**6 else 1
+                try:
+                    row = {"stage": name, "rows": rows, "repeats": n, **measure(case.stage(name), n)}
+                except MemoryError:
+                    row = {"stage": name, "rows": rows, "error": "MemoryError"}
+                results.append(row)
+                print(format_row(row), flush=True)
+            del case
+    return {"environment": environment(), "results": results}
+
+
+def format_row(row):
+    if "error" in row:
+        return f"{row['stage']:>10} {row['rows']:>10,}  {row['error']}"
+    rate = row["rows"] / row["seconds"] / 1e6 if row["seconds"] else float("inf")
+    return (f"{row['stage']:>10} {row['rows']:>10,}  {row['seconds'] * 1000:10.2f} ms  "
+            f"{rate:8.2f} Mrows/s  peak {row['peak_mb']:9.1f} MB")
+
+
+def compare(current, baseline, threshold, min_seconds=0.005):
+    """
+    Rows of (stage, rows, metric, baseline, current, ratio) for every time or memory
+    figure that grew by more than `threshold` (0.2 = 20%) over the baseline. Timings
+    under `min_seconds` in both runs are timer noise and never flagged.
+    """
+    before = {(r["stage"], r["rows"]): r for r in baseline["results"] if "error" not in r}
+    regressions = []
+    for row in current["results"]:
+        old = before.get((row["stage"], row["rows"]))
+        if old is None or "error" in row:
+            continue
+        for metric in ("seconds", "peak_mb"):
+            if metric == "seconds" and max(old[metric], row[metric]) < min_seconds:
+                continue
+            if old[metric] > 0 and row[metric] / old[metric] > 1.0 + threshold:
+                regressions.append((row["stage"], row["rows"], metric, old[metric], row[metric],
+                                    row[metric] / old[metric]))
+    return regressions
+
+
+def baseline_path(name):
+    return name if name.endswith(".json") else os.path.join(BASELINE_DIR, name + ".json")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark indicators, signals, backtest and the pipeline.")
+    parser.add_argument("--sizes", nargs="+", default=DEFAULT_SIZES, help="Row counts, e.g. 1k 100k 1M 10M.")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--repeats", type=int, default=5, help="Timed runs per stage (1 above 1M rows).")
+    parser.add_argument("--save", metavar="NAME", help="Store the results as a JSON baseline.")
+    parser.add_argument("--compare", metavar="NAME", help="Baseline to compare against.")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Flag slowdowns / memory growth above this fraction (default 0.2).")
+    parser.add_argument("--min-seconds", type=float, default=0.005,
+                        help="Ignore timings below this in both runs (default 0.005).")
+    args = parser.parse_args(argv)
+
+    report = run(args.sizes, args.repeats, args.stages)
+    if args.save:
+        path = baseline_path(args.save)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(report, f, indent=1)
+        print(f"Saved baseline to {path}")
+    if args.compare:
+        with open(baseline_path(args.compare)) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold, args.min_seconds)
+        print(f"Compared with {args.compare} ({baseline['environment'].get('commit')}, "
+              f"{baseline['environment'].get('timestamp')}): {len(regressions)} regression(s)")
+        for stage, rows, metric, old, new, ratio in regressions:
+            print(f"  REGRESSION {stage} @ {rows:,} rows: {metric} {old:.4g} -> {new:.4g} ({ratio:.2f}x)")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
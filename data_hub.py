@@ -0,0 +1,242 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import tracing
+from live import yf_intraday_source
+from option_chain import nse_source, recorded_source
+from price_store import yf_batch_downloader, yf_downloader
+from transport import FetchResult, Transport, pooled_clients
+
+# ---------------- SHARED MARKET-DATA HUB ----------------
+# One hub per process sits in front of every upstream request (Yahoo history, intraday
+# bars, NSE option chains). Identical requests share one cache entry, and a request
+# that is already in flight is joined instead of repeated (single-flight). Rate limits,
+# retries and circuit breakers live one layer down, in `transport`. Expired entries are
+# kept (until evicted) so `fetch` can fall back to them when an upstream fails.
+# Results are shared between callers and must not be mutated.
+
+# endpoint -> remote service (the transport Upstream it goes through)
+ENDPOINTS = {"history": "yahoo", "batch_history": "yahoo", "intraday": "yahoo", "option_chain": "nse"}
+DEFAULT_TTL = {"history": 60, "batch_history": 60, "intraday": 10, "option_chain": 30}  # seconds
+COUNTERS = ["hits", "misses", "coalesced", "errors", "stale"]
+
+
+def yf_upstreams():
+    """The real clients without pooling: Yahoo Finance and NSE (through nsepython)."""
+    return {
+        "history": yf_downloader,
+        "batch_history": yf_batch_downloader,
+        "intraday": yf_intraday_source,
+        "option_chain": nse_source,
+    }
+
+
+class _Call:
+    """An in-flight upstream request that later callers wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class DataHub:
+    """
+    Process-wide cache in front of the market-data upstreams. `upstreams` maps each of
+    ENDPOINTS to a callable (see `yf_upstreams`, or `Transport.wrap` over
+    `transport.pooled_clients`); pass fakes to run without network.
+    """
+
+    def __init__(self, upstreams=None, ttl=None, max_entries=512):
+        self.upstreams = dict(upstreams or yf_upstreams())
+        self.ttl = dict(DEFAULT_TTL, **(ttl or {}))
+        self.max_entries = max_entries
+        self.counters = {endpoint: dict.fromkeys(COUNTERS, 0) for endpoint in ENDPOINTS}
+        self._cache = OrderedDict()  # key -> (expires, value), least recently used first
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def request(self, endpoint, *args, refresh=False):
+        """
+        `upstreams[endpoint](*args)` through the cache. Concurrent identical requests
+        make one upstream call; its error (never cached) is raised in every caller.
+        """
+        with tracing.span(endpoint, "external", upstream=ENDPOINTS[endpoint]) as sp:
+            return sp.result(self._request(endpoint, args, refresh))
+
+    def _request(self, endpoint, args, refresh):
+        key = (endpoint, args)
+        counts = self.counters[endpoint]
+        with self._lock:
+            hit = self._cache.get(key)
+            if hit is not None and not refresh and hit[0] > time.monotonic():
+                self._cache.move_to_end(key)
+                counts["hits"] += 1
+                tracing.annotate(cache="hit")
+                return hit[1]
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+                counts["misses"] += 1
+            else:
+                counts["coalesced"] += 1
+        tracing.annotate(cache="miss" if leader else "coalesced")
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = self.upstreams[endpoint](*args)
+        except Exception as e:
+            call.error = e
+        with self._lock:
+            del self._inflight[key]
+            if call.error is None:
+                self._cache[key] = (time.monotonic() + self.ttl[endpoint], call.value)
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+            else:
+                counts["errors"] += 1
+        call.done.set()
+        if call.error is not None:
+            raise call.error
+        return call.value
+
+    def fetch(self, endpoint, *args):
+        """
+        Like `request`, but never raises: returns a FetchResult that is 'ok', 'stale'
+        (the upstream failed and an expired cached value was served) or 'missing'.
+        """
+        try:
+            return FetchResult(self.request(endpoint, *args), "ok")
+        except Exception as e:
+            with self._lock:
+                hit = self._cache.get((endpoint, args))
+                if hit is None:
+                    return FetchResult(None, "missing", e)
+                self.counters[endpoint]["stale"] += 1
+            return FetchResult(hit[1], "stale", e, age=time.monotonic() - (hit[0] - self.ttl[endpoint]))
+
+    # ---- drop-in replacements for the upstream callables ----
+    def history(self, symbol, start, end, interval="1d"):
+        """Same signature as `price_store.yf_downloader` (use as PriceStore's downloader)."""
+        return self.request("history", symbol, pd.Timestamp(start), pd.Timestamp(end), interval)
+
+    def batch_history(self, symbols, start, end, interval="1d"):
+        """Same signature as `price_store.yf_batch_downloader`."""
+        return self.request("batch_history", tuple(symbols), pd.Timestamp(start), pd.Timestamp(end), interval)
+
+    def intraday(self, symbol, period="1d", interval="1m"):
+        """Same signature as `live.yf_intraday_source`."""
+        return self.request("intraday", symbol, period, interval)
+
+    def intraday_result(self, symbol, period="1d", interval="1m"):
+        """`intraday` as a FetchResult (falls back to the last bars fetched)."""
+        return self.fetch("intraday", symbol, period, interval)
+
+    def option_chain(self, symbol, refresh=False):
+        """Same signature as `option_chain.nse_source` (use as ChainFeed's source)."""
+        return self.request("option_chain", symbol, refresh=refresh)
+
+    # ---- housekeeping ----
+    def stats(self):
+        """Counters per endpoint, as a DataFrame."""
+        with self._lock:
+            rows = {endpoint: dict(counts) for endpoint, counts in self.counters.items()}
+        df = pd.DataFrame.from_dict(rows, orient="index", columns=COUNTERS)
+        df["upstream"] = [ENDPOINTS[e] for e in df.index]
+        return df
+
+    def size(self):
+        with self._lock:
+            return len(self._cache)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+def build_hub(transport=None, offline=False, chain_recording=None):
+    """
+    The hub the app and the batch runner use: pooled clients (or synthetic bars when
+    `offline`) behind `transport`. `chain_recording` replays recorded NSE JSON
+    (a file or a directory, see `option_chain.recorded_source`) instead of calling NSE.
+    """
+    transport = transport or Transport()
+    if offline:
+        clients = synthetic_upstreams(chain_source=recorded_source(chain_recording) if chain_recording else None)
+    else:
+        clients = pooled_clients(transport.timeout)
+        if chain_recording:
+            clients["option_chain"] = recorded_source(chain_recording)
+    return DataHub(transport.wrap(clients, ENDPOINTS))
+
+
+# ---------------- OFFLINE UPSTREAMS ----------------
+def synthetic_bars(symbol, start, end, interval="1d"):
+    """Deterministic random-walk OHLCV per symbol, shaped like a yfinance download."""
+    freq = {"1d": "B", "1h": "h", "1m": "min"}.get(interval, "B")
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    if freq != "B" and end > start.normalize() + pd.Timedelta(days=1):
+        # Intraday walks restart every day, so a bar is the same whichever request covers it
+        days = pd.date_range(start.normalize(), end, freq="D", inclusive="left")
+        return pd.concat([synthetic_bars(symbol, max(day, start), min(day + pd.Timedelta(days=1), end), interval)
+                          for day in days])
+    # Walk from a fixed anchor (daily) or the day's start (intraday) so overlapping
+    # requests agree on their prices
+    anchor = pd.Timestamp("2000-01-01") if freq == "B" else start.normalize()
+    index = pd.date_range(anchor, end, freq=freq, inclusive="left", name="Date")
+    rng = np.random.default_rng((sum(map(ord, symbol)) * 1_000_003 + anchor.value // 10**9) % 2**32)
+    # One row of draws per bar, so a bar's values do not depend on how many follow it
+    draws = rng.standard_normal((len(index), 3))
+    # Intraday walks start from the previous daily close so both views line up
+    level = 100.0 if freq == "B" else synthetic_bars(symbol, anchor - pd.Timedelta(days=7), anchor)["Close"].iloc[-1]
+    close = level * np.exp(np.cumsum((0.01 if freq == "B" else 0.001) * draws[:, 0]))
+    open_ = np.r_[close[:1], close[:-1]]
+    spread = 0.005 * np.abs(draws[:, 1]) * close
+    df = pd.DataFrame({
+        "Open": open_, "High": np.maximum(open_, close) + spread, "Low": np.minimum(open_, close) - spread,
+        "Close": close, "Volume": np.round(5e5 * np.exp(0.3 * draws[:, 2])),
+    }, index=index)
+    return df[df.index >= start]
+
+
+def synthetic_upstreams(latency=0.0, chain_source=None):
+    """
+    Fake upstreams for offline runs and load tests: every call sleeps `latency`
+    seconds and returns synthetic bars. Option chains come from `chain_source`
+    (e.g. `option_chain.recorded_source(path)`) and raise without one.
+    """
+
+    def delayed(fn):
+        def call(*args, **kwargs):
+            time.sleep(latency)
+            return fn(*args, **kwargs)
+
+        return call
+
+    def batch(symbols, start, end, interval="1d"):
+        return pd.concat({s: synthetic_bars(s, start, end, interval) for s in symbols}, axis=1)
+
+    def intraday(symbol, period="1d", interval="1m"):
+        end = pd.Timestamp.now().floor("min") + pd.Timedelta(minutes=1)
+        return synthetic_bars(symbol, end - pd.Timedelta(period.replace("d", "D")), end, interval)
+
+    def no_chain(symbol):
+        raise ConnectionError("No option chain source configured for offline mode.")
+
+    return {
+        "history": delayed(synthetic_bars),
+        "batch_history": delayed(batch),
+        "intraday": delayed(intraday),
+        "option_chain": delayed(chain_source or no_chain),
+    }
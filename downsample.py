@@ -0,0 +1,154 @@
+import numpy as np
+import pandas as pd
+
+from kernels import njit
+from signal_engine import signal_codes
+
+# ---------------- CHART DOWNSAMPLING ----------------
+# Reduces a long series to about as many points as the chart has pixels before it
+# is sent to the browser. LTTB (Largest-Triangle-Three-Buckets) keeps the visual shape
+# of a price line; min/max per bucket keeps every extreme (equity, drawdown). Signal
+# markers come from the full-resolution rows and the line is forced through them, so
+# a marker always sits on it. Markers are bounded as well: past `points` of them only
+# the first bar of each run of the same signal is marked, then one per bucket.
+
+DEFAULT_POINTS = 2000
+
+
+@njit(cache=True, nogil=True)
+def _lttb(x, y, n_out):
+    n = len(x)
+    out = np.empty(n_out, np.int64)
+    out[0] = 0
+    out[n_out - 1] = n - 1
+    every = (n - 2) / (n_out - 2)
+    a = 0
+    for i in range(n_out - 2):
+        # Average of the next bucket is the third vertex of the triangle
+        avg_start = int(np.floor((i + 1) * every)) + 1
+        avg_end = min(int(np.floor((i + 2) * every)) + 1, n)
+        avg_x = 0.0
+        avg_y = 0.0
+        for j in range(avg_start, avg_end):
+            avg_x += x[j]
+            avg_y += y[j]
+        count = max(avg_end - avg_start, 1)
+        avg_x /= count
+        avg_y /= count
+
+        start = int(np.floor(i * every)) + 1
+        end = int(np.floor((i + 1) * every)) + 1
+        best = start
+        best_area = -1.0
+        for j in range(start, end):
+            area = abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a]))
+            if area > best_area:
+                best_area = area
+                best = j
+        out[i + 1] = best
+        a = best
+    return out
+
+
+@njit(cache=True, nogil=True)
+def _minmax(y, n_buckets):
+    n = len(y)
+    out = np.empty(2 * n_buckets, np.int64)
+    for b in range(n_buckets):
+        start = b * n // n_buckets
+        end = (b + 1) * n // n_buckets
+        lo = start
+        hi = start
+        for j in range(start + 1, end):
+            if y[j] < y[lo]:
+                lo = j
+            if y[j] > y[hi]:
+                hi = j
+        out[2 * b] = min(lo, hi)
+        out[2 * b + 1] = max(lo, hi)
+    return out
+
+
+def _filled(values):
+    """float64 copy with NaNs carried forward (then back), so gaps do not break the kernels."""
+    values = pd.Series(np.asarray(values, dtype=np.float64))
+    return values.ffill().bfill().fillna(0.0).to_numpy()
+
+
+def _x_values(x):
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype("datetime64[ns]").view(np.int64).astype(np.float64)
+    return np.asarray(x, dtype=np.float64)
+
+
+def lttb_indices(x, y, n_out):
+    """Row positions of the `n_out` LTTB points of (x, y), first and last included."""
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+    return _lttb(_x_values(x), _filled(y), int(n_out))
+
+
+def minmax_indices(y, n_out):
+    """Row positions of the minimum and maximum of each of `n_out // 2` equal buckets, in order."""
+    n = len(y)
+    if n <= n_out or n_out < 2:
+        return np.arange(n)
+    out = _minmax(_filled(y), int(n_out) // 2)
+    return np.unique(np.r_[0, out, n - 1])
+
+
+def visible_window(df, window, x="Date"):
+    """Rows of `df` (sorted by `x`) inside the (start, end) `window`; all of them for None."""
+    if window is None or df.empty:
+        return df
+    dates = pd.DatetimeIndex(df[x])
+    start, end = (pd.Timestamp(w) for w in window)
+    if dates.tz is not None:
+        start, end = (t.tz_localize(dates.tz) if t.tz is None else t.tz_convert(dates.tz) for t in (start, end))
+    return df.iloc[dates.searchsorted(start, "left"):dates.searchsorted(end, "right")]
+
+
+def signal_rows(signal, max_markers):
+    """
+    Positions of the BUY/SELL bars. Past `max_markers`, only the first bar of each run
+    of the same signal is kept, then the first marker per bucket, so markers stay
+    bounded too (and every run of signals is still visible at the chart's resolution).
+    """
+    codes = signal_codes(signal)
+    rows = np.flatnonzero(codes)
+    if len(rows) <= max_markers:
+        return rows
+    starts = np.r_[True, codes[1:] != codes[:-1]] & (codes != 0)
+    rows = np.flatnonzero(starts)
+    if len(rows) <= max_markers:
+        return rows
+    buckets = rows * max_markers // len(codes)
+    return rows[np.r_[True, buckets[1:] != buckets[:-1]]]
+
+
+def chart_frame(df, points=DEFAULT_POINTS, x="Date", y="Close", signal="signal", method="lttb"):
+    """
+    (line, markers) for a price chart of `df`: about `points` rows chosen by LTTB (or
+    'minmax') on `y` plus the marker rows from `signal_rows`, and the marker rows themselves.
+    """
+    if df.empty:
+        return df, df
+    markers = signal_rows(df[signal], points) if signal in df.columns else np.array([], np.int64)
+    if method == "minmax":
+        rows = minmax_indices(df[y].to_numpy(), points)
+    else:
+        rows = lttb_indices(df[x].to_numpy(), df[y].to_numpy(), points)
+    if len(rows) < len(df):
+        rows = np.union1d(rows, markers)
+    return df.iloc[rows], df.iloc[markers]
+
+
+def downsample_columns(df, columns, points=DEFAULT_POINTS):
+    """Rows keeping the min/max of each of `columns` per bucket, `points` rows in total at most."""
+    if len(df) <= points:
+        return df
+    per_column = max(points // len(columns), 2)
+    rows = np.unique(np.concatenate([minmax_indices(df[c].to_numpy(), per_column) for c in columns]))
+    return df.iloc[rows]
@@ -0,0 +1,367 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from backtest_engine import cached_backtest
+from feature_store import DEFAULT_ROOT as FEATURE_ROOT
+from feature_store import FeatureStore
+from indicators import INDICATOR_COLUMNS, IndicatorState, update_indicators
+from kernels import fused_indicators
+from price_store import DEFAULT_ROOT as PRICE_ROOT
+from price_store import PriceStore
+from signal_engine import (DEFAULT_THRESHOLDS, SIGNAL_LABELS, column_values, compute_signals, confirm_signals,
+                           signal_codes, to_categorical, trend_codes)
+from timeframes import MultiTimeframe, align, bar_times, check_timeframe
+import tracing
+from transport import FetchResult
+
+# ---------------- ANALYSIS ENGINE ----------------
+# fetch -> indicators -> signals -> backtest, with no Streamlit dependency. The app and
+# the batch runner (batch.py) both drive this module with an explicit EngineConfig,
+# so a symbol analysed from either gives the same frame and the same metrics. Problems
+# that do not stop the analysis go to a `warn` callback (st.warning in the app).
+
+log = logging.getLogger(__name__)
+
+SUMMARY_COLUMNS = [
+    "Name", "Ticker", "Status", "Date", "Close", "Signal", "RSI", "ADX", "EMA20", "Bars",
+    "total_return", "buy_hold_return", "sharpe", "max_drawdown", "trades", "win_rate", "Error",
+]
+
+
+class EngineConfig:
+    """Everything the pipeline reads, as plain values (JSON-serializable via `to_dict`)."""
+
+    def __init__(self, start="2023-01-01", end=None, interval="1d", thresholds=None,
+                 point_in_time_features=True, cost_bps=0.0, slippage_bps=0.0, hold=False,
+                 price_dir=PRICE_ROOT, feature_dir=FEATURE_ROOT, timeframe=None, confirm_timeframe=None):
+        self.start = pd.Timestamp(start)
+        self.end = pd.Timestamp(end) if end is not None else pd.Timestamp.now().normalize()
+        self.interval = interval
+        # Bars are downloaded at `interval`; signals run on `timeframe` (resampled, None =
+        # as downloaded) and, with `confirm_timeframe`, must agree with its EMA20 trend
+        self.timeframe = timeframe
+        self.confirm_timeframe = confirm_timeframe
+        for name in (timeframe, confirm_timeframe):
+            if name is not None:
+                check_timeframe(name, interval)
+        if timeframe is not None and confirm_timeframe is not None:
+            check_timeframe(confirm_timeframe, timeframe)
+        self.thresholds = dict(DEFAULT_THRESHOLDS, **(thresholds or {}))
+        self.point_in_time_features = point_in_time_features
+        self.cost_bps = cost_bps
+        self.slippage_bps = slippage_bps
+        self.hold = hold
+        self.price_dir = price_dir
+        self.feature_dir = feature_dir
+
+    @property
+    def backtest_params(self):
+        return {"cost_bps": self.cost_bps, "slippage_bps": self.slippage_bps, "hold": self.hold}
+
+    def to_dict(self):
+        d = dict(vars(self))
+        d["start"], d["end"] = self.start.isoformat(), self.end.isoformat()
+        return d
+
+    @classmethod
+    def from_dict(cls, d):
+        """Build from a dict such as `to_dict` output. Raises ValueError on unknown keys."""
+        unknown = set(d) - set(cls().to_dict())
+        if unknown:
+            raise ValueError(f"Unknown engine config key(s): {sorted(unknown)}")
+        return cls(**d)
+
+
+def add_indicators(df, state_cache=None, symbol=None):
+    """
+    EMA20/RSI/ADX columns. With a `state_cache` dict, the last frame and IndicatorState
+    per symbol are kept there and only bars new since then are folded in.
+    Returns (frame, state); state is None for a one-shot pass.
+    """
+    if df.empty:
+        return df, None
+    if state_cache is None or symbol is None:
+        df = df.copy()
+        # One fused pass for EMA20/RSI14/ADX14 (same definitions as pandas_ta)
+        values, _ = fused_indicators(
+            column_values(df, "High"), column_values(df, "Low"), column_values(df, "Close")
+        )
+        df["EMA20"], df["RSI"], df["ADX"] = values[:, 0], values[:, 1], values[:, 2]
+        return df, None
+    previous, state = state_cache.get(symbol, (None, None))
+    df, state = update_indicators(df, previous, state)
+    state_cache[symbol] = (df, state)
+    return df, state
+
+
+def apply_signals(df, thresholds, ai=np.nan, vix=np.nan, pcr=np.nan, features=None):
+    """
+    Copy of `df` with AI/VIX/PCR columns and a categorical `signal` column.
+
+    `features` ({"ai", "vix", "pcr"} -> per-bar arrays, e.g. `FeatureStore.as_of`) makes
+    each bar use the values known when it closed; the scalar `ai`/`vix`/`pcr` then
+    override the latest bar only (its signal is never traded in the backtest, since
+    positions lag by one bar). Without `features` the scalars apply to every bar.
+    Raises ValueError when an indicator column is missing.
+    """
+    missing = [col for col in ("Close", "EMA20", "RSI", "ADX") if col not in df.columns]
+    if missing:
+        raise ValueError(f"Missing column(s): {missing}. Cannot generate signals.")
+    if df.empty:
+        return df
+
+    df = df.copy()  # Operate on a copy
+
+    # Clean NaNs or None from indicators
+    df["EMA20"] = df["EMA20"].bfill().ffill()
+    df["RSI"] = df["RSI"].fillna(50)  # Neutral RSI
+    df["ADX"] = df["ADX"].fillna(20)  # Neutral ADX
+
+    if features is not None:
+        features = {name: np.array(values, dtype=np.float64) for name, values in features.items()}
+        for name, live in (("ai", ai), ("vix", vix), ("pcr", pcr)):
+            if live is not None and not np.isnan(live):
+                features[name][-1] = live
+        ai, vix, pcr = features["ai"], features["vix"], features["pcr"]
+    for name, value in (("AI", ai), ("VIX", vix), ("PCR", pcr)):
+        value = np.nan if value is None else value
+        df[name] = np.broadcast_to(np.asarray(value, dtype=np.float64), len(df)).copy()
+
+    codes = compute_signals(
+        column_values(df, "Close"),
+        column_values(df, "EMA20"),
+        column_values(df, "RSI"),
+        column_values(df, "ADX"),
+        column_values(df, "AI"), column_values(df, "VIX"), column_values(df, "PCR"),
+        thresholds,  # NaNs in AI/VIX/PCR fall back to neutral values inside the engine
+    )
+    df["signal"] = to_categorical(codes)
+    return df
+
+
+def backtest_frame(df, **params):
+    """Memoized backtest of an analysed frame's `signal` column (the frame is not copied)."""
+    return cached_backtest(
+        column_values(df, "Close"),
+        signal_codes(df["signal"]),
+        pd.to_datetime(df["Date"]).to_numpy() if "Date" in df.columns else None,
+        **params,
+    )
+
+
+class Analysis:
+    """Result of one symbol's pipeline run: the analysed frame, its backtest and the price status."""
+
+    def __init__(self, symbol, frame, backtest, price):
+        self.symbol = symbol
+        self.frame = frame
+        self.backtest = backtest
+        self.price = price  # FetchResult without the value
+
+    def summary(self, name=None):
+        """One row of SUMMARY_COLUMNS."""
+        row = dict.fromkeys(SUMMARY_COLUMNS, np.nan)
+        row.update({"Name": name or self.symbol, "Ticker": self.symbol, "Status": self.price.status,
+                    "Error": None if self.price.error is None else str(self.price.error), "Bars": len(self.frame)})
+        if self.frame.empty:
+            return row
+        last = self.frame.iloc[-1]
+        row.update({
+            "Date": pd.Timestamp(last["Date"]), "Close": last["Close"], "Signal": str(last["signal"]),
+            "RSI": last["RSI"], "ADX": last["ADX"], "EMA20": last["EMA20"],
+        })
+        row.update({k: self.backtest.metrics[k] for k in
+                    ("total_return", "buy_hold_return", "sharpe", "max_drawdown", "trades", "win_rate")})
+        return row
+
+
+class Engine:
+    """
+    The analysis pipeline for one EngineConfig. Stores default to the config's
+    directories; pass shared ones (and a `state_cache` dict for incremental
+    indicators) when the caller already has them.
+    """
+
+    def __init__(self, config=None, store=None, feature_store=None, state_cache=None, warn=None,
+                 timeframe_cache=None):
+        self.config = config or EngineConfig()
+        self.store = store or PriceStore(self.config.price_dir)
+        self.feature_store = feature_store or FeatureStore(self.config.feature_dir)
+        self.state_cache = state_cache if state_cache is not None else {}
+        # {(symbol, interval): MultiTimeframe}; aggregates survive between runs when shared
+        self.timeframe_cache = timeframe_cache if timeframe_cache is not None else {}
+        self.warn = warn or log.warning
+
+    def fetch(self, symbol):
+        """Price bars as a FetchResult: downloaded, stale (disk only, after a failed download) or missing."""
+        c = self.config
+        try:
+            with tracing.span("price_store", "disk", symbol=symbol) as sp:
+                df = sp.result(self.store.get(symbol, c.start, c.end, c.interval))
+        except Exception as e:
+            # Whatever is already on disk is stale but usable
+            df = self.store.get_cached(symbol, c.start, c.end, c.interval)
+            if df.empty:
+                return FetchResult(df, "missing", e)
+            last = pd.Timestamp(df["Date"].iloc[-1])
+            return FetchResult(df, "stale", e, (pd.Timestamp.now() - last).total_seconds())
+        if df.empty:
+            return FetchResult(df, "missing", ValueError(f"No price data for {symbol}."))
+        return FetchResult(df, "ok")
+
+    def timeframes(self, symbol, bars):
+        """The symbol's MultiTimeframe, brought up to date with `bars` (base-interval bars)."""
+        key = (symbol, self.config.interval)
+        series = self.timeframe_cache.get(key)
+        if series is None:
+            series = self.timeframe_cache[key] = MultiTimeframe(self.config.interval)
+        return series.update(bars)
+
+    def resample(self, symbol, bars, timeframe):
+        """`bars` in `timeframe` (cached and patched incrementally); `bars` itself for None."""
+        if timeframe is None or timeframe == self.config.interval:
+            return bars
+        with tracing.span("resample", "compute", rows=len(bars), timeframe=timeframe) as sp:
+            return sp.result(self.timeframes(symbol, bars).get(timeframe))
+
+    def saved_indicators(self, symbol, interval):
+        """(frame, IndicatorState) saved by an earlier run, or None."""
+        try:
+            data, frame = self.store.load_state(symbol, interval, "indicators")
+            return (frame, IndicatorState.from_dict(data)) if data is not None else None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            self.warn(f"Could not load indicator state for {symbol}: {e}")
+            return None
+
+    def indicators(self, symbol, df, timeframe=None):
+        interval = timeframe or self.config.interval
+        # Each timeframe keeps its own incremental indicator state
+        key = symbol if interval == self.config.interval else f"{symbol}@{interval}"
+        if key not in self.state_cache:
+            # A new process (app restart, batch worker) picks up where the last run stopped;
+            # update_indicators falls back to a full pass if the bars no longer match
+            saved = self.saved_indicators(symbol, interval)
+            if saved is not None:
+                self.state_cache[key] = saved
+        with tracing.span("indicators", "compute", rows=len(df)):
+            df, state = add_indicators(df, self.state_cache, key)
+        if state is not None and "Date" in df.columns:
+            try:
+                self.store.save_state(symbol, interval, "indicators", state.to_dict(),
+                                      df[["Date", *INDICATOR_COLUMNS]])
+            except OSError as e:
+                self.warn(f"Could not save indicator state for {symbol}: {e}")
+        return df
+
+    def signals(self, symbol, df, ai=np.nan, vix=np.nan, pcr=np.nan):
+        features = None
+        if self.config.point_in_time_features and not df.empty:
+            # Each bar uses the values recorded before it closed, not today's values
+            with tracing.span("features", "disk", rows=len(df)):
+                features = self.feature_store.as_of(symbol, bar_times(df))
+        with tracing.span("signals", "compute", rows=len(df)):
+            return apply_signals(df, self.config.thresholds, ai, vix, pcr, features)
+
+    def confirm(self, symbol, bars, df):
+        """
+        Keep only the signals of `df` that agree with the EMA20 trend of the confirmation
+        timeframe, as it stood when each bar closed (no lookahead). Adds a `Trend` column.
+        """
+        timeframe = self.config.confirm_timeframe
+        if timeframe is None or df.empty:
+            return df
+        higher = self.indicators(symbol, self.resample(symbol, bars, timeframe), timeframe)
+        with tracing.span("confirm", "compute", rows=len(df), timeframe=timeframe):
+            times = bar_times(df)
+            trend = trend_codes(align(higher, times, "Close"), align(higher, times, "EMA20"))
+            df = df.copy()
+            df["Trend"] = trend
+            df["signal"] = to_categorical(confirm_signals(signal_codes(df["signal"]), trend))
+        return df
+
+    def backtest(self, df, **params):
+        with tracing.span("backtest", "compute", rows=len(df)):
+            return backtest_frame(df, **dict(self.config.backtest_params, **params))
+
+    def analyze_frame(self, symbol, df, ai=np.nan, vix=np.nan, pcr=np.nan, price=None):
+        """resample -> indicators -> signals (-> confirm) -> backtest for bars already fetched."""
+        bars, timeframe = df, self.config.timeframe
+        df = self.indicators(symbol, self.resample(symbol, bars, timeframe), timeframe)
+        df = self.confirm(symbol, bars, self.signals(symbol, df, ai, vix, pcr))
+        result = self.backtest(df) if not df.empty else None
+        return Analysis(symbol, df, result, price or FetchResult(None, "ok"))
+
+    def analyze(self, symbol, ai=np.nan, vix=np.nan, pcr=np.nan):
+        """The whole pipeline for one symbol."""
+        price = self.fetch(symbol)
+        status = FetchResult(None, price.status, price.error, price.age)
+        if not price.usable:
+            return Analysis(symbol, pd.DataFrame(), None, status)
+        return self.analyze_frame(symbol, price.value, ai, vix, pcr, status)
+
+
+# ---------------- UNIVERSE RUNS ----------------
+_worker = {}
+
+
+def _analyze_worker(task):
+    """Process-pool task: (config dict, name, symbol, bars, ai, vix, pcr) -> (summary row, frame)."""
+    config, name, symbol, bars, ai, vix, pcr = task
+    engine = _worker.get("engine")
+    if engine is None or engine.config.to_dict() != config:
+        engine = _worker["engine"] = Engine(EngineConfig.from_dict(config))
+    try:
+        analysis = engine.analyze_frame(symbol, bars, ai, vix, pcr)
+        return analysis.summary(name), analysis.frame
+    except Exception as e:
+        failed = Analysis(symbol, pd.DataFrame(), None, FetchResult(None, "error", e))
+        return failed.summary(name), pd.DataFrame()
+
+
+def run_universe(universe, config=None, ai=np.nan, vix=np.nan, pcr=np.nan, workers=None,
+                 batch_downloader=None, store=None):
+    """
+    Analyse every {name: ticker} in `universe`. Prices are fetched once in this process
+    (one batched request for the missing ranges); indicators, signals and backtests run
+    in a process pool. Returns (summary DataFrame, {ticker: analysed frame}).
+    """
+    config = config or EngineConfig()
+    store = store or PriceStore(config.price_dir)
+    tickers = list(universe.values())
+    try:
+        frames = store.get_many(tickers, config.start, config.end, config.interval, batch_downloader)
+        status = {t: "ok" for t in tickers}
+    except Exception as e:
+        log.warning("Batch download failed (%s); using cached bars only.", e)
+        frames = {t: store.get_cached(t, config.start, config.end, config.interval) for t in tickers}
+        status = {t: "stale" for t in tickers}
+
+    tasks, rows = [], []
+    for name, ticker in universe.items():
+        bars = frames.get(ticker)
+        if bars is None or bars.empty:
+            rows.append(Analysis(ticker, pd.DataFrame(), None, FetchResult(None, "missing")).summary(name))
+        else:
+            tasks.append((config.to_dict(), name, ticker, bars, ai, vix, pcr))
+
+    results = {}
+    workers = workers or min(len(tasks), os.cpu_count() or 1) or 1
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as pool:
+            outputs = list(pool.map(_analyze_worker, tasks, chunksize=max(1, len(tasks) // (4 * workers))))
+    else:
+        outputs = [_analyze_worker(task) for task in tasks]
+    for (row, frame), task in zip(outputs, tasks):
+        ticker = task[2]
+        if row["Status"] == "ok":
+            row["Status"] = status[ticker]
+        rows.append(row)
+        results[ticker] = frame
+
+    summary = pd.DataFrame(rows, columns=SUMMARY_COLUMNS)
+    summary["Signal"] = pd.Categorical(summary["Signal"], categories=SIGNAL_LABELS)
+    return summary.sort_values("total_return", ascending=False, ignore_index=True), results
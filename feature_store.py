@@ -0,0 +1,148 @@
+import os
+import re
+import threading
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from price_store import _atomic_write
+
+# ---------------- POINT-IN-TIME FEATURE STORE ----------------
+# AI sentiment, India VIX and PCR are recorded per symbol with the time each value
+# became known. Every record is a new immutable Parquet part file, so writers never
+# rewrite history; once a symbol has COMPACT_AFTER parts, the next write folds them
+# into one (`compact`), so reads stay a handful of files. Reads load the
+# whole symbol as NumPy arrays once (cached until a part changes) and join them onto
+# bar times with searchsorted, so each bar only sees values known before it closed.
+
+DEFAULT_ROOT = os.environ.get("FEATURE_STORE_DIR", os.path.join(".market_cache", "features"))
+FEATURES = ["ai", "vix", "pcr"]
+_COLUMNS = ["Timestamp"] + FEATURES
+COMPACT_AFTER = 32  # parts per symbol before a write compacts them
+
+
+class FeatureStore:
+    """Append-only per-symbol feature history with as-of lookups."""
+
+    def __init__(self, root=DEFAULT_ROOT, compact_after=COMPACT_AFTER):
+        self.root = root
+        self.compact_after = compact_after
+        self._lock = threading.Lock()
+        self._cache = {}
+        os.makedirs(root, exist_ok=True)
+
+    def _dir(self, symbol):
+        path = os.path.join(self.root, re.sub(r"[^A-Za-z0-9_.-]", "_", symbol))
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _parts(self, symbol):
+        directory = self._dir(symbol)
+        return sorted(os.path.join(directory, n) for n in os.listdir(directory) if n.endswith(".parquet"))
+
+    def _write_part(self, symbol, df):
+        stamp = pd.Timestamp(df["Timestamp"].max()).strftime("%Y%m%dT%H%M%S%f")
+        path = os.path.join(self._dir(symbol), f"part-{stamp}-{uuid.uuid4().hex[:8]}.parquet")
+        _atomic_write(path, lambda tmp: df.to_parquet(tmp, index=False))
+        return path
+
+    def record(self, symbol, timestamp=None, **values):
+        """
+        Append one observation, e.g. `record("^NSEI", ai=62, vix=13.4, pcr=1.1)`.
+        Features that are not given (or None) are stored as NaN and never mask older values.
+        """
+        unknown = set(values) - set(FEATURES)
+        if unknown:
+            raise ValueError(f"Unknown feature(s): {sorted(unknown)}")
+        row = {"Timestamp": [pd.Timestamp(timestamp) if timestamp is not None else pd.Timestamp.now()]}
+        for name in FEATURES:
+            value = values.get(name)
+            row[name] = [np.nan if value is None else float(value)]
+        df = pd.DataFrame(row, columns=_COLUMNS).astype({name: np.float64 for name in FEATURES})
+        return self._append(symbol, df)
+
+    def record_many(self, symbol, df):
+        """Append a frame with a Timestamp column and any of FEATURES (e.g. a backfill)."""
+        df = df.reindex(columns=_COLUMNS)
+        df["Timestamp"] = pd.to_datetime(df["Timestamp"])
+        df = df.astype({name: np.float64 for name in FEATURES})
+        return self._append(symbol, df)
+
+    def _append(self, symbol, df):
+        """Write `df` as a new part, compacting the symbol once it has `compact_after` parts."""
+        with self._lock:
+            path = self._write_part(symbol, df)
+            if len(self._parts(symbol)) >= self.compact_after:
+                path = self._compact(symbol)
+            return path
+
+    def compact(self, symbol):
+        """Merge every part of a symbol into one (later records win on equal timestamps)."""
+        with self._lock:
+            return self._compact(symbol)
+
+    def _compact(self, symbol):
+        parts = self._parts(symbol)
+        if len(parts) < 2:
+            return parts[0] if parts else None
+        path = self._write_part(symbol, self._read(symbol, parts))
+        for part in parts:
+            os.remove(part)
+        return path
+
+    # ---- reads ----
+    def _read(self, symbol, parts):
+        frames = [pd.read_parquet(p) for p in parts]
+        df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=_COLUMNS)
+        df["Timestamp"] = pd.to_datetime(df["Timestamp"])
+        # Stable sort keeps append order, so the last write for a timestamp wins
+        df = df.sort_values("Timestamp", kind="stable").drop_duplicates("Timestamp", keep="last")
+        return df.reset_index(drop=True).astype({name: np.float64 for name in FEATURES})
+
+    def _arrays(self, symbol):
+        """Sorted (times, {feature: values}) for a symbol, cached until its parts change."""
+        # Listed under the lock, so a compaction never removes a part mid-read
+        with self._lock:
+            parts = self._parts(symbol)
+            signature = tuple((p, os.path.getmtime(p)) for p in parts)
+            hit = self._cache.get(symbol)
+            if hit is not None and hit[0] == signature:
+                return hit[1]
+            df = self._read(symbol, parts)
+        arrays = (df["Timestamp"].to_numpy(dtype="datetime64[ns]"),
+                  {name: df[name].to_numpy() for name in FEATURES})
+        with self._lock:
+            self._cache[symbol] = (signature, arrays)
+        return arrays
+
+    def load(self, symbol, start=None, end=None):
+        """Raw records in [start, end) as a DataFrame."""
+        times, values = self._arrays(symbol)
+        df = pd.DataFrame({"Timestamp": times, **values})
+        if start is not None:
+            df = df[df["Timestamp"] >= pd.Timestamp(start)]
+        if end is not None:
+            df = df[df["Timestamp"] < pd.Timestamp(end)]
+        return df.reset_index(drop=True)
+
+    def as_of(self, symbol, bar_times, bar_length=pd.Timedelta(days=1), max_age=None, features=FEATURES):
+        """
+        Point-in-time join: for each bar, the latest non-NaN value of each feature
+        recorded before the bar closed (`bar_time + bar_length`). Values older than
+        `max_age` (a Timedelta) count as unknown. Returns {feature: float64 array}
+        aligned with `bar_times`, NaN where nothing was known yet.
+        """
+        closes = np.asarray(pd.to_datetime(bar_times), dtype="datetime64[ns]") + np.timedelta64(bar_length)
+        times, values = self._arrays(symbol)
+        out = {}
+        for name in features:
+            known = ~np.isnan(values[name])
+            t, v = times[known], values[name][known]
+            pos = np.searchsorted(t, closes, side="left") - 1
+            result = np.where(pos >= 0, v[np.maximum(pos, 0)] if len(v) else np.nan, np.nan)
+            if max_age is not None and len(t):
+                age = closes - t[np.maximum(pos, 0)]
+                result = np.where(age <= np.timedelta64(max_age), result, np.nan)
+            out[name] = result
+        return out
@@ -0,0 +1,258 @@
+import numpy as np
+import pandas as pd
+from scipy.special import ndtr
+
+# ---------------- IMPLIED VOLATILITY & GREEKS ----------------
+# Black-76 on the put-call-parity forward of each expiry, so no dividend or carry
+# assumption is needed. Implied volatility is solved for every contract at once:
+# a safeguarded Newton iteration that falls back to bisection inside a per-contract
+# bracket whenever a Newton step would leave it. Greeks are quoted against spot.
+
+DEFAULT_RATE = 0.065  # annual risk-free rate (approx. 91-day T-bill)
+EXPIRY_TIME = pd.Timedelta(hours=15, minutes=30)  # NSE index options settle at 15:30
+YEAR = 365.0
+
+IV_MIN, IV_MAX = 1e-4, 5.0
+GREEK_COLUMNS = ["Expiry", "Days", "Strike", "Type", "Price", "Forward", "IV",
+                 "Delta", "Gamma", "Vega", "Theta", "OI"]
+
+
+def _npdf(x):
+    return np.exp(-0.5 * x * x) / np.sqrt(2.0 * np.pi)
+
+
+def _d1_d2(forward, strike, t, sigma):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        vol_t = sigma * np.sqrt(t)
+        d1 = (np.log(forward / strike) + 0.5 * vol_t * vol_t) / vol_t
+    return d1, d1 - vol_t
+
+
+def black_price(forward, strike, t, rate, sigma, is_call):
+    """Black-76 price of calls (`is_call`) and puts; all arguments broadcast."""
+    d1, d2 = _d1_d2(forward, strike, t, sigma)
+    discount = np.exp(-rate * t)
+    call = discount * (forward * ndtr(d1) - strike * ndtr(d2))
+    put = discount * (strike * ndtr(-d2) - forward * ndtr(-d1))
+    return np.where(is_call, call, put)
+
+
+def price_bounds(forward, strike, t, rate, is_call):
+    """No-arbitrage (lower, upper) price bounds: discounted intrinsic and discounted F or K."""
+    discount = np.exp(-rate * t)
+    lower = discount * np.where(is_call, np.maximum(forward - strike, 0.0), np.maximum(strike - forward, 0.0))
+    upper = discount * np.where(is_call, forward, strike)
+    return lower, upper
+
+
+def implied_vol(price, forward, strike, t, rate, is_call, tol=1e-8, max_iter=60):
+    """
+    Implied volatility for arrays of contracts (NaN where the price is outside the
+    no-arbitrage bounds, within `tol` of intrinsic, or the solver does not converge).
+    """
+    price, forward, strike, t, is_call = np.broadcast_arrays(
+        np.asarray(price, dtype=np.float64), np.asarray(forward, dtype=np.float64),
+        np.asarray(strike, dtype=np.float64), np.asarray(t, dtype=np.float64), np.asarray(is_call, dtype=bool),
+    )
+    lower, upper = price_bounds(forward, strike, t, rate, is_call)
+    valid = np.isfinite(price) & np.isfinite(forward) & (t > 0) & (price > lower) & (price < upper)
+
+    # In-the-money prices are mostly intrinsic value, which pins down the volatility
+    # poorly; solve for the out-of-the-money twin from put-call parity instead.
+    solve_call = strike >= forward
+    price = np.where(solve_call == is_call, price, price - lower)
+    # A price within tolerance of intrinsic leaves a twin worth ~0, which the clipped
+    # initial guess would already "solve"
+    valid &= price > tol * np.maximum(price, 1.0)
+
+    lo = np.full(price.shape, IV_MIN)
+    hi = np.full(price.shape, IV_MAX)
+    discount = np.exp(-rate * t)
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        # Brenner-Subrahmanyam ATM approximation as the starting point
+        sigma = np.sqrt(2.0 * np.pi / t) * price / (discount * forward)
+        sigma = np.where(valid, np.clip(np.nan_to_num(sigma, nan=0.2), 0.01, 3.0), np.nan)
+        done = ~valid
+        for _ in range(max_iter):
+            diff = black_price(forward, strike, t, rate, sigma, solve_call) - price
+            done |= np.abs(diff) < tol * np.maximum(price, 1.0)
+            if done.all():
+                break
+            hi = np.where(diff > 0, sigma, hi)
+            lo = np.where(diff < 0, sigma, lo)
+            d1, _ = _d1_d2(forward, strike, t, sigma)
+            vega = discount * forward * _npdf(d1) * np.sqrt(t)
+            step = sigma - diff / vega
+            bisect = ~((step > lo) & (step < hi))
+            sigma = np.where(done, sigma, np.where(bisect, 0.5 * (lo + hi), step))
+    return np.where(done & valid, sigma, np.nan)
+
+
+def greeks(spot, forward, strike, t, rate, sigma, is_call):
+    """
+    Spot Greeks for the Black-76 contracts: delta, gamma, vega (per 1 vol point) and
+    theta (per calendar day). Returns a dict of arrays.
+    """
+    d1, d2 = _d1_d2(forward, strike, t, sigma)
+    discount = np.exp(-rate * t)
+    carry = discount * forward / spot  # e^{-qT} for the carry implied by the forward
+    with np.errstate(divide="ignore", invalid="ignore"):
+        q = rate - np.log(forward / spot) / t
+        sqrt_t = np.sqrt(t)
+        pdf = _npdf(d1)
+        gamma = carry * pdf / (spot * sigma * sqrt_t)
+        decay = -spot * carry * pdf * sigma / (2.0 * sqrt_t)
+    call_theta = decay - rate * strike * discount * ndtr(d2) + q * spot * carry * ndtr(d1)
+    put_theta = decay + rate * strike * discount * ndtr(-d2) - q * spot * carry * ndtr(-d1)
+    return {
+        "delta": np.where(is_call, carry * ndtr(d1), carry * (ndtr(d1) - 1.0)),
+        "gamma": gamma,
+        "vega": spot * carry * pdf * sqrt_t / 100.0,
+        "theta": np.where(is_call, call_theta, put_theta) / YEAR,
+    }
+
+
+# ---------------- CHAIN HELPERS ----------------
+def option_prices(bid, ask, ltp):
+    """Bid/ask mid where both sides are quoted, otherwise the last traded price."""
+    bid, ask, ltp = (np.asarray(a, dtype=np.float64) for a in (bid, ask, ltp))
+    quoted = (bid > 0) & (ask >= bid)
+    price = np.where(quoted, 0.5 * (bid + ask), ltp)
+    return np.where(price > 0, price, np.nan)
+
+
+def years_to_expiry(expiry, now):
+    """Year fraction from `now` to 15:30 on each expiry date."""
+    expiry = pd.to_datetime(np.asarray(expiry)) + EXPIRY_TIME
+    return np.asarray((expiry - pd.Timestamp(now)) / pd.Timedelta(days=1), dtype=np.float64) / YEAR
+
+
+def implied_forwards(chain, rate=DEFAULT_RATE):
+    """
+    Put-call-parity forward per expiry, F = K + e^{rT}(C - P), at the strike where the
+    call and put prices are closest. Returns (expiries, forwards, strikes used).
+    """
+    expiries = chain.expiries
+    call = option_prices(chain["ce_bid"], chain["ce_ask"], chain["ce_ltp"])
+    put = option_prices(chain["pe_bid"], chain["pe_ask"], chain["pe_ltp"])
+    gap = np.abs(call - put)
+    gap = np.where(np.isfinite(gap), gap, np.inf)
+    t = years_to_expiry(expiries, chain.timestamp)
+
+    forwards = np.full(len(expiries), np.nan)
+    atm = np.full(len(expiries), np.nan)
+    idx = np.searchsorted(expiries, chain["expiry"])
+    for i in range(len(expiries)):
+        rows = np.flatnonzero(idx == i)
+        if len(rows) == 0 or not np.isfinite(gap[rows]).any():
+            continue
+        j = rows[np.argmin(gap[rows])]
+        atm[i] = chain["strike"][j]
+        forwards[i] = chain["strike"][j] + np.exp(rate * max(t[i], 0.0)) * (call[j] - put[j])
+    return expiries, forwards, atm
+
+
+def chain_greeks(chain, rate=DEFAULT_RATE):
+    """
+    IV and Greeks for every quoted CE and PE contract in an OptionChain, as a long
+    DataFrame with GREEK_COLUMNS (one row per contract).
+    """
+    if chain.empty:
+        return pd.DataFrame(columns=GREEK_COLUMNS)
+    expiries, forwards, _ = implied_forwards(chain, rate)
+    forward = forwards[np.searchsorted(expiries, chain["expiry"])]
+    # Fall back to spot where parity gave no forward (e.g. far expiries with no quotes)
+    forward = np.where(np.isfinite(forward), forward, chain.underlying)
+
+    n = len(chain)
+    strike = np.concatenate([chain["strike"], chain["strike"]])
+    expiry = np.concatenate([chain["expiry"], chain["expiry"]])
+    forward = np.concatenate([forward, forward])
+    is_call = np.repeat([True, False], n)
+    price = np.concatenate([
+        option_prices(chain["ce_bid"], chain["ce_ask"], chain["ce_ltp"]),
+        option_prices(chain["pe_bid"], chain["pe_ask"], chain["pe_ltp"]),
+    ])
+    oi = np.concatenate([chain["ce_oi"], chain["pe_oi"]])
+    t = years_to_expiry(expiry, chain.timestamp)
+
+    keep = np.isfinite(price) & (t > 0)
+    strike, expiry, forward, is_call, price, oi, t = (
+        a[keep] for a in (strike, expiry, forward, is_call, price, oi, t)
+    )
+    iv = implied_vol(price, forward, strike, t, rate, is_call)
+    g = greeks(chain.underlying, forward, strike, t, rate, iv, is_call)
+    return pd.DataFrame({
+        "Expiry": pd.to_datetime(expiry),
+        "Days": t * YEAR,
+        "Strike": strike,
+        "Type": np.where(is_call, "CE", "PE"),
+        "Price": price,
+        "Forward": forward,
+        "IV": iv,
+        "Delta": g["delta"],
+        "Gamma": g["gamma"],
+        "Vega": g["vega"],
+        "Theta": g["theta"],
+        "OI": oi,
+    })
+
+
+def _otm(table):
+    """Out-of-the-money legs only: puts below the forward, calls at or above it."""
+    otm = np.where(table["Strike"] < table["Forward"], table["Type"] == "PE", table["Type"] == "CE")
+    return table[otm]
+
+
+def iv_smile(table, expiry):
+    """CE, PE and out-of-the-money IV per strike for one expiry."""
+    rows = table[table["Expiry"] == pd.Timestamp(expiry)]
+    smile = rows.pivot_table(index="Strike", columns="Type", values="IV")
+    smile = smile.reindex(columns=["CE", "PE"]).rename(columns={"CE": "CE IV", "PE": "PE IV"})
+    smile["OTM IV"] = _otm(rows).set_index("Strike")["IV"].reindex(smile.index)
+    return smile.reset_index()
+
+
+def iv_surface(table):
+    """Out-of-the-money IV as a (strike x expiry) grid."""
+    return _otm(table).pivot_table(index="Strike", columns="Expiry", values="IV")
+
+
+def expiry_summary(table):
+    """
+    Per-expiry volatility snapshot: ATM IV, 25-delta put/call IV and skew, ATM straddle
+    price and the ATM call's Greeks.
+    """
+    rows = []
+    for expiry, group in table.groupby("Expiry", sort=True):
+        group = group.dropna(subset=["IV"])
+        if group.empty:
+            continue
+        forward = group["Forward"].iloc[0]
+        atm_strike = group["Strike"].iloc[np.argmin(np.abs(group["Strike"].to_numpy() - forward))]
+        atm = group[group["Strike"] == atm_strike]
+        calls, puts = group[group["Type"] == "CE"], group[group["Type"] == "PE"]
+        atm_call = atm[atm["Type"] == "CE"]
+
+        def at_delta(legs, target):
+            if legs.empty:
+                return np.nan
+            return legs["IV"].iloc[np.argmin(np.abs(legs["Delta"].to_numpy() - target))]
+
+        put_25, call_25 = at_delta(puts, -0.25), at_delta(calls, 0.25)
+        rows.append({
+            "Expiry": expiry,
+            "Days": group["Days"].iloc[0],
+            "Forward": forward,
+            "ATM Strike": atm_strike,
+            "ATM IV": atm["IV"].mean(),
+            "25D Put IV": put_25,
+            "25D Call IV": call_25,
+            "Skew": put_25 - call_25,
+            "ATM Straddle": atm["Price"].sum() if len(atm) == 2 else np.nan,
+            "ATM Delta": atm_call["Delta"].iloc[0] if len(atm_call) else np.nan,
+            "ATM Gamma": atm_call["Gamma"].iloc[0] if len(atm_call) else np.nan,
+            "ATM Vega": atm_call["Vega"].iloc[0] if len(atm_call) else np.nan,
+            "ATM Theta": atm_call["Theta"].iloc[0] if len(atm_call) else np.nan,
+        })
+    return pd.DataFrame(rows)
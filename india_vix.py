@@ -0,0 +1,170 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from greeks import DEFAULT_RATE, YEAR, option_prices, years_to_expiry
+from price_store import _atomic_write
+
+# ---------------- INDIA VIX ----------------
+# NSE's India VIX methodology (the CBOE variance-swap formula): for the near and next
+# monthly NIFTY expiries,
+#   sigma^2 = 2/T * sum(dK/K^2 * e^{RT} * Q(K)) - 1/T * (F/K0 - 1)^2
+# over out-of-the-money quotes, then the two variances are interpolated to 30 days.
+# Every step is array arithmetic over one expiry's strikes.
+
+DEFAULT_PATH = os.environ.get("INDIA_VIX_HISTORY", os.path.join(".market_cache", "india_vix.parquet"))
+ROLL_DAYS = 3  # roll to the following month when the near month has this many days or fewer
+HISTORY_COLUMNS = ["Timestamp", "VIX", "Near Expiry", "Next Expiry", "Near Variance", "Next Variance"]
+
+
+def _otm_strikes(bid, start, step):
+    """
+    Indices walked from `start` in direction `step` (-1 puts, +1 calls) up to two
+    consecutive zero bids, keeping only strikes with a bid.
+    """
+    idx = np.arange(start, -1 if step < 0 else len(bid), step)
+    if len(idx) == 0:
+        return idx
+    zero = ~(bid[idx] > 0)
+    stop = np.flatnonzero(zero[:-1] & zero[1:])
+    if len(stop):
+        idx, zero = idx[: stop[0]], zero[: stop[0]]
+    return idx[~zero]
+
+
+def expiry_variance(strike, call_bid, call_ask, call_ltp, put_bid, put_ask, put_ltp, t, rate=DEFAULT_RATE):
+    """
+    Model-free variance for one expiry. Strikes must be sorted ascending.
+    Returns (variance, forward, k0); variance is NaN when there are no usable quotes.
+    """
+    if not t > 0:
+        return np.nan, np.nan, np.nan
+    call = option_prices(call_bid, call_ask, call_ltp)
+    put = option_prices(put_bid, put_ask, put_ltp)
+    gap = np.abs(call - put)
+    if not np.isfinite(gap).any():
+        return np.nan, np.nan, np.nan
+    growth = np.exp(rate * t)
+
+    j = np.nanargmin(gap)
+    forward = strike[j] + growth * (call[j] - put[j])
+    below = np.flatnonzero(strike <= forward)
+    if len(below) == 0:
+        return np.nan, forward, np.nan
+    k0 = below[-1]
+
+    puts = _otm_strikes(np.asarray(put_bid, dtype=np.float64), k0 - 1, -1)[::-1]
+    calls = _otm_strikes(np.asarray(call_bid, dtype=np.float64), k0 + 1, 1)
+    used = np.concatenate([puts, [k0], calls])
+    # At K0 the call and put are averaged (whichever exists if only one is quoted)
+    at_k0 = np.array([call[k0], put[k0]])
+    at_k0 = at_k0[np.isfinite(at_k0)].mean() if np.isfinite(at_k0).any() else np.nan
+    quote = np.concatenate([put[puts], [at_k0], call[calls]])
+    keep = np.isfinite(quote)
+    used, quote = used[keep], quote[keep]
+    if len(used) < 2:
+        return np.nan, forward, strike[k0]
+
+    k = strike[used]
+    dk = np.empty(len(k))
+    dk[1:-1] = (k[2:] - k[:-2]) / 2.0
+    dk[0], dk[-1] = k[1] - k[0], k[-1] - k[-2]
+    variance = 2.0 / t * np.sum(dk / k**2 * growth * quote) - (forward / strike[k0] - 1.0) ** 2 / t
+    return variance, forward, strike[k0]
+
+
+def monthly_expiries(expiries):
+    """The last listed expiry of each calendar month (NSE's monthly contracts)."""
+    expiries = pd.to_datetime(np.asarray(expiries))
+    if len(expiries) == 0:
+        return expiries
+    months = expiries.to_period("M")
+    return expiries[np.r_[months[1:] != months[:-1], True]]
+
+
+def india_vix(chain, rate=DEFAULT_RATE, roll_days=ROLL_DAYS, monthly=True):
+    """
+    India VIX from a parsed NIFTY OptionChain.
+    Returns a dict with the VIX level, the two expiries used and their variances.
+    Raises ValueError when fewer than one expiry has usable quotes.
+    """
+    expiries = monthly_expiries(chain.expiries) if monthly else pd.to_datetime(chain.expiries)
+    t_all = years_to_expiry(expiries, chain.timestamp)
+    candidates = [(e, t) for e, t in zip(expiries, t_all) if t * YEAR > roll_days]
+
+    terms = []
+    for expiry, t in candidates:
+        rows = chain.for_expiry(expiry)
+        variance, forward, _ = expiry_variance(
+            rows["strike"], rows["ce_bid"], rows["ce_ask"], rows["ce_ltp"],
+            rows["pe_bid"], rows["pe_ask"], rows["pe_ltp"], t, rate,
+        )
+        if np.isfinite(variance) and variance > 0:
+            terms.append((expiry, t, variance))
+        if len(terms) == 2:
+            break
+    if not terms:
+        raise ValueError("No expiry with usable option quotes for the India VIX calculation.")
+
+    near, t1, v1 = terms[0]
+    nxt, t2, v2 = terms[1] if len(terms) == 2 else (pd.NaT, np.nan, np.nan)
+    if len(terms) == 1:
+        # Only one usable month: its variance stands in for the 30-day variance
+        variance_30 = v1
+    else:
+        n30 = 30.0 / YEAR
+        variance_30 = (t1 * v1 * (t2 - n30) / (t2 - t1) + t2 * v2 * (n30 - t1) / (t2 - t1)) / n30
+    return {
+        "Timestamp": chain.timestamp,
+        "VIX": 100.0 * np.sqrt(max(variance_30, 0.0)),
+        "Near Expiry": pd.Timestamp(near),
+        "Next Expiry": pd.Timestamp(nxt),
+        "Near Variance": v1,
+        "Next Variance": v2,
+    }
+
+
+# ---------------- HISTORY ----------------
+class VixHistory:
+    """Computed India VIX values in one Parquet file, one row per chain snapshot."""
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def frame(self):
+        if not os.path.exists(self.path):
+            return pd.DataFrame(columns=HISTORY_COLUMNS)
+        return pd.read_parquet(self.path)
+
+    def append(self, record):
+        """Add one `india_vix` result (a repeat of the same snapshot replaces it)."""
+        with self._lock:
+            row = pd.DataFrame([record], columns=HISTORY_COLUMNS)
+            history = self.frame()
+            df = pd.concat([history, row], ignore_index=True) if not history.empty else row
+            df["Timestamp"] = pd.to_datetime(df["Timestamp"])
+            df = df.drop_duplicates("Timestamp", keep="last").sort_values("Timestamp", ignore_index=True)
+            _atomic_write(self.path, lambda tmp: df.to_parquet(tmp))
+        return df
+
+    def daily(self):
+        """Last computed value of each day, indexed by date."""
+        df = self.frame()
+        if df.empty:
+            return pd.Series(dtype=np.float64, name="VIX")
+        df = df.assign(Date=pd.to_datetime(df["Timestamp"]).dt.normalize())
+        return df.groupby("Date")["VIX"].last()
+
+    def as_of(self, dates):
+        """VIX in effect at each of `dates` (latest value at or before it; NaN before the first)."""
+        df = self.frame()
+        dates = np.asarray(pd.to_datetime(dates), dtype="datetime64[ns]")
+        if df.empty:
+            return np.full(len(dates), np.nan)
+        times = pd.to_datetime(df["Timestamp"]).to_numpy(dtype="datetime64[ns]")
+        pos = np.searchsorted(times, dates, side="right") - 1
+        return np.where(pos >= 0, df["VIX"].to_numpy(dtype=np.float64)[np.maximum(pos, 0)], np.nan)
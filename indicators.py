@@ -0,0 +1,247 @@
+import copy
+import math
+
+import numpy as np
+import pandas as pd
+
+from kernels import EWM_NAMES, HAVE_NUMBA, fused_indicators
+from signal_engine import column_values
+
+# ---------------- INCREMENTAL INDICATORS ----------------
+# EMA20, RSI14 and ADX14 kept as recursive state so that each appended bar costs O(1).
+# The recursions reproduce pandas_ta's definitions (which are pandas `ewm` calls):
+#   EMA  = ewm(span=n, adjust=False) seeded with the SMA of the first n closes
+#   RSI  = 100 * rma(gain) / (rma(gain) + rma(loss))
+#   ADX  = rma(DX) with DX built from rma(+DM), rma(-DM) and ATR = rma(TR)
+# where rma = ewm(alpha=1/n, min_periods=n, adjust=True). A full recompute and a
+# bar-by-bar update agree to floating-point tolerance (~1e-9 relative).
+
+INDICATOR_COLUMNS = ["EMA20", "RSI", "ADX"]
+
+
+class Ewm:
+    """O(1) equivalent of `Series.ewm(alpha=..., adjust=..., min_periods=...).mean()`."""
+
+    __slots__ = ("alpha", "adjust", "min_periods", "weighted", "old_wt", "nobs")
+
+    def __init__(self, alpha, adjust=True, min_periods=0):
+        self.alpha = alpha
+        self.adjust = adjust
+        self.min_periods = max(min_periods, 1)
+        self.weighted = math.nan
+        self.old_wt = 1.0
+        self.nobs = 0
+
+    def update(self, x):
+        # Same steps as pandas' ewm kernel with ignore_na=False
+        is_obs = x == x
+        self.nobs += is_obs
+        if self.weighted == self.weighted:
+            self.old_wt *= 1.0 - self.alpha
+            if is_obs:
+                new_wt = 1.0 if self.adjust else self.alpha
+                if self.weighted != x:
+                    self.weighted = (self.old_wt * self.weighted + new_wt * x) / (self.old_wt + new_wt)
+                self.old_wt = self.old_wt + new_wt if self.adjust else 1.0
+        elif is_obs:
+            self.weighted = x
+        return self.weighted if self.nobs >= self.min_periods else math.nan
+
+    def to_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data):
+        obj = cls(data["alpha"], data["adjust"], data["min_periods"])
+        for k in cls.__slots__:
+            setattr(obj, k, data[k])
+        return obj
+
+
+def _nanmax(*values):
+    """max() that skips NaNs, like pandas' row-wise max."""
+    values = [v for v in values if v == v]
+    return max(values) if values else math.nan
+
+
+class IndicatorState:
+    """Recursive EMA/RSI/ADX state for one symbol and interval."""
+
+    def __init__(self, ema_length=20, rsi_length=14, adx_length=14):
+        self.ema_length = ema_length
+        self.rsi_length = rsi_length
+        self.adx_length = adx_length
+        self.bars = 0
+        self.last_timestamp = None
+        self.prev_high = self.prev_low = self.prev_close = math.nan
+        # EMA is seeded with the SMA of its first `ema_length` closes
+        self.seed_sum = 0.0
+        self.seed_count = 0
+        self.ema = Ewm(2.0 / (ema_length + 1), adjust=False)
+        self.gain = Ewm(1.0 / rsi_length, min_periods=rsi_length)
+        self.loss = Ewm(1.0 / rsi_length, min_periods=rsi_length)
+        self.tr = Ewm(1.0 / adx_length, min_periods=adx_length)
+        self.plus_dm = Ewm(1.0 / adx_length, min_periods=adx_length)
+        self.minus_dm = Ewm(1.0 / adx_length, min_periods=adx_length)
+        self.adx = Ewm(1.0 / adx_length, min_periods=adx_length)
+
+    def update(self, high, low, close, timestamp=None):
+        """Fold one bar into the state and return (ema, rsi, adx) for it."""
+        high, low, close = float(high), float(low), float(close)
+
+        # EMA
+        if self.bars < self.ema_length:
+            if close == close:
+                self.seed_sum += close
+                self.seed_count += 1
+            if self.bars == self.ema_length - 1:
+                seed = self.seed_sum / self.seed_count if self.seed_count else math.nan
+                ema = self.ema.update(seed)
+            else:
+                ema = self.ema.update(math.nan)
+        else:
+            ema = self.ema.update(close)
+
+        # RSI
+        change = close - self.prev_close
+        gain = self.gain.update(max(change, 0.0) if change == change else math.nan)
+        loss = abs(self.loss.update(min(change, 0.0) if change == change else math.nan))
+        rsi = 100.0 * gain / (gain + loss) if gain + loss != 0 else math.nan
+
+        # ADX
+        if self.bars == 0:
+            tr = up = down = math.nan
+        else:
+            pc = self.prev_close
+            tr = _nanmax(abs(high - low), abs(high - pc), abs(pc - low))
+            up = high - self.prev_high
+            down = self.prev_low - low
+        atr = self.tr.update(tr)
+        if up == up and down == down:
+            plus = up if (up > down and up > 0) else 0.0
+            minus = down if (down > up and down > 0) else 0.0
+        else:
+            plus = minus = math.nan
+        k = 100.0 / atr if atr else math.nan
+        dmp = k * self.plus_dm.update(plus)
+        dmn = k * self.minus_dm.update(minus)
+        dx = 100.0 * abs(dmp - dmn) / (dmp + dmn) if dmp + dmn != 0 else math.nan
+        adx = self.adx.update(dx)
+
+        self.prev_high, self.prev_low, self.prev_close = high, low, close
+        self.bars += 1
+        if timestamp is not None:
+            self.last_timestamp = pd.Timestamp(timestamp)
+        return ema, rsi, adx
+
+    def preview(self, high, low, close):
+        """Indicator values for a still-forming bar, without committing it."""
+        return copy.deepcopy(self).update(high, low, close)
+
+    def copy(self):
+        return copy.deepcopy(self)
+
+    # ---- kernel hand-off (see kernels.py for the array layout) ----
+    def to_array(self):
+        head = [self.bars, self.prev_high, self.prev_low, self.prev_close, self.seed_sum, self.seed_count]
+        ewms = [getattr(self, name) for name in EWM_NAMES]
+        return np.array(head + [v for e in ewms for v in (e.weighted, e.old_wt, e.nobs)], dtype=np.float64)
+
+    def load_array(self, state):
+        """Adopt a kernel state vector produced with this object's lengths."""
+        self.bars = int(state[0])
+        self.prev_high, self.prev_low, self.prev_close = (float(v) for v in state[1:4])
+        self.seed_sum, self.seed_count = float(state[4]), int(state[5])
+        for i, name in enumerate(EWM_NAMES):
+            ewm = getattr(self, name)
+            off = 6 + 3 * i
+            ewm.weighted, ewm.old_wt, ewm.nobs = float(state[off]), float(state[off + 1]), int(state[off + 2])
+        return self
+
+    # ---- serialization ----
+    def to_dict(self):
+        data = {k: v for k, v in vars(self).items() if not isinstance(v, Ewm)}
+        data["last_timestamp"] = self.last_timestamp.isoformat() if self.last_timestamp is not None else None
+        data["ewm"] = {k: v.to_dict() for k, v in vars(self).items() if isinstance(v, Ewm)}
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        data = dict(data)
+        obj = cls(data["ema_length"], data["rsi_length"], data["adx_length"])
+        for k, v in data.pop("ewm").items():
+            setattr(obj, k, Ewm.from_dict(v))
+        for k, v in data.items():
+            setattr(obj, k, v)
+        if obj.last_timestamp is not None:
+            obj.last_timestamp = pd.Timestamp(obj.last_timestamp)
+        return obj
+
+
+def _bar_arrays(df):
+    return column_values(df, "High"), column_values(df, "Low"), column_values(df, "Close")
+
+
+def extend_indicators(state, df, start=0, provisional_last=True):
+    """
+    Run `state` over rows `start:` of df and return their indicator values as an (m, 3)
+    array of EMA20/RSI/ADX. When `provisional_last` is set, the final row is previewed
+    but not committed, because the newest bar may still be forming.
+    """
+    high, low, close = _bar_arrays(df)
+    dates = df["Date"].to_numpy() if "Date" in df.columns else [None] * len(df)
+    n = len(df)
+    out = np.full((n - start, 3), np.nan)
+    committed_end = n - 1 if provisional_last else n
+    if HAVE_NUMBA and committed_end - start > 1:
+        # Long runs go through the compiled kernel, then hand the state back
+        values, kernel_state = fused_indicators(
+            high[start:committed_end], low[start:committed_end], close[start:committed_end],
+            state.ema_length, state.rsi_length, state.adx_length, state=state.to_array(),
+        )
+        out[: committed_end - start] = values
+        state.load_array(kernel_state)
+        if dates[committed_end - 1] is not None:
+            state.last_timestamp = pd.Timestamp(dates[committed_end - 1])
+        start = committed_end
+    offset = n - len(out)
+    for i in range(start, n):
+        j = i - offset
+        if provisional_last and i == n - 1:
+            out[j] = state.preview(high[i], low[i], close[i])
+        else:
+            out[j] = state.update(high[i], low[i], close[i], dates[i])
+    return out
+
+
+def update_indicators(df, previous=None, state=None):
+    """
+    Add EMA20/RSI/ADX to `df`, reusing `previous` (the last frame returned for the same
+    symbol) and its `state` when `df` only extends it. Falls back to a full pass otherwise.
+    Returns (frame, state).
+    """
+    df = df.copy()
+    start = 0
+    values = None
+    if previous is not None and state is not None and state.last_timestamp is not None and "Date" in df:
+        dates = pd.DatetimeIndex(df["Date"])
+        prev_dates = pd.DatetimeIndex(previous["Date"])
+        # Rows up to the last committed bar must be identical to what was seen before
+        k = state.bars
+        if (
+            k <= len(df)
+            and k <= len(prev_dates)
+            and k > 0
+            and dates[k - 1] == state.last_timestamp
+            and dates[:k].equals(prev_dates[:k])
+        ):
+            start = k
+            state = state.copy()
+            values = previous[INDICATOR_COLUMNS].to_numpy()[:k]
+    if values is None:
+        state = IndicatorState()
+        values = np.empty((0, 3))
+    values = np.vstack([values, extend_indicators(state, df, start)])
+    for i, col in enumerate(INDICATOR_COLUMNS):
+        df[col] = values[:, i]
+    return df, state
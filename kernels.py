@@ -0,0 +1,237 @@
+import numpy as np
+import pandas as pd
+
+try:
+    from numba import njit, prange
+
+    HAVE_NUMBA = True
+except ImportError:  # pragma: no cover - exercised only without numba
+    HAVE_NUMBA = False
+
+# ---------------- FUSED INDICATOR KERNEL ----------------
+# One pass over contiguous float64 High/Low/Close arrays produces EMA, RSI and ADX
+# together, with no intermediate Series. The recursions are the ones in indicators.py
+# (pandas_ta's ewm definitions); results match pandas_ta to 1e-9 relative tolerance.
+# The kernel also returns its final recursive state, so a full pass can hand over to
+# the bar-by-bar IndicatorState for live updates.
+#
+# State layout (float64 vector):
+#   0 bars, 1 prev_high, 2 prev_low, 3 prev_close, 4 seed_sum, 5 seed_count,
+#   then (weighted, old_wt, nobs) triples for the ewm recursions in EWM_NAMES order.
+
+KERNEL_COLUMNS = ["EMA20", "RSI", "ADX"]
+EWM_NAMES = ["ema", "gain", "loss", "tr", "plus_dm", "minus_dm", "adx"]
+_EWM_OFFSET = 6
+STATE_SIZE = _EWM_OFFSET + 3 * len(EWM_NAMES)
+
+
+def _identity(*args, **kwargs):
+    if args and callable(args[0]):
+        return args[0]
+    return lambda f: f
+
+
+if not HAVE_NUMBA:
+    njit = _identity
+    prange = range
+
+
+@njit(cache=True, nogil=True)
+def _reset_state(state):
+    state[:] = 0.0
+    state[1:4] = np.nan
+    for j in range(7):
+        state[6 + 3 * j] = np.nan  # weighted
+        state[7 + 3 * j] = 1.0  # old_wt
+
+
+def new_state():
+    """Empty kernel state (no bars seen)."""
+    state = np.empty(STATE_SIZE)
+    _reset_state(state)
+    return state
+
+
+@njit(cache=True, nogil=True)
+def _ewm_step(state, slot, x, alpha, adjust, min_periods):
+    off = 6 + 3 * slot
+    weighted = state[off]
+    old_wt = state[off + 1]
+    is_obs = x == x
+    if is_obs:
+        state[off + 2] += 1.0
+    if weighted == weighted:
+        old_wt *= 1.0 - alpha
+        if is_obs:
+            new_wt = 1.0 if adjust else alpha
+            if weighted != x:
+                weighted = (old_wt * weighted + new_wt * x) / (old_wt + new_wt)
+            old_wt = old_wt + new_wt if adjust else 1.0
+    elif is_obs:
+        weighted = x
+    state[off] = weighted
+    state[off + 1] = old_wt
+    if state[off + 2] >= max(min_periods, 1):
+        return weighted
+    return np.nan
+
+
+@njit(cache=True, nogil=True)
+def _fused_kernel(high, low, close, state, out, ema_length, rsi_length, adx_length):
+    a_ema = 2.0 / (ema_length + 1)
+    a_rsi = 1.0 / rsi_length
+    a_adx = 1.0 / adx_length
+    for i in range(close.shape[0]):
+        h = high[i]
+        lo = low[i]
+        c = close[i]
+        bars = state[0]
+
+        # EMA seeded with the SMA of the first `ema_length` closes
+        if bars < ema_length:
+            if c == c:
+                state[4] += c
+                state[5] += 1.0
+            if bars == ema_length - 1:
+                seed = state[4] / state[5] if state[5] > 0 else np.nan
+                ema = _ewm_step(state, 0, seed, a_ema, False, 0)
+            else:
+                ema = _ewm_step(state, 0, np.nan, a_ema, False, 0)
+        else:
+            ema = _ewm_step(state, 0, c, a_ema, False, 0)
+
+        # RSI
+        change = c - state[3]
+        if change == change:
+            gain = _ewm_step(state, 1, max(change, 0.0), a_rsi, True, rsi_length)
+            loss = abs(_ewm_step(state, 2, min(change, 0.0), a_rsi, True, rsi_length))
+        else:
+            gain = _ewm_step(state, 1, np.nan, a_rsi, True, rsi_length)
+            loss = abs(_ewm_step(state, 2, np.nan, a_rsi, True, rsi_length))
+        rsi = 100.0 * gain / (gain + loss) if gain + loss != 0 else np.nan
+
+        # ADX
+        if bars == 0:
+            tr = np.nan
+            up = np.nan
+            down = np.nan
+        else:
+            pc = state[3]
+            tr = abs(h - lo)
+            if abs(h - pc) > tr or tr != tr:
+                tr = abs(h - pc)
+            if abs(pc - lo) > tr or tr != tr:
+                tr = abs(pc - lo)
+            up = h - state[1]
+            down = state[2] - lo
+        atr = _ewm_step(state, 3, tr, a_adx, True, adx_length)
+        if up == up and down == down:
+            plus = up if (up > down and up > 0) else 0.0
+            minus = down if (down > up and down > 0) else 0.0
+        else:
+            plus = np.nan
+            minus = np.nan
+        k = 100.0 / atr if atr != 0 else np.nan
+        dmp = k * _ewm_step(state, 4, plus, a_adx, True, adx_length)
+        dmn = k * _ewm_step(state, 5, minus, a_adx, True, adx_length)
+        dx = 100.0 * abs(dmp - dmn) / (dmp + dmn) if dmp + dmn != 0 else np.nan
+        adx = _ewm_step(state, 6, dx, a_adx, True, adx_length)
+
+        state[1] = h
+        state[2] = lo
+        state[3] = c
+        state[0] = bars + 1
+        out[i, 0] = ema
+        out[i, 1] = rsi
+        out[i, 2] = adx
+
+
+@njit(cache=True, nogil=True, parallel=True)
+def _fused_kernel_2d(high, low, close, out, ema_length, rsi_length, adx_length):
+    for s in prange(close.shape[0]):
+        # Rows are left-padded with NaN for symbols with shorter histories
+        first = 0
+        while first < close.shape[1] and close[s, first] != close[s, first]:
+            first += 1
+        state = np.empty(STATE_SIZE)
+        _reset_state(state)
+        _fused_kernel(high[s, first:], low[s, first:], close[s, first:], state,
+                      out[s, first:], ema_length, rsi_length, adx_length)
+
+
+# ---------------- NUMPY FALLBACK ----------------
+def _rma(x, length):
+    return x.ewm(alpha=1.0 / length, min_periods=length).mean()
+
+
+def _pandas_indicators(high, low, close, ema_length, rsi_length, adx_length):
+    """Same definitions through pandas' vectorized ewm (used when numba is missing)."""
+    high, low, close = pd.Series(high), pd.Series(low), pd.Series(close)
+    out = np.full((len(close), 3), np.nan)
+
+    seeded = close.copy()
+    if len(close) >= ema_length:
+        seeded.iloc[: ema_length - 1] = np.nan
+        seeded.iloc[ema_length - 1] = close.iloc[:ema_length].mean()
+        out[:, 0] = seeded.ewm(span=ema_length, adjust=False).mean().to_numpy()
+
+    change = close.diff()
+    gain = _rma(change.clip(lower=0), rsi_length)
+    loss = _rma(change.clip(upper=0), rsi_length).abs()
+    out[:, 1] = (100.0 * gain / (gain + loss)).to_numpy()
+
+    prev_close = close.shift(1)
+    tr = pd.concat([high - low, high - prev_close, prev_close - low], axis=1).abs().max(axis=1)
+    tr.iloc[:1] = np.nan
+    up = high - high.shift(1)
+    down = low.shift(1) - low
+    plus = ((up > down) & (up > 0)) * up
+    minus = ((down > up) & (down > 0)) * down
+    k = 100.0 / _rma(tr, adx_length)
+    dmp = k * _rma(plus, adx_length)
+    dmn = k * _rma(minus, adx_length)
+    dx = 100.0 * (dmp - dmn).abs() / (dmp + dmn)
+    out[:, 2] = _rma(dx, adx_length).to_numpy()
+    return out
+
+
+# ---------------- PUBLIC API ----------------
+def _as_contiguous(*arrays):
+    return [np.ascontiguousarray(a, dtype=np.float64) for a in arrays]
+
+
+def fused_indicators(high, low, close, ema_length=20, rsi_length=14, adx_length=14, state=None):
+    """
+    EMA/RSI/ADX for one symbol in a single pass.
+    Returns (values, state): values is an (n, 3) array ordered as KERNEL_COLUMNS and
+    state is the recursive state after the last bar (pass it back in to continue).
+    Without numba the values come from pandas' ewm and `state` is None.
+    """
+    high, low, close = _as_contiguous(high, low, close)
+    if not HAVE_NUMBA:
+        if state is not None:
+            raise RuntimeError("Resuming from a kernel state requires numba.")
+        return _pandas_indicators(high, low, close, ema_length, rsi_length, adx_length), None
+    state = new_state() if state is None else np.array(state, dtype=np.float64)
+    out = np.empty((len(close), 3))
+    _fused_kernel(high, low, close, state, out, ema_length, rsi_length, adx_length)
+    return out, state
+
+
+def fused_indicators_2d(high, low, close, ema_length=20, rsi_length=14, adx_length=14):
+    """
+    Batched kernel over (symbols x bars) arrays, one symbol per thread.
+    Rows may be left-padded with NaN. Returns a (symbols, bars, 3) array.
+    """
+    high, low, close = _as_contiguous(high, low, close)
+    out = np.full(close.shape + (3,), np.nan)
+    if HAVE_NUMBA:
+        _fused_kernel_2d(high, low, close, out, ema_length, rsi_length, adx_length)
+        return out
+    for s in range(close.shape[0]):
+        valid = np.flatnonzero(~np.isnan(close[s]))
+        if len(valid):
+            first = valid[0]
+            out[s, first:] = _pandas_indicators(high[s, first:], low[s, first:], close[s, first:],
+                                                ema_length, rsi_length, adx_length)
+    return out
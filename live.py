@@ -0,0 +1,283 @@
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from indicators import INDICATOR_COLUMNS, IndicatorState, extend_indicators
+from price_store import normalize_bars, priced_rows
+from signal_engine import compute_signals, to_categorical
+from transport import TransientError
+
+# ---------------- LIVE INTRADAY MODE ----------------
+# A background poller (or any feed adapter) pushes 1-minute bars into a fixed-size
+# ring buffer per symbol. The newest bar is provisional until a later bar arrives:
+# its indicators are previewed from the committed IndicatorState, then committed
+# once it closes, so every update costs O(1) regardless of history length. Bars and
+# indicators are shared by every session watching a symbol; the signals are computed
+# from them at snapshot time with the viewer's own thresholds and AI/VIX/PCR.
+
+BAR_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+LIVE_COLUMNS = BAR_COLUMNS + INDICATOR_COLUMNS
+DEFAULT_CAPACITY = 2000  # about five sessions of 1-minute bars
+
+
+class RingBuffer:
+    """Preallocated circular storage for timestamps plus float columns."""
+
+    def __init__(self, capacity, columns):
+        self.capacity = capacity
+        self.columns = list(columns)
+        self.times = np.zeros(capacity, dtype="datetime64[ns]")
+        self.values = np.full((capacity, len(self.columns)), np.nan)
+        self.start = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def _slot(self, i):
+        return (self.start + i) % self.capacity
+
+    def append(self, timestamp, row):
+        """Add a row, overwriting the oldest one when full."""
+        if self.size < self.capacity:
+            slot = self._slot(self.size)
+            self.size += 1
+        else:
+            slot = self.start
+            self.start = (self.start + 1) % self.capacity
+        self.times[slot] = np.datetime64(pd.Timestamp(timestamp), "ns")
+        self.values[slot] = row
+
+    def replace_last(self, row):
+        self.values[self._slot(self.size - 1)] = row
+
+    def last_time(self):
+        return pd.Timestamp(self.times[self._slot(self.size - 1)]) if self.size else None
+
+    def last(self, n=1):
+        """The newest `n` rows as (times, values) copies, oldest first."""
+        n = min(n, self.size)
+        idx = (self.start + np.arange(self.size - n, self.size)) % self.capacity
+        return self.times[idx], self.values[idx]
+
+    def to_frame(self):
+        times, values = self.last(self.size)
+        df = pd.DataFrame(values, columns=self.columns)
+        df.insert(0, "Date", times)
+        return df
+
+
+class LiveSeries:
+    """Ring buffer of intraday bars for one symbol with incrementally updated indicators."""
+
+    def __init__(self, symbol, capacity=DEFAULT_CAPACITY):
+        self.symbol = symbol
+        self.ring = RingBuffer(capacity, LIVE_COLUMNS)
+        self.state = IndicatorState()
+        self.previous_close = np.nan
+        self.updated_at = None
+        self.viewed_at = time.time()
+        self.interval = 15.0  # seconds between polls (set by LiveHub.watch)
+        self.polled_at = time.time()
+        self._pending = None  # (timestamp, OHLCV) of the provisional newest bar
+        self._lock = threading.Lock()
+
+    def seed(self, bars, previous_close=np.nan):
+        """Start from a block of history (one compiled-kernel pass), newest bar provisional."""
+        bars = normalize_bars(bars).reset_index()
+        with self._lock:
+            self.state = IndicatorState()
+            self.ring = RingBuffer(self.ring.capacity, LIVE_COLUMNS)
+            self._pending = None
+            self.previous_close = float(previous_close)
+            if bars.empty:
+                return
+            values = extend_indicators(self.state, bars, provisional_last=True)
+            ohlcv = bars.reindex(columns=BAR_COLUMNS).to_numpy(dtype=np.float64)
+            rows = np.hstack([ohlcv, values])
+            keep = slice(-self.ring.capacity, None)
+            for ts, row in zip(bars["Date"].iloc[keep], rows[keep]):
+                self.ring.append(ts, row)
+            self._pending = (pd.Timestamp(bars["Date"].iloc[-1]), ohlcv[-1])
+            self.updated_at = time.time()
+
+    def push(self, timestamp, open_, high, low, close, volume=np.nan):
+        """
+        Add or update one bar. A bar with the same timestamp as the newest one revises
+        it; a later bar commits the newest one and becomes the provisional bar.
+        Returns False for bars older than the newest one (ignored).
+        """
+        timestamp = pd.Timestamp(timestamp)
+        ohlcv = np.array([open_, high, low, close, volume], dtype=np.float64)
+        with self._lock:
+            last = self.ring.last_time()
+            if last is not None and timestamp < last:
+                return False
+            if last is not None and timestamp > last and self._pending is not None:
+                ts, bar = self._pending
+                self.state.update(bar[1], bar[2], bar[3], ts)
+            indicators = self.state.preview(high, low, close)
+            row = np.concatenate([ohlcv, indicators])
+            if last is None or timestamp > last:
+                self.ring.append(timestamp, row)
+            self.ring.replace_last(row)
+            self._pending = (timestamp, ohlcv)
+            self.updated_at = time.time()
+            return True
+
+    def push_frame(self, bars):
+        """Push every bar of a frame at or after the newest bar (what a poll returns)."""
+        bars = normalize_bars(bars)
+        last = self.ring.last_time()
+        if last is not None:
+            bars = bars[bars.index >= last]
+        count = 0
+        for ts, row in zip(bars.index, bars.reindex(columns=BAR_COLUMNS).to_numpy(dtype=np.float64)):
+            count += self.push(ts, *row)
+        return count
+
+    def snapshot(self, thresholds=None, ai=np.nan, vix=np.nan, pcr=np.nan):
+        """
+        (frame, last price, change vs previous close), the frame copied under the lock with
+        a `signal` column for these thresholds and AI/VIX/PCR (one vectorized pass).
+        """
+        with self._lock:
+            self.viewed_at = time.time()
+            df = self.ring.to_frame()
+        if df.empty:
+            return df, np.nan, np.nan
+        codes = compute_signals(df["Close"], df["EMA20"], df["RSI"], df["ADX"], ai, vix, pcr, thresholds)
+        df["signal"] = to_categorical(codes)
+        price = df["Close"].iloc[-1]
+        return df, price, price - self.previous_close
+
+
+# ---------------- SOURCES ----------------
+def yf_intraday_source(symbol, period="1d", interval="1m", session=None, timeout=10):
+    """Latest intraday bars from Yahoo Finance (one request per poll)."""
+    import yfinance as yf
+
+    df = yf.download(symbol, period=period, interval=interval, progress=False, session=session, timeout=timeout)
+    # The latest session's bars are returned even when the market is closed, so none is a failure
+    if priced_rows(df).empty:
+        raise TransientError(f"Yahoo Finance returned no intraday bars for {symbol}.")
+    return df
+
+
+def yf_previous_close(symbol, downloader=None):
+    """Last daily close before today; `downloader` has `price_store.yf_downloader`'s signature."""
+    today = pd.Timestamp.now().normalize()
+    if downloader is None:
+        from price_store import yf_downloader as downloader
+    daily = normalize_bars(downloader(symbol, today - pd.Timedelta(days=7), today + pd.Timedelta(days=1)))
+    earlier = daily[daily.index < today]
+    return float(earlier["Close"].iloc[-1]) if not earlier.empty else np.nan
+
+
+class ReplaySource:
+    """
+    Local feed adapter: replays a bar frame a few rows per poll, as if the bars were
+    arriving live. Useful offline and outside market hours.
+    """
+
+    def __init__(self, bars, start=50, step=1):
+        self.bars = normalize_bars(bars)
+        self.position = start
+        self.step = step
+
+    def history(self):
+        return self.bars.iloc[: self.position]
+
+    def __call__(self, symbol):
+        self.position = min(self.position + self.step, len(self.bars))
+        return self.bars.iloc[max(self.position - self.step, 0): self.position]
+
+
+class LiveHub:
+    """
+    Owns the LiveSeries of every watched symbol and one daemon thread that polls
+    `source(symbol)` for each symbol every `series.interval` seconds (`interval` unless
+    set by `watch`). Symbols nobody has looked at for `idle_timeout` seconds are
+    dropped, and the thread exits when none are left.
+    """
+
+    def __init__(self, source=yf_intraday_source, seed_source=None, previous_close=yf_previous_close,
+                 interval=15.0, capacity=DEFAULT_CAPACITY, idle_timeout=300.0, tick=1.0):
+        self.source = source
+        self.seed_source = seed_source or (lambda symbol: source(symbol))
+        self.previous_close = previous_close
+        self.interval = interval
+        self.capacity = capacity
+        self.idle_timeout = idle_timeout
+        self.tick = tick
+        self.series = {}
+        self.errors = {}
+        self._seeding = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def watch(self, symbol, interval=None):
+        """
+        Seed a symbol (once) and make sure the poller is running. Returns its LiveSeries.
+        `interval` sets how often the symbol is polled; the latest watcher's value wins.
+        """
+        with self._lock:
+            series = self.series.get(symbol)
+            new = series is None
+            if new:
+                series = self.series[symbol] = LiveSeries(symbol, self.capacity)
+                series.interval = float(self.interval)
+                self._seeding.add(symbol)
+            if interval is not None:
+                series.interval = float(interval)
+        if new:
+            # Seeding goes to the network: other watchers and the poller don't wait for it
+            try:
+                series.seed(self.seed_source(symbol), self.previous_close(symbol))
+            except Exception as e:
+                self.errors[symbol] = e
+            series.polled_at = time.time()
+            with self._lock:
+                self._seeding.discard(symbol)
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="live-poller", daemon=True)
+                self._thread.start()
+        return series
+
+    def unwatch(self, symbol):
+        with self._lock:
+            self.series.pop(symbol, None)
+
+    def poll_once(self, force=False):
+        """Fetch new bars for every seeded symbol whose interval has passed (all of them with `force`)."""
+        now = time.time()
+        with self._lock:
+            due = [(symbol, series) for symbol, series in self.series.items()
+                   if symbol not in self._seeding and (force or now - series.polled_at >= series.interval)]
+        for symbol, series in due:
+            series.polled_at = now
+            try:
+                series.push_frame(self.source(symbol))
+                self.errors.pop(symbol, None)
+            except Exception as e:
+                self.errors[symbol] = e
+
+    def _run(self):
+        while not self._stop.is_set():
+            now = time.time()
+            with self._lock:
+                for symbol in [s for s, series in self.series.items() if now - series.viewed_at > self.idle_timeout]:
+                    del self.series[symbol]
+                if not self.series:
+                    self._thread = None
+                    return
+            self.poll_once()
+            self._stop.wait(self.tick)
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,340 @@
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from greeks import DEFAULT_RATE, EXPIRY_TIME, black_price, option_prices, years_to_expiry
+
+# ---------------- MONTE CARLO EXPIRY PROBABILITIES ----------------
+# Simulated closes at expiry, for the report's Upside/Downside/Flat probabilities and
+# the expected P&L of each option strategy at each strike. Only the close at expiry
+# matters to these payoffs, so GBM draws one normal per path and the bootstrap sums one
+# resampled daily return per session left. A million paths to a weekly expiry take
+# about a quarter of a second.
+#
+# The simulated closes are sorted once. With prefix sums, every strike's expected
+# payoff is then exact, and a binary search gives P(profit). Quantiles of the monotone
+# payoffs come from quantiles of the close. Premiums are the chain's mid/last prices,
+# or Black-76 at the simulated volatility where a strike is not quoted.
+
+MODELS = ["gbm", "bootstrap"]
+VOL_SOURCES = ["iv", "realized"]
+STRATEGIES = ["Long Call", "Long Put", "Short Call", "Short Put", "Long Strangle"]
+STRATEGY_COLUMNS = ["Strategy", "Put Strike", "Call Strike", "Premium", "Expected P&L", "Return",
+                    "P(Profit)", "P5", "Median", "P95", "Breakeven Low", "Breakeven High"]
+DEFAULT_PATHS = 1_000_000
+DEFAULT_SEED = 7  # fixed, so the same inputs give the same prompt (and AI cache hits)
+SESSIONS_PER_YEAR = 252
+QUANTILES = (0.05, 0.5, 0.95)
+PAIR_TABLE_MAX = 1_000_000
+
+
+def _sum_draws(values, steps, paths, rng):
+    """Sums of `steps` draws with replacement from `values`, one per path."""
+    total = np.zeros(paths)
+    m = len(values)
+    if steps >= 2 and m * m <= PAIR_TABLE_MAX:
+        # One draw from the table of all pairwise sums is two draws from `values`
+        pairs = (values[:, None] + values[None, :]).ravel()
+        for _ in range(steps // 2):
+            total += pairs[rng.integers(0, len(pairs), paths)]
+        steps %= 2
+    for _ in range(steps):
+        total += values[rng.integers(0, m, paths)]
+    return total
+
+
+def log_returns(close):
+    """Finite log returns of a close series."""
+    close = np.asarray(close, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = np.diff(np.log(close))
+    return returns[np.isfinite(returns)]
+
+
+def realized_vol(close, lookback=60, periods_per_year=SESSIONS_PER_YEAR):
+    """Annualized std of the last `lookback` log returns (NaN with fewer than 2)."""
+    returns = log_returns(close)[-lookback:]
+    if len(returns) < 2:
+        return np.nan
+    return float(returns.std(ddof=1) * np.sqrt(periods_per_year))
+
+
+def sessions_to_expiry(expiry, now):
+    """Trading sessions (weekdays) whose 15:30 close falls after `now`, up to and including `expiry`."""
+    now = pd.Timestamp(now)
+    today = now.normalize()
+    if now - today >= EXPIRY_TIME:
+        today += pd.Timedelta(days=1)
+    end = pd.Timestamp(expiry).normalize() + pd.Timedelta(days=1)
+    if end <= today:
+        return 0
+    return int(np.busday_count(today.date(), end.date()))
+
+
+def _calendar_years(expiry, now):
+    return float(years_to_expiry([np.datetime64(pd.Timestamp(expiry), "D")], now)[0])
+
+
+def horizon(expiry, now, vol_source="iv"):
+    """
+    (years, sessions) until the expiry close. Option IV is quoted on a 365-day calendar
+    year (as in greeks.py), realized volatility on 252 sessions, so the year fraction
+    follows the volatility it is paired with.
+    """
+    sessions = sessions_to_expiry(expiry, now)
+    if vol_source == "iv":
+        years = _calendar_years(expiry, now)
+    else:
+        years = sessions / SESSIONS_PER_YEAR
+    return max(years, 0.0), sessions
+
+
+def simulate_closes(spot, sigma, years, paths=DEFAULT_PATHS, model="gbm", returns=None, steps=1,
+                    drift=0.0, seed=DEFAULT_SEED):
+    """
+    `paths` simulated closes after `years`. 'gbm' is lognormal with annual volatility
+    `sigma` and drift `drift`. 'bootstrap' sums `steps` daily log returns drawn with
+    replacement from `returns`, demeaned and rescaled to `sigma`, so the shape (fat
+    tails, skew) is historical and the volatility the chosen one. Raises ValueError on
+    an unknown model or missing inputs.
+    """
+    if model not in MODELS:
+        raise ValueError(f"Unknown model {model!r}; expected one of {MODELS}.")
+    if not (np.isfinite(spot) and spot > 0 and np.isfinite(sigma) and sigma > 0 and years > 0):
+        raise ValueError("A positive spot, volatility and time to expiry are required.")
+    paths = int(paths)
+    log_drift = (drift - 0.5 * sigma * sigma) * years
+    if model == "gbm":
+        shocks = np.random.default_rng(seed).standard_normal(paths)
+        shocks *= sigma * np.sqrt(years)
+    else:
+        returns = np.asarray(returns if returns is not None else [], dtype=np.float64)
+        returns = returns[np.isfinite(returns)]
+        steps = max(int(steps), 1)
+        if len(returns) < 2 or returns.std() == 0:
+            raise ValueError("The bootstrap needs at least two distinct historical returns.")
+        scaled = (returns - returns.mean()) * (sigma * np.sqrt(years / steps) / returns.std(ddof=1))
+        shocks = _sum_draws(scaled, steps, paths, np.random.default_rng(seed))
+    shocks += log_drift
+    return spot * np.exp(shocks, out=shocks)
+
+
+def outcome_probabilities(closes, spot, flat_band=0.005):
+    """Share of closes above, below and within ±`flat_band` (a fraction) of `spot`."""
+    closes = np.sort(closes) if not _is_sorted(closes) else closes
+    n = len(closes)
+    below = np.searchsorted(closes, spot * (1.0 - flat_band), side="left")
+    above = n - np.searchsorted(closes, spot * (1.0 + flat_band), side="right")
+    return {"Upside": above / n, "Downside": below / n, "Flat": (n - above - below) / n}
+
+
+def _is_sorted(values):
+    return len(values) < 2 or bool(np.all(values[1:] >= values[:-1]))
+
+
+def chain_quotes(chain, expiry):
+    """
+    (expiry, strikes, call, put) of the first chain expiry on or after `expiry` (the last
+    one if all are earlier), with call/put premiums NaN where a leg is not quoted.
+    """
+    expiries = chain.expiries
+    if not len(expiries):
+        raise ValueError("The option chain has no expiries.")
+    target = np.datetime64(pd.Timestamp(expiry), "D")
+    later = expiries[expiries >= target]
+    chosen = pd.Timestamp(later[0] if len(later) else expiries[-1])
+    rows = chain.for_expiry(chosen)
+    order = np.argsort(rows["strike"])
+    call = option_prices(rows["ce_bid"], rows["ce_ask"], rows["ce_ltp"])[order]
+    put = option_prices(rows["pe_bid"], rows["pe_ask"], rows["pe_ltp"])[order]
+    return chosen, np.asarray(rows["strike"], dtype=np.float64)[order], call, put
+
+
+def strike_grid(spot, count=10, step=None):
+    """`count` strikes either side of the one nearest `spot`, `step` apart (about 0.25% of spot by default)."""
+    if step is None:
+        raw = spot * 0.0025
+        magnitude = 10.0 ** np.floor(np.log10(raw))
+        step = min((m * magnitude for m in (1, 2, 5, 10)), key=lambda s: abs(s - raw))
+    atm = np.round(spot / step) * step
+    return atm + step * np.arange(-count, count + 1)
+
+
+def strikes_near(strikes, spot, count=10):
+    """Positions of the `count` strikes either side of the one nearest `spot` (strikes sorted)."""
+    atm = int(np.argmin(np.abs(strikes - spot)))
+    return np.arange(max(atm - count, 0), min(atm + count + 1, len(strikes))), atm
+
+
+class SimulationResult:
+    """Outcome probabilities, close distribution and strategy table of one simulation."""
+
+    def __init__(self, spot, expiry, model, vol_source, sigma, years, sessions, paths, flat_band,
+                 probabilities, close_quantiles, expected_close, histogram, strategies, elapsed):
+        self.spot = spot
+        self.expiry = expiry
+        self.model = model
+        self.vol_source = vol_source
+        self.sigma = sigma
+        self.years = years
+        self.sessions = sessions
+        self.paths = paths
+        self.flat_band = flat_band
+        self.probabilities = probabilities
+        self.close_quantiles = close_quantiles
+        self.expected_close = expected_close
+        self.histogram = histogram  # (counts, bin edges) between the 0.5% and 99.5% quantiles
+        self.strategies = strategies
+        self.elapsed = elapsed
+        self.id = uuid.uuid4().hex  # identifies this run (e.g. as a cache key)
+
+    def best(self):
+        """The row with the highest expected P&L of each strategy, in STRATEGIES order."""
+        table = self.strategies
+        if table.empty:
+            return table
+        rows = table.loc[table.groupby("Strategy", sort=False)["Expected P&L"].idxmax()]
+        return rows.set_index("Strategy").reindex(STRATEGIES).dropna(how="all").reset_index()
+
+
+def _leg_table(closes, prefix, strikes, premium, is_call, short):
+    """Expected P&L, P(profit), P&L quantiles and breakeven of one leg at each strike."""
+    n = len(closes)
+    below = np.searchsorted(closes, strikes, side="right")
+    if is_call:
+        payoff = (prefix[n] - prefix[below] - strikes * (n - below)) / n
+        breakeven = strikes + premium
+        wins = n - np.searchsorted(closes, breakeven, side="right")
+    else:
+        payoff = (strikes * below - prefix[below]) / n
+        breakeven = strikes - premium
+        wins = np.searchsorted(closes, breakeven, side="left")
+    expected = payoff - premium
+    profit = wins / n
+    # Payoffs are monotone in the close, so their quantiles are payoffs at close quantiles
+    # (rising for long calls and short puts, falling for the other two)
+    quantiles = []
+    for q in QUANTILES:
+        k = int(round(q * (n - 1)))
+        close = closes[k if is_call != short else n - 1 - k]
+        value = (np.maximum(close - strikes, 0.0) if is_call else np.maximum(strikes - close, 0.0)) - premium
+        quantiles.append(-value if short else value)
+    if short:
+        expected, profit = -expected, 1.0 - profit
+    return expected, profit, quantiles, breakeven
+
+
+def _strangle_quantiles(closes, kp, kc, iterations=64):
+    """
+    QUANTILES of the strangle payoff max(kp - S, 0) + max(S - kc, 0) per (kp, kc) row.
+    The payoff is not monotone in S, but #(payoff <= x) is two binary searches, so each
+    quantile is found by bisection on x instead of sorting the payoffs.
+    """
+    n = len(closes)
+    need = np.array([int(round(q * (n - 1))) + 1 for q in QUANTILES])
+    kp, kc = kp[:, None], kc[:, None]
+    lo = np.zeros((len(kp), len(need)))
+    hi = np.maximum(np.maximum(kp - closes[0], closes[-1] - kc), 0.0) + lo
+    count = lambda x: np.searchsorted(closes, kc + x, side="right") - np.searchsorted(closes, kp - x, side="left")
+    done = count(lo) >= need
+    hi[done] = 0.0
+    for _ in range(iterations):
+        mid = 0.5 * (lo + hi)
+        enough = count(mid) >= need
+        hi = np.where(enough, mid, hi)
+        lo = np.where(enough, lo, mid)
+    return hi
+
+
+def strategy_table(closes, strikes, call, put, spot, count=10):
+    """
+    STRATEGY_COLUMNS rows for the single legs at the `count` strikes either side of ATM
+    and long strangles `1..count` strikes out, from sorted simulated `closes`. P&L is per
+    unit of the underlying at expiry, before costs; Return is on the premium paid or
+    received.
+    """
+    closes = np.asarray(closes, dtype=np.float64)
+    n = len(closes)
+    prefix = np.concatenate([[0.0], np.cumsum(closes)])
+    near, atm = strikes_near(strikes, spot, count)
+    frames = []
+    for name, is_call, short in (("Long Call", True, False), ("Long Put", False, False),
+                                 ("Short Call", True, True), ("Short Put", False, True)):
+        premium = (call if is_call else put)[near]
+        k = strikes[near]
+        expected, profit, (p5, p50, p95), breakeven = _leg_table(closes, prefix, k, premium, is_call, short)
+        frames.append(pd.DataFrame({
+            "Strategy": name,
+            "Put Strike": np.nan if is_call else k,
+            "Call Strike": k if is_call else np.nan,
+            "Premium": premium, "Expected P&L": expected, "Return": expected / premium,
+            "P(Profit)": profit, "P5": p5, "Median": p50, "P95": p95,
+            "Breakeven Low": np.nan if is_call else breakeven,
+            "Breakeven High": breakeven if is_call else np.nan,
+        }))
+
+    # Strangles: put i strikes below ATM with the call i strikes above
+    widths = np.arange(1, count + 1)
+    widths = widths[(atm - widths >= 0) & (atm + widths < len(strikes))]
+    if len(widths):
+        kp, kc = strikes[atm - widths], strikes[atm + widths]
+        cost = put[atm - widths] + call[atm + widths]
+        below_put = np.searchsorted(closes, kp, side="right")
+        below_call = np.searchsorted(closes, kc, side="right")
+        payoff = ((kp * below_put - prefix[below_put])
+                  + (prefix[n] - prefix[below_call] - kc * (n - below_call))) / n
+        low, high = kp - cost, kc + cost
+        profit = (np.searchsorted(closes, low, side="left")
+                  + n - np.searchsorted(closes, high, side="right")) / n
+        quantiles = _strangle_quantiles(closes, kp, kc) - cost[:, None]
+        frames.append(pd.DataFrame({
+            "Strategy": "Long Strangle", "Put Strike": kp, "Call Strike": kc, "Premium": cost,
+            "Expected P&L": payoff - cost, "Return": (payoff - cost) / cost, "P(Profit)": profit,
+            "P5": quantiles[:, 0], "Median": quantiles[:, 1], "P95": quantiles[:, 2],
+            "Breakeven Low": low, "Breakeven High": high,
+        }))
+    table = pd.concat(frames, ignore_index=True)
+    return table[np.isfinite(table["Premium"].to_numpy()) & (table["Premium"].to_numpy() > 0)][STRATEGY_COLUMNS] \
+        .reset_index(drop=True)
+
+
+def run_simulation(spot, expiry, now, sigma, strikes=None, call=None, put=None, model="gbm", vol_source="iv",
+                   returns=None, paths=DEFAULT_PATHS, flat_band=0.005, drift=0.0, rate=DEFAULT_RATE,
+                   count=10, seed=DEFAULT_SEED, bins=80):
+    """
+    Simulate closes at the `expiry` close from `now` and summarise them. `strikes` with
+    `call`/`put` premiums (NaN where unquoted) come from the chain (`chain_quotes`);
+    without them a synthetic `strike_grid` is priced with Black-76. Raises ValueError
+    when the expiry has passed or the inputs cannot be simulated.
+    """
+    started = time.perf_counter()
+    years, sessions = horizon(expiry, now, vol_source)
+    if sessions < 1 or years <= 0:
+        raise ValueError(f"Expiry {pd.Timestamp(expiry):%d-%b-%Y} has already closed.")
+    closes = simulate_closes(spot, sigma, years, paths, model, returns, sessions, drift, seed)
+    closes.sort()
+
+    if strikes is None or not len(strikes):
+        strikes = strike_grid(spot, count)
+        call = put = np.full(len(strikes), np.nan)
+    strikes = np.asarray(strikes, dtype=np.float64)
+    # Unquoted strikes are priced at the simulated volatility
+    t = _calendar_years(expiry, now) if vol_source == "iv" else years
+    forward = spot * np.exp(rate * t)
+    call = np.where(np.isfinite(call), call, black_price(forward, strikes, t, rate, sigma, True))
+    put = np.where(np.isfinite(put), put, black_price(forward, strikes, t, rate, sigma, False))
+
+    n = len(closes)
+    lo, hi = closes[int(0.005 * (n - 1))], closes[int(0.995 * (n - 1))]
+    counts, edges = np.histogram(closes, bins=bins, range=(lo, hi))
+    return SimulationResult(
+        spot=float(spot), expiry=pd.Timestamp(expiry), model=model, vol_source=vol_source, sigma=float(sigma),
+        years=years, sessions=sessions, paths=n, flat_band=flat_band,
+        probabilities=outcome_probabilities(closes, spot, flat_band),
+        close_quantiles={q: float(closes[int(round(q * (n - 1)))]) for q in QUANTILES},
+        expected_close=float(closes.mean()), histogram=(counts, edges),
+        strategies=strategy_table(closes, strikes, call, put, spot, count),
+        elapsed=time.perf_counter() - started,
+    )
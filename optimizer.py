@@ -0,0 +1,155 @@
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from backtest_engine import batch_metrics, simple_returns
+from signal_engine import evaluate_signals
+
+# ---------------- THRESHOLD OPTIMIZER ----------------
+# Grid or random search over the signal thresholds. Each chunk of parameter sets is
+# evaluated as one (sets x bars) signal matrix and scored with batch_metrics; chunks
+# are spread over a process pool. Walk-forward mode ranks sets on a training window
+# and reports how the winners did on the following test window.
+
+DEFAULT_GRID = {
+    "rsi_buy": [50, 55, 60, 65],
+    "rsi_sell": [35, 40, 45, 50],
+    "adx_min": [15, 20, 25, 30],
+    "ai_threshold": [40, 50, 60],
+    "vix_threshold": [14, 17, 20],
+    "pcr_threshold": [0.8, 1.0, 1.2],
+}
+
+# Inclusive (low, high) ranges for random search
+DEFAULT_RANGES = {
+    "rsi_buy": (50, 70),
+    "rsi_sell": (30, 50),
+    "adx_min": (10, 35),
+    "ai_threshold": (30, 70),
+    "vix_threshold": (10, 25),
+    "pcr_threshold": (0.6, 1.5),
+}
+
+METRICS = ["total_return", "sharpe", "max_drawdown", "trades", "exposure"]
+
+# Bound the (sets x bars) working set per chunk to roughly this many cells
+_CELLS_PER_CHUNK = 8_000_000
+
+
+def grid_sets(grid=None):
+    """Every combination of the grid values as a DataFrame (one row per set)."""
+    grid = grid or DEFAULT_GRID
+    names = list(grid)
+    return pd.DataFrame(list(itertools.product(*(grid[n] for n in names))), columns=names)
+
+
+def random_sets(n, ranges=None, seed=None):
+    """`n` parameter sets drawn uniformly from `ranges`."""
+    ranges = ranges or DEFAULT_RANGES
+    rng = np.random.default_rng(seed)
+    sets = {}
+    for name, (lo, hi) in ranges.items():
+        if isinstance(lo, int) and isinstance(hi, int):
+            sets[name] = rng.integers(lo, hi + 1, n)
+        else:
+            sets[name] = np.round(rng.uniform(lo, hi, n), 2)
+    return pd.DataFrame(sets)
+
+
+def _score_chunk(args):
+    """Worker: score one chunk of parameter sets (runs in a child process)."""
+    features, param_sets, cost_kwargs = args
+    close, ema, rsi, adx, ai, vix, pcr = features
+    codes = evaluate_signals(close, ema, rsi, adx, ai, vix, pcr, param_sets)
+    return batch_metrics(simple_returns(close), codes, **cost_kwargs)
+
+
+def _chunks(param_sets, n_bars, workers):
+    per_chunk = max(1, min(_CELLS_PER_CHUNK // max(n_bars, 1), -(-len(param_sets) // max(workers, 1))))
+    for i in range(0, len(param_sets), per_chunk):
+        yield param_sets.iloc[i:i + per_chunk]
+
+
+def evaluate_param_sets(features, param_sets, start=0, stop=None, workers=None, **cost_kwargs):
+    """
+    Score every parameter set on bars [start, stop).
+
+    `features` is (close, ema, rsi, adx, ai, vix, pcr); ai/vix/pcr may be scalars or
+    per-bar arrays. `cost_kwargs` are passed to batch_metrics (cost_bps, slippage_bps,
+    hold, periods_per_year). Returns `param_sets` with one column per metric.
+    """
+    param_sets = param_sets.reset_index(drop=True)
+    # Slice once here so each worker only receives the bars it scores
+    features = tuple(f[start:stop] if np.ndim(f) else f for f in features)
+    n_bars = len(features[0])
+    workers = workers if workers is not None else min(os.cpu_count() or 1, 8)
+    jobs = [(features, chunk, cost_kwargs) for chunk in _chunks(param_sets, n_bars, workers)]
+
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_score_chunk, jobs))
+    else:
+        parts = [_score_chunk(job) for job in jobs]
+
+    scores = {m: np.concatenate([p[m] for p in parts]) for m in METRICS}
+    return param_sets.assign(**scores)
+
+
+def rank(results, objective="sharpe"):
+    """Best sets first; NaN scores go last."""
+    return results.sort_values(objective, ascending=False, na_position="last", ignore_index=True)
+
+
+def optimize(features, param_sets, objective="sharpe", workers=None, **cost_kwargs):
+    """Evaluate all sets on the full history and return a ranked table."""
+    return rank(evaluate_param_sets(features, param_sets, workers=workers, **cost_kwargs), objective)
+
+
+def walk_forward(features, param_sets, n_splits=4, train_frac=0.7, objective="sharpe", top=5,
+                 workers=None, **cost_kwargs):
+    """
+    Rolling walk-forward: the history is cut into `n_splits` consecutive windows, each
+    split into train/test by `train_frac`. Every set is scored on each train window;
+    the `top` sets are then scored on the test window that follows.
+    Returns (folds, summary): one row per (fold, selected set), and the mean
+    out-of-sample score of each selected set across folds.
+    """
+    n = len(features[0])
+    edges = np.linspace(0, n, n_splits + 1, dtype=int)
+    names = list(param_sets.columns)
+    folds = []
+    for fold, (lo, hi) in enumerate(zip(edges[:-1], edges[1:])):
+        cut = lo + int((hi - lo) * train_frac)
+        if cut - lo < 2 or hi - cut < 2:
+            continue
+        train = rank(evaluate_param_sets(features, param_sets, lo, cut, workers, **cost_kwargs), objective)
+        best = train.head(top)
+        test = evaluate_param_sets(features, best[names], cut, hi, workers=1, **cost_kwargs)
+        folds.append(pd.DataFrame({
+            "fold": fold,
+            "train_start": lo, "test_start": cut, "test_end": hi,
+            **{name: best[name].to_numpy() for name in names},
+            f"train_{objective}": best[objective].to_numpy(),
+            f"test_{objective}": test[objective].to_numpy(),
+            "test_total_return": test["total_return"].to_numpy(),
+        }))
+    if not folds:
+        return pd.DataFrame(), pd.DataFrame()
+    folds = pd.concat(folds, ignore_index=True)
+    summary = (
+        folds.groupby(names, as_index=False)
+        .agg(folds_selected=("fold", "nunique"), **{
+            f"mean_test_{objective}": (f"test_{objective}", "mean"),
+            "mean_test_return": ("test_total_return", "mean"),
+        })
+        .sort_values(f"mean_test_{objective}", ascending=False, na_position="last", ignore_index=True)
+    )
+    return folds, summary
+
+
+def heatmap_table(results, x, y, objective="sharpe"):
+    """Best objective for each (x, y) pair, maximized over the other parameters."""
+    return results.pivot_table(index=y, columns=x, values=objective, aggfunc="max")
@@ -0,0 +1,380 @@
+import json
+import os
+import re
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import tracing
+from price_store import _atomic_write
+
+# ---------------- OPTION CHAIN ANALYTICS ----------------
+# The NSE option chain JSON is parsed once into flat, strike-aligned NumPy columns
+# (one row per strike/expiry, CE and PE side by side). PCR, max pain and OI buildup
+# are computed from those columns without touching the JSON again. Parsed chains are
+# snapshotted to Parquet with their timestamp, so intraday OI changes come from a
+# diff of two snapshots rather than another round of parsing.
+
+DEFAULT_ROOT = os.environ.get("OPTION_CHAIN_DIR", os.path.join(".market_cache", "option_chain"))
+
+# Column suffix -> NSE field name, taken from each CE/PE leg
+LEG_FIELDS = {
+    "oi": "openInterest",
+    "chg_oi": "changeinOpenInterest",
+    "volume": "totalTradedVolume",
+    "ltp": "lastPrice",
+    "ltp_chg": "change",
+    "iv": "impliedVolatility",
+    "bid": "bidprice",
+    "ask": "askPrice",
+}
+# Counts default to 0 when a leg is missing; prices and IV to NaN
+_COUNT_FIELDS = {"oi", "chg_oi", "volume"}
+
+CHAIN_COLUMNS = ["strike", "expiry"] + [f"{leg}_{f}" for leg in ("ce", "pe") for f in LEG_FIELDS]
+
+BUILDUP_LABELS = ["Long Buildup", "Short Buildup", "Long Unwinding", "Short Covering", "-"]
+
+# Moneyness bands (% distance of strike from spot) for PCR by strike band
+DEFAULT_BANDS = (-5.0, -2.0, -1.0, 0.0, 1.0, 2.0, 5.0)
+
+
+def _parse_date(value, fmt):
+    try:
+        return pd.to_datetime(value, format=fmt)
+    except (TypeError, ValueError):
+        return pd.NaT
+
+
+class OptionChain:
+    """Columnar option chain: `columns[name]` is one array per CHAIN_COLUMNS entry."""
+
+    def __init__(self, symbol, columns, underlying=np.nan, timestamp=None):
+        self.symbol = symbol
+        self.columns = columns
+        self.underlying = float(underlying) if underlying is not None else np.nan
+        self.timestamp = pd.Timestamp(timestamp) if timestamp is not None else pd.Timestamp.now()
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __len__(self):
+        return len(self.columns["strike"])
+
+    @property
+    def empty(self):
+        return len(self) == 0
+
+    @property
+    def expiries(self):
+        return np.unique(self.columns["expiry"])
+
+    def select(self, mask):
+        """A new chain with only the rows where `mask` is True."""
+        return OptionChain(self.symbol, {k: v[mask] for k, v in self.columns.items()},
+                           self.underlying, self.timestamp)
+
+    def for_expiry(self, expiry):
+        return self.select(self.columns["expiry"] == np.datetime64(pd.Timestamp(expiry), "D"))
+
+    def nearest_expiry(self):
+        """The first expiry on or after the snapshot date (None for an empty chain)."""
+        if self.empty:
+            return None
+        expiries = self.expiries
+        today = np.datetime64(self.timestamp.normalize(), "D")
+        upcoming = expiries[expiries >= today]
+        return pd.Timestamp(upcoming[0] if len(upcoming) else expiries[-1])
+
+    def to_frame(self):
+        return pd.DataFrame(self.columns, columns=CHAIN_COLUMNS)
+
+    @classmethod
+    def from_frame(cls, symbol, df, underlying=np.nan, timestamp=None):
+        columns = {c: df[c].to_numpy() for c in CHAIN_COLUMNS}
+        columns["expiry"] = columns["expiry"].astype("datetime64[D]")
+        return cls(symbol, columns, underlying, timestamp)
+
+
+def parse_chain(data, symbol="NIFTY"):
+    """
+    Parse `nsepython.option_chain` output into an OptionChain.
+    Raises ValueError when the payload has no `records.data`.
+    """
+    if not data or "records" not in data or "data" not in data["records"]:
+        raise ValueError(f"Invalid option chain data from NSE for {symbol}.")
+    records = data["records"]
+    rows = records["data"]
+
+    # One pass over the JSON: a flat row of floats per strike/expiry
+    empty = {}
+    fields = list(LEG_FIELDS.items())
+    defaults = [0.0 if f in _COUNT_FIELDS else np.nan for f, _ in fields]
+    values = np.array(
+        [
+            [row.get(leg, empty).get(key, d) for leg in ("CE", "PE") for (_, key), d in zip(fields, defaults)]
+            for row in rows
+        ],
+        dtype=np.float64,
+    ).reshape(len(rows), 2 * len(fields))
+
+    columns = {
+        "strike": np.array([row.get("strikePrice", np.nan) for row in rows], dtype=np.float64),
+        "expiry": pd.to_datetime(
+            pd.Series([row.get("expiryDate") for row in rows], dtype=object), format="%d-%b-%Y", errors="coerce"
+        ).to_numpy().astype("datetime64[D]"),
+    }
+    for i, name in enumerate(CHAIN_COLUMNS[2:]):
+        columns[name] = values[:, i]
+
+    order = np.lexsort((columns["strike"], columns["expiry"]))
+    columns = {k: v[order] for k, v in columns.items()}
+
+    underlying = records.get("underlyingValue")
+    if underlying is None:
+        underlying = next((row[leg]["underlyingValue"] for row in rows for leg in ("CE", "PE")
+                           if leg in row and "underlyingValue" in row[leg]), np.nan)
+    timestamp = _parse_date(records.get("timestamp"), "%d-%b-%Y %H:%M:%S")
+    return OptionChain(symbol, columns, underlying, None if pd.isna(timestamp) else timestamp)
+
+
+# ---------------- ANALYTICS ----------------
+def _pcr(pe, ce):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(ce > 0, pe / ce, np.nan)
+
+
+def total_pcr(chain):
+    """Put/call ratio of total open interest (NaN when there is no call OI)."""
+    ce = chain["ce_oi"].sum()
+    return round(float(chain["pe_oi"].sum() / ce), 2) if ce > 0 else np.nan
+
+
+def pcr_by_expiry(chain):
+    """CE/PE open interest and PCR per expiry."""
+    expiries, idx = np.unique(chain["expiry"], return_inverse=True)
+    ce = np.bincount(idx, weights=chain["ce_oi"], minlength=len(expiries))
+    pe = np.bincount(idx, weights=chain["pe_oi"], minlength=len(expiries))
+    return pd.DataFrame({"Expiry": pd.to_datetime(expiries), "CE OI": ce, "PE OI": pe, "PCR": _pcr(pe, ce)})
+
+
+def pcr_by_strike_band(chain, bands=DEFAULT_BANDS, expiry=None):
+    """
+    CE/PE open interest and PCR per moneyness band, where `bands` are edges in % of
+    the strike's distance from spot (strikes beyond the outer edges go to open bands).
+    """
+    if expiry is not None:
+        chain = chain.for_expiry(expiry)
+    edges = np.asarray(bands, dtype=np.float64)
+    moneyness = (chain["strike"] / chain.underlying - 1.0) * 100.0
+    idx = np.digitize(moneyness, edges)
+    n = len(edges) + 1
+    ce = np.bincount(idx, weights=chain["ce_oi"], minlength=n)
+    pe = np.bincount(idx, weights=chain["pe_oi"], minlength=n)
+    labels = [f"< {edges[0]:+g}%"]
+    labels += [f"{lo:+g}% to {hi:+g}%" for lo, hi in zip(edges[:-1], edges[1:])]
+    labels += [f">= {edges[-1]:+g}%"]
+    return pd.DataFrame({"Band": labels, "CE OI": ce, "PE OI": pe, "PCR": _pcr(pe, ce)})
+
+
+def max_pain(chain, expiry=None):
+    """
+    Max-pain strike for one expiry (the nearest by default): the settlement price at
+    which option writers pay out the least. Returns (strike, pain) where `pain` is a
+    DataFrame of the total payout at every candidate strike.
+    """
+    expiry = expiry if expiry is not None else chain.nearest_expiry()
+    if expiry is None:
+        return np.nan, pd.DataFrame(columns=["Strike", "Call Pain", "Put Pain", "Total Pain"])
+    chain = chain.for_expiry(expiry)
+    strikes = chain["strike"]
+    # (settlement x strike) payout matrix; chains have a few hundred strikes at most
+    diff = strikes[:, None] - strikes[None, :]
+    call_pain = np.maximum(diff, 0.0) @ chain["ce_oi"]
+    put_pain = np.maximum(-diff, 0.0) @ chain["pe_oi"]
+    total = call_pain + put_pain
+    pain = pd.DataFrame({"Strike": strikes, "Call Pain": call_pain, "Put Pain": put_pain, "Total Pain": total})
+    return (float(strikes[np.argmin(total)]) if len(total) else np.nan), pain
+
+
+def classify_buildup(price_change, oi_change):
+    """Vectorized OI buildup label: price/OI direction -> one of BUILDUP_LABELS."""
+    price_change = np.asarray(price_change, dtype=np.float64)
+    oi_change = np.asarray(oi_change, dtype=np.float64)
+    code = np.select(
+        [
+            (price_change > 0) & (oi_change > 0),
+            (price_change < 0) & (oi_change > 0),
+            (price_change < 0) & (oi_change < 0),
+            (price_change > 0) & (oi_change < 0),
+        ],
+        [0, 1, 2, 3],
+        default=4,
+    )
+    return np.asarray(BUILDUP_LABELS, dtype=object)[code]
+
+
+def oi_buildup(chain, expiry=None, since=None):
+    """
+    Per-strike OI buildup for one expiry (the nearest by default).
+    By default the changes are NSE's own day-on-day fields; pass an earlier snapshot
+    as `since` to classify the intraday change between the two snapshots instead.
+    """
+    expiry = expiry if expiry is not None else chain.nearest_expiry()
+    if expiry is None:
+        return pd.DataFrame()
+    changes = diff_chains(since, chain) if since is not None else chain
+    changes = changes.for_expiry(expiry)
+    table = {"Strike": changes["strike"]}
+    for leg, name in (("ce", "CE"), ("pe", "PE")):
+        table[f"{name} OI Chg"] = changes[f"{leg}_chg_oi"]
+        table[f"{name} LTP Chg"] = changes[f"{leg}_ltp_chg"]
+        table[f"{name} Buildup"] = classify_buildup(changes[f"{leg}_ltp_chg"], changes[f"{leg}_chg_oi"])
+    return pd.DataFrame(table)
+
+
+def _row_keys(chain):
+    return chain["expiry"].astype(np.int64) * 10_000_000 + np.round(chain["strike"] * 100).astype(np.int64)
+
+
+def diff_chains(old, new):
+    """
+    `new` with its change columns (chg_oi, ltp_chg) recomputed against `old`.
+    Rows are matched on (expiry, strike); rows missing from `old` count from zero OI.
+    """
+    new_keys = _row_keys(new)
+    if len(old):
+        old_keys = _row_keys(old)
+        order = np.argsort(old_keys)
+        pos = order[np.minimum(np.searchsorted(old_keys, new_keys, sorter=order), len(order) - 1)]
+        matched = old_keys[pos] == new_keys
+    else:
+        pos = np.zeros(len(new_keys), dtype=np.intp)
+        matched = np.zeros(len(new_keys), dtype=bool)
+
+    def previous(name, fill):
+        return np.where(matched, old[name][pos], fill) if len(old) else np.full(len(new_keys), fill)
+
+    columns = dict(new.columns)
+    for leg in ("ce", "pe"):
+        columns[f"{leg}_chg_oi"] = new[f"{leg}_oi"] - previous(f"{leg}_oi", 0.0)
+        columns[f"{leg}_ltp_chg"] = new[f"{leg}_ltp"] - previous(f"{leg}_ltp", np.nan)
+    return OptionChain(new.symbol, columns, new.underlying, new.timestamp)
+
+
+# ---------------- SNAPSHOTS ----------------
+class SnapshotStore:
+    """Timestamped Parquet snapshots of parsed chains, one directory per symbol."""
+
+    def __init__(self, root=DEFAULT_ROOT, keep=200):
+        self.root = root
+        self.keep = keep
+        os.makedirs(root, exist_ok=True)
+
+    def _dir(self, symbol):
+        path = os.path.join(self.root, re.sub(r"[^A-Za-z0-9_.-]", "_", symbol))
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def save(self, chain):
+        """Write a snapshot (a re-fetch with the same NSE timestamp overwrites it)."""
+        path = os.path.join(self._dir(chain.symbol), chain.timestamp.strftime("%Y%m%dT%H%M%S") + ".parquet")
+        df = chain.to_frame()
+        df.attrs = {"underlying": chain.underlying}
+        _atomic_write(path, lambda tmp: df.to_parquet(tmp))
+        return path
+
+    def timestamps(self, symbol):
+        """Snapshot times for a symbol, oldest first."""
+        names = sorted(n for n in os.listdir(self._dir(symbol)) if n.endswith(".parquet"))
+        return [pd.Timestamp(n[: -len(".parquet")]) for n in names]
+
+    def load(self, symbol, timestamp):
+        path = os.path.join(self._dir(symbol), pd.Timestamp(timestamp).strftime("%Y%m%dT%H%M%S") + ".parquet")
+        df = pd.read_parquet(path)
+        return OptionChain.from_frame(symbol, df, df.attrs.get("underlying", np.nan), timestamp)
+
+    def at_or_before(self, symbol, timestamp):
+        """The latest snapshot taken at or before `timestamp` (None if there is none)."""
+        times = [t for t in self.timestamps(symbol) if t <= pd.Timestamp(timestamp)]
+        return self.load(symbol, times[-1]) if times else None
+
+    def prune(self, symbol, keep=None):
+        """Delete all but the newest `keep` snapshots (default: the store's `keep`)."""
+        keep = self.keep if keep is None else keep
+        times = self.timestamps(symbol)
+        for t in times[: max(len(times) - keep, 0)]:
+            os.remove(os.path.join(self._dir(symbol), t.strftime("%Y%m%dT%H%M%S") + ".parquet"))
+
+
+# ---------------- SOURCES ----------------
+def nse_source(symbol, refresh=False):
+    """Live chain from NSE through nsepython (always fresh; `refresh` is for cached sources)."""
+    from nsepython import option_chain
+
+    return option_chain(symbol)
+
+
+def recorded_source(path):
+    """
+    A source that replays recorded NSE JSON instead of calling NSE. `path` is either one
+    file used for every symbol or a directory holding `<SYMBOL>.json` files.
+    """
+
+    def source(symbol, refresh=False):
+        file = os.path.join(path, f"{symbol}.json") if os.path.isdir(path) else path
+        with open(file) as f:
+            return json.load(f)
+
+    return source
+
+
+def record_chain(data, path):
+    """Save a raw NSE payload so it can be replayed with `recorded_source`."""
+
+    def write(tmp):
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+
+    _atomic_write(path, write)
+
+
+class ChainFeed:
+    """
+    Fetch-and-parse with a short TTL per symbol, so one Run Analysis (and the tabs
+    rendered after it) share a single download. Fresh chains are snapshotted, keeping
+    the store's newest `keep` per symbol. `source(symbol, refresh)` returns raw NSE JSON.
+    """
+
+    def __init__(self, source=nse_source, store=None, ttl=60):
+        self.source = source
+        self.store = store
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._cache = {}
+
+    def peek(self, symbol):
+        """The last parsed chain for `symbol`, however old (None if never fetched)."""
+        with self._lock:
+            hit = self._cache.get(symbol)
+        return hit[1] if hit is not None else None
+
+    def get(self, symbol, refresh=False):
+        with tracing.span("chain_feed", "cache", symbol=symbol) as sp:
+            with self._lock:
+                hit = self._cache.get(symbol)
+                if hit is not None and not refresh and time.monotonic() - hit[0] < self.ttl:
+                    sp.set(cache="hit")
+                    return hit[1]
+                sp.set(cache="miss")
+                # A refresh also bypasses any cache in front of NSE (DataHub)
+                raw = self.source(symbol, refresh=refresh)
+                with tracing.span("parse_chain", "compute"):
+                    chain = parse_chain(raw, symbol)
+                self._cache[symbol] = (time.monotonic(), chain)
+            if self.store is not None:
+                self.store.save(chain)
+                self.store.prune(symbol)
+            return chain
@@ -0,0 +1,116 @@
+import contextvars
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import tracing
+
+# ---------------- STAGE GRAPH RUNNER ----------------
+# Runs a small dependency graph of blocking calls (network fetches, LLM calls) on a
+# thread pool. Independent stages start together; a stage starts as soon as all of
+# its dependencies have finished. Each stage has its own timeout and fallback value.
+# Stages run in a copy of the caller's context, so each one is a span of the active trace.
+
+
+class Stage:
+    """One node of the graph. `func` receives dependency results as keyword arguments."""
+
+    def __init__(self, name, func, deps=(), timeout=None, fallback=None, label=None):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.timeout = timeout
+        self.fallback = fallback
+        self.label = label or name
+
+
+class StageResult:
+    """Outcome of a stage: status is 'ok', 'error' or 'timeout'."""
+
+    def __init__(self, stage, value, status, elapsed, error=None):
+        self.name = stage.name
+        self.label = stage.label
+        self.value = value
+        self.status = status
+        self.elapsed = elapsed
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.status == "ok"
+
+    def __repr__(self):
+        return f"StageResult({self.name!r}, status={self.status!r}, elapsed={self.elapsed:.3f}s)"
+
+
+def _call_traced(stage, kwargs):
+    with tracing.span(stage.name, "stage", label=stage.label) as sp:
+        return sp.result(stage.func(**kwargs))
+
+
+def _check_graph(stages):
+    names = {s.name for s in stages}
+    if len(names) != len(stages):
+        raise ValueError("Stage names must be unique.")
+    for s in stages:
+        unknown = set(s.deps) - names
+        if unknown:
+            raise ValueError(f"Stage {s.name!r} depends on unknown stage(s): {sorted(unknown)}")
+
+
+def run_stages(stages, on_done=None, max_workers=None, initializer=None):
+    """
+    Run `stages` concurrently, respecting dependencies.
+
+    `on_done(result)` is called on the calling thread as each stage finishes, so it is
+    safe to update UI from it. `initializer` runs in each worker thread before its first
+    stage (e.g. to attach a Streamlit script context). Failed or timed-out stages yield
+    their fallback value, and dependants still run with that fallback.
+    Returns {name: StageResult}.
+    """
+    _check_graph(stages)
+    waiting = list(stages)
+    running = {}  # future -> (stage, started_at)
+    results = {}
+
+    def finish(stage, value, status, started, error=None):
+        result = StageResult(stage, value, status, time.perf_counter() - started, error)
+        results[stage.name] = result
+        if on_done is not None:
+            on_done(result)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers or len(stages) or 1, initializer=initializer)
+    try:
+        while waiting or running:
+            # Launch every stage whose dependencies are done
+            for stage in [s for s in waiting if all(d in results for d in s.deps)]:
+                waiting.remove(stage)
+                kwargs = {d: results[d].value for d in stage.deps}
+                future = executor.submit(contextvars.copy_context().run, _call_traced, stage, kwargs)
+                running[future] = (stage, time.perf_counter())
+
+            if not running:
+                raise ValueError("Stage graph has a dependency cycle.")
+
+            now = time.perf_counter()
+            deadlines = [started + stage.timeout for stage, started in running.values() if stage.timeout]
+            wait_for = max(0.0, min(deadlines) - now) if deadlines else None
+            done, _ = wait(list(running), timeout=wait_for, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                stage, started = running.pop(future)
+                try:
+                    finish(stage, future.result(), "ok", started)
+                except Exception as e:
+                    finish(stage, stage.fallback, "error", started, e)
+
+            # Abandon stages past their deadline; the worker thread is left to finish on its own
+            now = time.perf_counter()
+            for future, (stage, started) in list(running.items()):
+                if stage.timeout and now - started >= stage.timeout:
+                    running.pop(future)
+                    future.cancel()
+                    finish(stage, stage.fallback, "timeout", started,
+                           TimeoutError(f"{stage.label} timed out after {stage.timeout}s"))
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return results
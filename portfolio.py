@@ -0,0 +1,202 @@
+import numpy as np
+import pandas as pd
+
+from backtest_engine import annualized_ratio, positions_from_signals, simple_returns
+from signal_engine import column_values, signal_codes
+
+# ---------------- PORTFOLIO BACKTEST ----------------
+# The strategy over a whole universe at once. Closes and signals are aligned into
+# (dates x symbols) arrays, and positions, weights, costs and equity come from the
+# same array math as the single-symbol backtest, so one pass over 20 symbols costs
+# about what one symbol does.
+#
+# Each symbol's position is the previous bar's signal, as in `run_backtest`. Capital
+# is split across the open positions, either equally or in inverse proportion to
+# their recent volatility. No weight may exceed `max_weight`, and anything above the
+# cap stays in cash. Rebalancing costs are charged on the change in target weights.
+
+WEIGHTINGS = ["equal", "volatility"]
+
+
+def signal_panels(frames, column="Close"):
+    """
+    (dates, tickers, close, codes) for {ticker: analysed frame}: (n_dates, n_symbols)
+    arrays on the union of all dates. Close is NaN and the signal HOLD where a symbol
+    has no bar.
+    """
+    frames = {t: f for t, f in frames.items() if f is not None and not f.empty}
+    tickers = list(frames)
+    stamps = [pd.DatetimeIndex(f["Date"]) for f in frames.values()]
+    dates = pd.DatetimeIndex(np.unique(np.concatenate([s.values for s in stamps]))) if stamps else pd.DatetimeIndex([])
+    close = np.full((len(dates), len(tickers)), np.nan)
+    codes = np.zeros((len(dates), len(tickers)), dtype=np.int8)
+    for j, (frame, stamp) in enumerate(zip(frames.values(), stamps)):
+        rows = dates.get_indexer(stamp)
+        close[rows, j] = column_values(frame, column)
+        if "signal" in frame.columns:
+            codes[rows, j] = signal_codes(frame["signal"])
+    return dates, tickers, close, codes
+
+
+def _inverse_volatility(returns, valid, lookback, rebalance_every):
+    """
+    1 / rolling std of each symbol's returns, known before each bar (k, n). It is
+    refreshed every `rebalance_every` bars. Symbols without an estimate yet get the
+    average of the others (1 when no symbol has one).
+    """
+    # Window sums from running totals: bar t sees returns t-lookback .. t-1
+    values = np.where(valid, returns, 0.0)
+    hi = np.arange(returns.shape[1])
+    lo = np.maximum(hi - lookback, 0)
+    count, total, square = (
+        (running[:, hi] - running[:, lo])
+        for running in (np.pad(np.cumsum(a, axis=1, dtype=np.float64), ((0, 0), (1, 0)))
+                        for a in (valid, values, values * values))
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        variance = (square - total * total / count) / (count - 1)
+        scale = 1.0 / np.sqrt(variance)
+    scale[(count < max(2, lookback // 2)) | ~np.isfinite(scale)] = np.nan
+    if rebalance_every > 1:
+        scale = scale[:, np.arange(scale.shape[1]) // rebalance_every * rebalance_every]
+    known = np.isfinite(scale)
+    estimates = known.sum(axis=0)
+    average = np.divide(np.where(known, scale, 0.0).sum(axis=0), estimates, out=np.ones(scale.shape[1]),
+                        where=estimates > 0)
+    return np.where(known, scale, average)
+
+
+class PortfolioResult:
+    """Weights, portfolio returns, equity and summary metrics of one portfolio run."""
+
+    def __init__(self, dates, tickers, returns, position, weights, strategy, equity, benchmark, drawdown,
+                 turnover, costs, metrics):
+        self.dates = dates
+        self.tickers = tickers
+        self.returns = returns  # (symbols, dates)
+        self.position = position
+        self.weights = weights
+        self.strategy = strategy
+        self.equity = equity
+        self.benchmark = benchmark
+        self.drawdown = drawdown
+        self.turnover = turnover
+        self.costs = costs
+        self.metrics = metrics
+
+    @property
+    def total_return(self):
+        return self.metrics["total_return"]
+
+    def curves(self):
+        """Equity, equal-weight buy-and-hold and drawdown, in the layout of `BacktestResult.curves`."""
+        return pd.DataFrame(
+            {"Strategy Returns": self.equity, "Buy & Hold Returns": self.benchmark, "Drawdown": self.drawdown},
+            index=pd.DatetimeIndex(self.dates, name="Date") if self.dates is not None else None,
+        )
+
+    def weights_frame(self):
+        """Signed weight of each symbol (columns) on each bar."""
+        return pd.DataFrame(self.weights.T, index=self.dates, columns=self.tickers)
+
+    def symbol_summary(self):
+        """Per symbol: return contribution, bars held, entries and average/maximum weight while held."""
+        held = self.position != 0
+        entries = held & (np.diff(self.position, axis=1, prepend=0) != 0)
+        magnitude = np.abs(self.weights)
+        bars = held.sum(axis=1)
+        with np.errstate(invalid="ignore"):
+            avg_weight = np.where(bars > 0, magnitude.sum(axis=1) / np.maximum(bars, 1), np.nan)
+        table = pd.DataFrame({
+            "Ticker": self.tickers,
+            "Contribution": (self.weights * self.returns).sum(axis=1),
+            "Bars Held": bars,
+            "Trades": entries.sum(axis=1),
+            "Avg Weight": avg_weight,
+            "Max Weight": magnitude.max(axis=1) if magnitude.size else np.zeros(len(self.tickers)),
+        })
+        return table.sort_values("Contribution", ascending=False, ignore_index=True)
+
+
+def run_portfolio(close, signal, dates=None, tickers=None, weighting="equal", max_weight=None,
+                  vol_lookback=20, rebalance_every=1, cost_bps=0.0, slippage_bps=0.0, hold=False,
+                  periods_per_year=252):
+    """
+    Backtest int8 signal codes on a (n_dates, n_symbols) panel of closes.
+
+    `weighting` is 'equal' (each open position gets the same share) or 'volatility'
+    (shares proportional to 1 / std of the last `vol_lookback` returns, re-estimated
+    every `rebalance_every` bars). `max_weight` caps each position and the remainder
+    stays in cash. Costs and slippage (basis points) are charged on every unit of
+    weight change. Raises ValueError on mismatched shapes or an unknown weighting.
+    """
+    close = np.atleast_2d(np.asarray(close, dtype=np.float64))
+    signal = np.atleast_2d(np.asarray(signal, dtype=np.int8))
+    if close.shape != signal.shape:
+        raise ValueError(f"close {close.shape} and signal {signal.shape} must have the same shape.")
+    if weighting not in WEIGHTINGS:
+        raise ValueError(f"Unknown weighting {weighting!r}; expected one of {WEIGHTINGS}.")
+    n, k = close.shape
+    tickers = list(tickers) if tickers is not None else [str(j) for j in range(k)]
+
+    # Symbols on the row axis, bars on the last axis, as in the single-symbol backtest
+    prices = close.T
+    returns = simple_returns(prices)
+    listed = np.isfinite(prices)
+    valid = listed & np.roll(listed, 1, axis=1)
+    valid[:, :1] = False
+    position = positions_from_signals(signal.T, hold)
+    # No position in a symbol before it has a price
+    position[:, 1:] *= listed[:, :-1]
+
+    if weighting == "volatility":
+        scale = _inverse_volatility(returns, valid, vol_lookback, max(int(rebalance_every), 1))
+    else:
+        scale = np.ones(returns.shape)
+    raw = np.abs(position) * scale
+    total = raw.sum(axis=0)
+    weights = np.divide(raw, total, out=np.zeros_like(raw), where=total > 0)
+    if max_weight is not None:
+        np.minimum(weights, max_weight, out=weights)
+    weights *= position
+
+    turnover = np.abs(np.diff(weights, axis=1, prepend=0.0)).sum(axis=0)
+    costs = turnover * (cost_bps + slippage_bps) / 1e4
+    strategy = (weights * returns).sum(axis=0) - costs
+
+    # Benchmark: every listed symbol in equal weight, rebalanced each bar
+    counted = valid.sum(axis=0)
+    benchmark_returns = np.divide(np.where(valid, returns, 0.0).sum(axis=0), counted,
+                                  out=np.zeros(n), where=counted > 0)
+
+    equity = np.cumprod(1.0 + strategy)
+    benchmark = np.cumprod(1.0 + benchmark_returns)
+    drawdown = equity / np.maximum.accumulate(equity) - 1.0 if n else equity
+    gross = np.abs(weights).sum(axis=0)
+    downside = strategy[strategy < 0]
+    metrics = {
+        "total_return": equity[-1] - 1.0 if n else 0.0,
+        "buy_hold_return": benchmark[-1] - 1.0 if n else 0.0,
+        "max_drawdown": drawdown.min() if n else 0.0,
+        "sharpe": annualized_ratio(strategy.mean(), strategy.std(), periods_per_year) if n else np.nan,
+        "sortino": annualized_ratio(strategy.mean(),
+                                    np.sqrt(np.mean(downside ** 2)) if len(downside) else 0.0,
+                                    periods_per_year) if n else np.nan,
+        "volatility": strategy.std() * np.sqrt(periods_per_year) if n else np.nan,
+        "trades": int(((position != 0) & (np.diff(position, axis=1, prepend=0) != 0)).sum()),
+        "exposure": gross.mean() if n else 0.0,
+        "avg_positions": (position != 0).sum(axis=0).mean() if n else 0.0,
+        "turnover": turnover.mean() * periods_per_year if n else 0.0,
+        "total_costs": costs.sum(),
+        "symbols": k,
+    }
+    return PortfolioResult(dates, tickers, returns, position, weights, strategy, equity, benchmark, drawdown,
+                           turnover, costs, metrics)
+
+
+def backtest_universe(frames, **params):
+    """`run_portfolio` over {ticker: analysed frame} (e.g. the frames of `engine.run_universe`)."""
+    dates, tickers, close, codes = signal_panels(frames)
+    if not tickers:
+        raise ValueError("No analysed frames to build a portfolio from.")
+    return run_portfolio(close, codes, dates, tickers, **params)
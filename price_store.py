@@ -0,0 +1,357 @@
+import json
+import os
+import re
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+from timeframes import INTERVALS
+from transport import TransientError
+
+# ---------------- LOCAL OHLCV STORE ----------------
+# Bars are kept in one Parquet file per (ticker, interval). A JSON sidecar records
+# which [start, end) ranges have already been downloaded, so a repeat fetch only
+# goes to the network for the gaps (usually just the newest bars).
+
+DEFAULT_ROOT = os.environ.get("PRICE_STORE_DIR", os.path.join(".market_cache", "ohlcv"))
+OHLCV_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+
+# yfinance reports failures per ticker instead of raising (in process-global state that
+# concurrent downloads overwrite), so a download is judged by its own result: bars
+# missing for this many weekday sessions before the end of the range is a failure.
+MISSING_SESSIONS = 3
+
+
+def priced_rows(df):
+    """Rows of a single-ticker download that have a price."""
+    if df is None or df.empty:
+        return pd.DataFrame()
+    prices = [c for c in df.columns if (c[0] if isinstance(c, tuple) else c) in ("Open", "High", "Low", "Close")]
+    return df.dropna(how="all", subset=prices or None)
+
+
+def missing_sessions(df, start, end, interval="1d"):
+    """
+    Weekday sessions in [start, end) after the last priced bar of `df` (all of them when
+    it has none). Today is left out, as its bars may not exist yet.
+    """
+    start = pd.Timestamp(start)
+    end = min(pd.Timestamp(end), pd.Timestamp.now().normalize())
+    received = priced_rows(df)
+    if not received.empty:
+        last = pd.DatetimeIndex(received.index).max()
+        if last.tz is not None:
+            last = last.tz_localize(None)
+        start = max(start, last + INTERVALS.get(interval, pd.Timedelta(days=1)))
+    if start >= end:
+        return 0
+    return int(np.busday_count(start.date(), end.date()))
+
+
+def check_download(df, symbol, start, end, interval="1d"):
+    """Raise TransientError when a download returned no bars, or stopped short, for [start, end)."""
+    missing = missing_sessions(df, start, end, interval)
+    if missing >= MISSING_SESSIONS:
+        raise TransientError(f"Yahoo Finance returned no bars for {symbol} in the last {missing} sessions "
+                             f"of {pd.Timestamp(start):%Y-%m-%d}..{pd.Timestamp(end):%Y-%m-%d}.")
+
+
+def yf_downloader(symbol, start, end, interval="1d", session=None, timeout=10):
+    """Download bars from Yahoo Finance. Swap this out for a fake to run offline."""
+    import yfinance as yf
+
+    df = yf.download(symbol, start=start, end=end, interval=interval, progress=False,
+                     session=session, timeout=timeout)
+    check_download(df, symbol, start, end, interval)
+    return df
+
+
+def yf_batch_downloader(symbols, start, end, interval="1d", session=None, timeout=10):
+    """One Yahoo Finance request for many tickers (columns grouped by ticker)."""
+    import yfinance as yf
+
+    df = yf.download(list(symbols), start=start, end=end, interval=interval,
+                     group_by="ticker", threads=True, progress=False, session=session, timeout=timeout)
+    # A batch with data for some tickers is still usable; those without get no coverage
+    failed = [s for s in symbols if missing_sessions(split_batch(df, s), start, end, interval) >= MISSING_SESSIONS]
+    if failed and len(failed) == len(symbols):
+        raise TransientError(f"Yahoo Finance returned no bars for any of {len(failed)} tickers "
+                             f"in {pd.Timestamp(start):%Y-%m-%d}..{pd.Timestamp(end):%Y-%m-%d}.")
+    return df
+
+
+def split_batch(batch, symbol):
+    """
+    Pull one ticker's columns out of a multi-ticker download (None if absent). Rows
+    without any price are dropped: a batch pads every ticker to the union of dates,
+    so a ticker that failed comes back as all-NaN rows rather than missing.
+    """
+    if batch is None or batch.empty or not isinstance(batch.columns, pd.MultiIndex):
+        return batch
+    for level in range(batch.columns.nlevels):
+        if symbol in batch.columns.get_level_values(level):
+            bars = batch.xs(symbol, axis=1, level=level)
+            prices = [c for c in ("Open", "High", "Low", "Close") if c in bars.columns]
+            return bars.dropna(how="all", subset=prices or None)
+    return None
+
+
+def normalize_bars(df):
+    """Flatten yfinance output to a tz-naive DatetimeIndex named 'Date' with plain columns."""
+    if df is None or df.empty:
+        return pd.DataFrame(columns=OHLCV_COLUMNS, index=pd.DatetimeIndex([], name="Date"))
+    df = df.copy()
+    if isinstance(df.columns, pd.MultiIndex):
+        # Single-ticker downloads come back as ('Close', '^NSEI') etc.
+        df.columns = df.columns.get_level_values(0)
+    df = df.loc[:, ~df.columns.duplicated()]
+    if "Date" in df.columns:
+        df = df.set_index("Date")
+    df.index = pd.DatetimeIndex(df.index)
+    if df.index.tz is not None:
+        # Keep exchange wall-clock time so ranges compare against plain dates
+        df.index = df.index.tz_localize(None)
+    df.index.name = "Date"
+    return df[~df.index.duplicated(keep="last")].sort_index()
+
+
+def _merge_ranges(ranges):
+    merged = []
+    for lo, hi in sorted(ranges):
+        if merged and lo <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], hi)
+        else:
+            merged.append([lo, hi])
+    return merged
+
+
+def missing_ranges(covered, start, end):
+    """Return the parts of [start, end) not covered by the (merged) `covered` ranges."""
+    gaps = []
+    cursor = start
+    for lo, hi in covered:
+        if hi <= cursor:
+            continue
+        if lo >= end:
+            break
+        if lo > cursor:
+            gaps.append((cursor, min(lo, end)))
+        cursor = max(cursor, hi)
+        if cursor >= end:
+            break
+    if cursor < end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+def _atomic_write(path, write):
+    """Write through a temp file in the same directory, then rename over `path`."""
+    directory = os.path.dirname(path) or "."
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    os.close(fd)
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+class PriceStore:
+    """On-disk OHLCV cache keyed by ticker and interval, with incremental gap-fill."""
+
+    def __init__(self, root=DEFAULT_ROOT, downloader=yf_downloader):
+        self.root = root
+        self.downloader = downloader
+        self._lock = threading.RLock()
+        os.makedirs(root, exist_ok=True)
+
+    # ---- paths & metadata ----
+    def _key(self, symbol, interval):
+        return re.sub(r"[^A-Za-z0-9_.-]", "_", f"{symbol}__{interval}")
+
+    def _bars_path(self, symbol, interval):
+        return os.path.join(self.root, self._key(symbol, interval) + ".parquet")
+
+    def _meta_path(self, symbol, interval):
+        return os.path.join(self.root, self._key(symbol, interval) + ".json")
+
+    def _read_meta(self, symbol, interval):
+        path = self._meta_path(symbol, interval)
+        if not os.path.exists(path):
+            return {"covered": []}
+        with open(path) as f:
+            meta = json.load(f)
+        meta["covered"] = [[pd.Timestamp(lo), pd.Timestamp(hi)] for lo, hi in meta.get("covered", [])]
+        return meta
+
+    def _write_meta(self, symbol, interval, meta):
+        payload = dict(meta)
+        payload["covered"] = [[lo.isoformat(), hi.isoformat()] for lo, hi in meta["covered"]]
+
+        def write(tmp):
+            with open(tmp, "w") as f:
+                json.dump(payload, f)
+
+        _atomic_write(self._meta_path(symbol, interval), write)
+
+    # ---- bars ----
+    def load(self, symbol, interval="1d"):
+        """All cached bars for a ticker (empty frame if nothing is cached)."""
+        path = self._bars_path(symbol, interval)
+        if not os.path.exists(path):
+            return normalize_bars(None)
+        return pd.read_parquet(path)
+
+    def _write_bars(self, symbol, interval, df):
+        _atomic_write(self._bars_path(symbol, interval), lambda tmp: df.to_parquet(tmp))
+
+    def covered(self, symbol, interval="1d"):
+        """Merged list of [start, end) ranges already downloaded."""
+        return self._read_meta(symbol, interval)["covered"]
+
+    def _merge_fetched(self, symbol, interval, meta, cached, fetched, ranges):
+        """
+        Fold downloaded frames into the cached bars and record the covered ranges. A range
+        counts as covered up to the end of the last bar received for it, so an empty or
+        cut-short download is retried next time, unless no weekday session is left after
+        that bar (a weekend), in which case all of it is.
+        """
+        # Bars from today onward are still forming, so never mark them as covered
+        horizon = pd.Timestamp.now().normalize()
+        step = INTERVALS.get(interval, pd.Timedelta(days=1))
+        for frame, (lo, hi) in zip(fetched, ranges):
+            limit = min(hi, horizon)
+            covered_to = min(limit, frame.index.max() + step) if not frame.empty else lo
+            # Days before today are over, so the rest of the last bar's day has no sessions left
+            after = covered_to.normalize() + (pd.Timedelta(0) if covered_to == covered_to.normalize()
+                                              else pd.Timedelta(days=1))
+            if after >= limit or not np.busday_count(after.date(), limit.date()):
+                covered_to = limit
+            if lo < covered_to:
+                meta["covered"].append([lo, covered_to])
+        frames = [f for f in [cached, *fetched] if not f.empty]
+        if frames:
+            merged = pd.concat(frames)
+            cached = merged[~merged.index.duplicated(keep="last")].sort_index()
+        self._write_bars(symbol, interval, cached)
+        meta["covered"] = _merge_ranges(meta["covered"])
+        self._write_meta(symbol, interval, meta)
+        return cached
+
+    def get(self, symbol, start, end, interval="1d"):
+        """
+        Bars for [start, end) with a 'Date' column, like `yf.download(...).reset_index()`.
+        Only the ranges missing from disk are downloaded; errors from the downloader propagate,
+        except for a range that ends before the first cached bar.
+        """
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        with self._lock:
+            meta = self._read_meta(symbol, interval)
+            cached = self.load(symbol, interval)
+            gaps = missing_ranges(meta["covered"], start, end)
+            fetched, ranges = [], []
+            for lo, hi in gaps:
+                try:
+                    fetched.append(normalize_bars(self.downloader(symbol, lo, hi, interval)))
+                except TransientError:
+                    # Nothing before a symbol's first bar (e.g. before it listed) reads as a
+                    # failed download; serve the cached history rather than fail the fetch
+                    if cached.empty or hi > cached.index.min():
+                        raise
+                    continue
+                ranges.append((lo, hi))
+            if ranges:
+                cached = self._merge_fetched(symbol, interval, meta, cached, fetched, ranges)
+
+        window = cached[(cached.index >= start) & (cached.index < end)]
+        return window.reset_index()
+
+    def get_cached(self, symbol, start, end, interval="1d"):
+        """Bars for [start, end) from disk only (no download), in the same shape as `get`."""
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        cached = self.load(symbol, interval)
+        return cached[(cached.index >= start) & (cached.index < end)].reset_index()
+
+    def get_many(self, symbols, start, end, interval="1d", batch_downloader=None):
+        """
+        Like `get` for several tickers. Tickers missing the same range are fetched with a
+        single `batch_downloader(symbols, start, end, interval)` call (one request for
+        the whole universe on a cold cache). Returns {symbol: frame}.
+        """
+        batch_downloader = batch_downloader or yf_batch_downloader
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        results = {}
+        with self._lock:
+            state = {}
+            groups = {}
+            for symbol in symbols:
+                meta = self._read_meta(symbol, interval)
+                state[symbol] = (meta, self.load(symbol, interval))
+                for gap in missing_ranges(meta["covered"], start, end):
+                    groups.setdefault(gap, []).append(symbol)
+
+            fetched = {symbol: ([], []) for symbol in symbols}
+            for (lo, hi), group in groups.items():
+                batch = batch_downloader(group, lo, hi, interval)
+                # A ticker with no bars in the batch gets no coverage (see _merge_fetched),
+                # even when the rest of the batch succeeded
+                for symbol in group:
+                    fetched[symbol][0].append(normalize_bars(split_batch(batch, symbol)))
+                    fetched[symbol][1].append((lo, hi))
+
+            for symbol in symbols:
+                meta, cached = state[symbol]
+                frames, ranges = fetched[symbol]
+                if ranges:
+                    cached = self._merge_fetched(symbol, interval, meta, cached, frames, ranges)
+                window = cached[(cached.index >= start) & (cached.index < end)]
+                results[symbol] = window.reset_index()
+        return results
+
+    # ---- derived state saved next to the bars (e.g. indicator recursions) ----
+    def _state_path(self, symbol, interval, name):
+        return os.path.join(self.root, f"{self._key(symbol, interval)}.{name}.parquet")
+
+    def save_state(self, symbol, interval, name, state, frame):
+        """Persist a JSON-serializable dict, with the frame it was computed for, alongside the cached bars."""
+        frame = frame.copy()
+        frame.attrs = {"state": state}
+        _atomic_write(self._state_path(symbol, interval, name), lambda tmp: frame.to_parquet(tmp, index=False))
+
+    def load_state(self, symbol, interval, name):
+        """(state, frame) as saved by `save_state`; (None, None) if nothing was saved."""
+        path = self._state_path(symbol, interval, name)
+        if not os.path.exists(path):
+            return None, None
+        frame = pd.read_parquet(path)
+        return frame.attrs.get("state"), frame
+
+    def invalidate(self, symbol, interval="1d", start=None, end=None):
+        """Drop cached bars in [start, end) (everything by default) so they are fetched again."""
+        with self._lock:
+            meta = self._read_meta(symbol, interval)
+            cached = self.load(symbol, interval)
+            lo = pd.Timestamp(start) if start is not None else pd.Timestamp.min
+            hi = pd.Timestamp(end) if end is not None else pd.Timestamp.max
+
+            keep = (cached.index < lo) | (cached.index >= hi)
+            self._write_bars(symbol, interval, cached[keep])
+
+            covered = []
+            for c_lo, c_hi in meta["covered"]:
+                if c_lo < lo:
+                    covered.append([c_lo, min(c_hi, lo)])
+                if c_hi > hi:
+                    covered.append([max(c_lo, hi), c_hi])
+            meta["covered"] = _merge_ranges(covered)
+            self._write_meta(symbol, interval, meta)
+            # Anything derived from the dropped bars is stale as well
+            prefix = self._key(symbol, interval) + "."
+            for name in os.listdir(self.root):
+                if name.startswith(prefix) and name not in (prefix + "json", prefix + "parquet"):
+                    os.remove(os.path.join(self.root, name))
@@ -0,0 +1,74 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from kernels import fused_indicators
+from signal_engine import DEFAULT_THRESHOLDS, SIGNAL_LABELS, column_values, compute_signals
+
+# ---------------- MULTI-SYMBOL SCREENER ----------------
+# One batched download for the whole universe, then indicators + signals per symbol
+# on a thread pool (the compiled kernel releases the GIL, so symbols run in parallel).
+
+SCREENER_COLUMNS = [
+    "Name", "Ticker", "Date", "Close", "Change %", "Signal", "Trend",
+    "RSI", "ADX", "EMA20", "EMA20 Dist %", "Bars",
+]
+
+
+def _technical_trend(close, ema, rsi, adx, thresholds):
+    """Indicator-only bias for the latest bar (ignores the AI/VIX/PCR filters)."""
+    if np.isnan([close, ema, rsi, adx]).any() or adx <= thresholds["adx_min"]:
+        return "Neutral"
+    if close > ema and rsi > thresholds["rsi_buy"]:
+        return "Bullish"
+    if close < ema and rsi < thresholds["rsi_sell"]:
+        return "Bearish"
+    return "Neutral"
+
+
+def screen_symbol(name, ticker, df, ai=np.nan, vix=np.nan, pcr=np.nan, thresholds=None):
+    """Latest signal and indicator snapshot for one symbol (None when there is no data)."""
+    if df is None or df.empty or len(df) < 2:
+        return None
+    params = dict(DEFAULT_THRESHOLDS)
+    params.update(thresholds or {})
+
+    close = column_values(df, "Close")
+    values, _ = fused_indicators(column_values(df, "High"), column_values(df, "Low"), close)
+    ema, rsi, adx = values[:, 0], values[:, 1], values[:, 2]
+    codes = compute_signals(close, ema, rsi, adx, ai, vix, pcr, params)
+
+    last_close, prev_close = close[-1], close[-2]
+    return {
+        "Name": name,
+        "Ticker": ticker,
+        "Date": pd.Timestamp(df["Date"].iloc[-1]),
+        "Close": last_close,
+        "Change %": (last_close / prev_close - 1) * 100 if prev_close else np.nan,
+        "Signal": SIGNAL_LABELS[codes[-1] % 3],
+        "Trend": _technical_trend(last_close, ema[-1], rsi[-1], adx[-1], params),
+        "RSI": rsi[-1],
+        "ADX": adx[-1],
+        "EMA20": ema[-1],
+        "EMA20 Dist %": (last_close / ema[-1] - 1) * 100 if ema[-1] else np.nan,
+        "Bars": len(df),
+    }
+
+
+def scan_universe(universe, start, end, store, ai=np.nan, vix=np.nan, pcr=np.nan,
+                  thresholds=None, max_workers=8, batch_downloader=None):
+    """
+    Screen every {name: ticker} in `universe`.
+    Prices come from `store.get_many` (one batched request for missing ranges).
+    Returns a DataFrame sorted by distance from EMA20, strongest first.
+    """
+    frames = store.get_many(list(universe.values()), start, end, batch_downloader=batch_downloader)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        rows = pool.map(
+            lambda item: screen_symbol(item[0], item[1], frames.get(item[1]), ai, vix, pcr, thresholds),
+            universe.items(),
+        )
+        rows = [r for r in rows if r is not None]
+    table = pd.DataFrame(rows, columns=SCREENER_COLUMNS)
+    return table.sort_values("EMA20 Dist %", ascending=False, ignore_index=True)
@@ -0,0 +1,163 @@
+import numpy as np
+import pandas as pd
+
+# ---------------- SIGNAL CODES ----------------
+# Signals are stored as int8 codes. The code doubles as the position
+# (1 = long, -1 = short, 0 = flat) and `code % 3` indexes SIGNAL_LABELS.
+HOLD, BUY, SELL = 0, 1, -1
+SIGNAL_LABELS = ["HOLD", "BUY", "SELL"]
+_CODE_LOOKUP = np.array([HOLD, BUY, SELL, HOLD], dtype=np.int8)  # index -1 (NaN) -> HOLD
+
+DEFAULT_THRESHOLDS = {
+    "rsi_buy": 55,
+    "rsi_sell": 45,
+    "adx_min": 20,
+    "ai_threshold": 50,
+    "ai_band": 5,
+    "vix_threshold": 17,
+    "pcr_threshold": 1.0,
+}
+
+# Values used when an external factor is missing (NaN)
+NEUTRAL_AI = 50
+NEUTRAL_VIX = 15
+NEUTRAL_PCR = 1.0
+NEUTRAL_RSI = 50
+NEUTRAL_ADX = 20
+
+
+def column_values(df, name):
+    """Return a column as a 1-D float64 array (handles yfinance MultiIndex columns)."""
+    values = np.asarray(df[name], dtype=np.float64)
+    if values.ndim > 1:
+        values = values[:, 0]
+    return values
+
+
+def _fill_neutral(values, neutral):
+    values = np.asarray(values, dtype=np.float64)
+    missing = np.isnan(values)
+    return np.where(missing, neutral, values) if missing.any() else values
+
+
+def _ffill(values):
+    """Forward-fill NaNs in a 1-D array."""
+    idx = np.where(np.isnan(values), 0, np.arange(len(values)))
+    np.maximum.accumulate(idx, out=idx)
+    return values[idx]
+
+
+def clean_ema(ema):
+    """Back-fill then forward-fill EMA gaps (the warm-up period has no EMA yet)."""
+    ema = np.asarray(ema, dtype=np.float64)
+    if len(ema) == 0 or not np.isnan(ema).any():
+        return ema
+    ema = _ffill(ema[::-1])[::-1]
+    return _ffill(ema)
+
+
+def _threshold(params, name):
+    """Threshold as a scalar, or as a (k, 1) column when several sets are evaluated."""
+    value = np.asarray(params.get(name, DEFAULT_THRESHOLDS[name]), dtype=np.float64)
+    return value.reshape(-1, 1) if value.ndim else value
+
+
+def compute_signals(close, ema, rsi, adx, ai, vix, pcr, thresholds=None):
+    """
+    Vectorized BUY/SELL/HOLD rule.
+
+    close/ema/rsi/adx are 1-D arrays. ai/vix/pcr may be scalars or per-bar arrays.
+    Each entry of `thresholds` may be a scalar or a 1-D array of k values, in which
+    case k threshold sets are evaluated at once and a (k, n) array is returned.
+    Returns int8 signal codes (BUY=1, SELL=-1, HOLD=0).
+    """
+    params = dict(DEFAULT_THRESHOLDS)
+    params.update(thresholds or {})
+
+    close = np.asarray(close, dtype=np.float64)
+    ema = clean_ema(ema)
+    rsi = _fill_neutral(rsi, NEUTRAL_RSI)
+    adx = _fill_neutral(adx, NEUTRAL_ADX)
+    ai = _fill_neutral(ai, NEUTRAL_AI)
+    vix = _fill_neutral(vix, NEUTRAL_VIX)
+    pcr = _fill_neutral(pcr, NEUTRAL_PCR)
+
+    ai_t = _threshold(params, "ai_threshold")
+    ai_band = _threshold(params, "ai_band")
+    vix_t = _threshold(params, "vix_threshold")
+    pcr_t = _threshold(params, "pcr_threshold")
+    adx_ok = adx > _threshold(params, "adx_min")
+
+    buy = (
+        (close > ema)
+        & (rsi > _threshold(params, "rsi_buy"))
+        & adx_ok
+        & (ai > ai_t + ai_band)
+        & (pcr > pcr_t)
+        & (vix < vix_t)
+    )
+    sell = (
+        (close < ema)
+        & (rsi < _threshold(params, "rsi_sell"))
+        & adx_ok
+        & (ai < ai_t - ai_band)
+        & (pcr < pcr_t)
+        & (vix > vix_t)
+    )
+
+    codes = buy.astype(np.int8) - sell.astype(np.int8)
+    # The first bar has no prior context and always stays HOLD
+    codes[..., :1] = HOLD
+    return codes
+
+
+def evaluate_signals(close, ema, rsi, adx, ai, vix, pcr, param_sets):
+    """
+    Evaluate many threshold sets in one call.
+
+    `param_sets` is a DataFrame (one row per set) or a dict of equal-length arrays.
+    Returns a (k, n) int8 array of signal codes.
+    """
+    if isinstance(param_sets, pd.DataFrame):
+        param_sets = {col: param_sets[col].to_numpy() for col in param_sets.columns}
+    sizes = {np.size(v) for v in param_sets.values()}
+    if len(sizes) > 1:
+        raise ValueError("All threshold arrays must have the same length.")
+    thresholds = {k: np.atleast_1d(v) for k, v in param_sets.items()}
+    return np.atleast_2d(compute_signals(close, ema, rsi, adx, ai, vix, pcr, thresholds))
+
+
+def trend_codes(close, ema):
+    """+1 where close is above its EMA, -1 below, 0 where either is unknown."""
+    close = np.asarray(close, dtype=np.float64)
+    ema = np.asarray(ema, dtype=np.float64)
+    with np.errstate(invalid="ignore"):
+        return np.sign(np.nan_to_num(close - ema)).astype(np.int8)
+
+
+def confirm_signals(codes, trend):
+    """
+    Multi-timeframe confirmation: keep BUY only where the higher-timeframe `trend` is up
+    and SELL only where it is down; everything else becomes HOLD.
+    """
+    codes = np.asarray(codes, dtype=np.int8)
+    return np.where(codes == np.sign(trend), codes, HOLD).astype(np.int8)
+
+
+def to_categorical(codes):
+    """Wrap int8 signal codes as a categorical of 'HOLD'/'BUY'/'SELL' labels."""
+    return pd.Categorical.from_codes(np.asarray(codes) % 3, categories=SIGNAL_LABELS)
+
+
+def signal_codes(signal):
+    """Convert a signal column (categorical, strings or codes) back to int8 codes."""
+    if isinstance(signal, pd.DataFrame):
+        signal = signal.iloc[:, 0]
+    signal = pd.Series(signal, copy=False)
+    if isinstance(signal.dtype, pd.CategoricalDtype) and list(signal.cat.categories) == SIGNAL_LABELS:
+        # Categories are laid out so that code % 3 is the label; invert via a lookup table
+        return _CODE_LOOKUP[signal.cat.codes.to_numpy()]
+    if signal.dtype == object or isinstance(signal.dtype, pd.CategoricalDtype):
+        mapped = signal.map({"BUY": BUY, "SELL": SELL}).astype("float64")
+        return mapped.fillna(HOLD).to_numpy(dtype=np.int8)
+    return signal.to_numpy(dtype=np.int8)
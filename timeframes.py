@@ -0,0 +1,200 @@
+import numpy as np
+import pandas as pd
+
+from signal_engine import column_values
+
+# ---------------- MULTI-TIMEFRAME BARS ----------------
+# One base-resolution bar series per symbol (whatever interval was downloaded) and
+# the coarser timeframes derived from it: 5m/15m/1h/daily/weekly OHLCV. Bars are
+# grouped by their bin start with reduceat, so a resample is a few vectorized passes,
+# and each aggregate is cached and patched from the first bin the new base bars touch.
+#
+# Every aggregate bar carries `Last`, the timestamp of the last base bar folded into
+# it. A higher-timeframe bar is known at base time t only once `Last <= t`, which is
+# how `as_of_rows` aligns timeframes without lookahead. The newest bin may still be
+# forming, so it also carries `Complete`: until the base bars reach the end of its
+# last session it is not known at any time, as for the same point of earlier bins.
+
+# Length of each interval name (yfinance spelling) for ordering timeframes
+INTERVALS = {
+    "1m": pd.Timedelta(minutes=1), "2m": pd.Timedelta(minutes=2), "5m": pd.Timedelta(minutes=5),
+    "15m": pd.Timedelta(minutes=15), "30m": pd.Timedelta(minutes=30), "60m": pd.Timedelta(hours=1),
+    "90m": pd.Timedelta(minutes=90), "1h": pd.Timedelta(hours=1), "1d": pd.Timedelta(days=1),
+    "5d": pd.Timedelta(days=5), "1wk": pd.Timedelta(weeks=1),
+}
+TIMEFRAMES = ["5m", "15m", "1h", "1d", "1wk"]
+# Intraday bins start at the NSE open (09:15), so hourly bars are 09:15-10:15, ...
+SESSION_OFFSET = pd.Timedelta(minutes=15)
+# NSE close: the end of the last intraday bin of a session
+SESSION_CLOSE = pd.Timedelta(hours=15, minutes=30)
+BAR_COLUMNS = ["Date", "Open", "High", "Low", "Close", "Volume", "Last", "Complete"]
+
+
+def check_timeframe(timeframe, base_interval):
+    """Raise ValueError unless `timeframe` can be built from `base_interval` bars."""
+    for name in (timeframe, base_interval):
+        if name not in INTERVALS:
+            raise ValueError(f"Unknown timeframe {name!r}; expected one of {list(INTERVALS)}.")
+    if INTERVALS[timeframe] < INTERVALS[base_interval]:
+        raise ValueError(f"Cannot build {timeframe} bars from {base_interval} bars.")
+
+
+def bin_starts(dates, timeframe):
+    """Start of the `timeframe` bin holding each timestamp (weeks start on Monday)."""
+    dates = pd.DatetimeIndex(dates)
+    tz = dates.tz
+    if tz is not None:
+        # Bin on exchange wall-clock time, like the price store
+        dates = dates.tz_localize(None)
+    if timeframe in ("1d", "5d", "1wk"):
+        starts = dates.normalize()
+        if timeframe == "1wk":
+            starts = starts - pd.to_timedelta(dates.dayofweek, unit="D")
+    else:
+        step = INTERVALS[timeframe].value
+        offset = SESSION_OFFSET.value % step
+        ns = dates.asi8
+        starts = pd.DatetimeIndex((ns - offset) // step * step + offset)
+    return starts.tz_localize(tz) if tz is not None else starts
+
+
+def bin_ends(starts, timeframe, base_interval="1d"):
+    """
+    When each `timeframe` bin starting at `starts` is over, in base-bar time: the end of
+    its last session for days and weeks (Friday's for a week), at most the NSE close
+    for intraday bins.
+    """
+    starts = pd.DatetimeIndex(starts)
+    if timeframe in ("1d", "5d", "1wk"):
+        last_day = starts + pd.Timedelta(days=4) if timeframe == "1wk" else starts
+        daily_base = INTERVALS[base_interval] >= pd.Timedelta(days=1)
+        return last_day + (pd.Timedelta(days=1) if daily_base else SESSION_CLOSE)
+    ends = starts + INTERVALS[timeframe]
+    close = starts.normalize() + SESSION_CLOSE
+    return ends.where(ends <= close, close)
+
+
+def resample_bars(bars, timeframe, base_interval="1d"):
+    """
+    OHLCV of `bars` (sorted, with a Date column, in `base_interval` bars) in `timeframe`
+    bins, labelled by bin start, plus `Last` and `Complete`. High/Low skip NaNs; missing
+    Volume counts as 0.
+    """
+    if bars.empty:
+        return pd.DataFrame(columns=BAR_COLUMNS)
+    dates = pd.DatetimeIndex(bars["Date"])
+    keys = bin_starts(dates, timeframe)
+    ordinal = keys.asi8
+    starts = np.flatnonzero(np.r_[True, ordinal[1:] != ordinal[:-1]])
+    ends = np.r_[starts[1:], len(bars)] - 1
+    close = column_values(bars, "Close")
+    high = column_values(bars, "High") if "High" in bars.columns else close
+    low = column_values(bars, "Low") if "Low" in bars.columns else close
+    open_ = column_values(bars, "Open") if "Open" in bars.columns else close
+    volume = column_values(bars, "Volume") if "Volume" in bars.columns else np.zeros(len(bars))
+    # Only the newest bin can be partial: it is complete once its last base bar ends the bin
+    complete = np.ones(len(starts), dtype=bool)
+    complete[-1] = dates[-1] + INTERVALS[base_interval] >= bin_ends(keys[starts[-1:]], timeframe, base_interval)[0]
+    return pd.DataFrame({
+        "Date": keys[starts],
+        "Open": open_[starts],
+        "High": np.fmax.reduceat(high, starts),
+        "Low": np.fmin.reduceat(low, starts),
+        "Close": close[ends],
+        "Volume": np.add.reduceat(np.nan_to_num(volume), starts),
+        "Last": dates[ends],
+        "Complete": complete,
+    })
+
+
+def as_of_rows(higher, times):
+    """
+    Position in `higher` of the latest bar complete at each of `times` (-1 before the
+    first). Use the lower timeframe's own base timestamps (`Last`, else `Date`).
+    """
+    last = higher["Last"] if "Last" in higher.columns else higher["Date"]
+    last = pd.DatetimeIndex(last)
+    if "Complete" in higher.columns and len(higher) and not higher["Complete"].iloc[-1]:
+        last = last[:-1]
+    times = pd.DatetimeIndex(times)
+    return last.searchsorted(times, side="right") - 1
+
+
+def align(higher, times, column):
+    """`higher[column]` as of each of `times`, NaN where no bar of it was complete yet."""
+    rows = as_of_rows(higher, times)
+    values = column_values(higher, column)
+    out = np.full(len(rows), np.nan)
+    known = rows >= 0
+    out[known] = values[rows[known]]
+    return out
+
+
+def bar_times(df):
+    """The base timestamp at which each bar of `df` is complete."""
+    return df["Last"] if "Last" in df.columns else df["Date"]
+
+
+class MultiTimeframe:
+    """
+    Base bars of one symbol and their cached aggregates. `update` takes the latest full
+    history (e.g. each Run Analysis) and `append` only new bars (e.g. a live poll); both
+    re-aggregate just the bins from the first changed base bar onwards.
+    """
+
+    def __init__(self, base_interval="1d"):
+        self.base_interval = base_interval
+        self.base = pd.DataFrame(columns=BAR_COLUMNS[:-2])
+        self._frames = {}
+
+    def __len__(self):
+        return len(self.base)
+
+    def update(self, bars):
+        """Make `bars` the base series, reusing the aggregates when it extends the current one."""
+        if bars.empty:
+            self.base, self._frames = bars, {}
+            return self
+        old = pd.DatetimeIndex(self.base["Date"]).asi8 if len(self.base) else np.empty(0, np.int64)
+        new = pd.DatetimeIndex(bars["Date"]).asi8
+        # The last cached base bar may still have been forming, so it is always replaced
+        k = len(old) - 1
+        if 0 < k <= len(new) and np.array_equal(new[:k], old[:k]):
+            return self._splice(k, bars.iloc[k:])
+        self.base, self._frames = bars.reset_index(drop=True), {}
+        return self
+
+    def append(self, bars):
+        """Add base bars newer than (or replacing) the latest ones."""
+        if bars.empty:
+            return self
+        if self.base.empty:
+            return self.update(bars)
+        first = pd.Timestamp(bars["Date"].iloc[0])
+        k = int(pd.DatetimeIndex(self.base["Date"]).searchsorted(first, side="left"))
+        return self._splice(k, bars)
+
+    def _splice(self, k, bars):
+        self.base = pd.concat([self.base.iloc[:k], bars], ignore_index=True)
+        if bars.empty:
+            return self
+        first = pd.Timestamp(bars["Date"].iloc[0])
+        dates = pd.DatetimeIndex(self.base["Date"])
+        for timeframe, frame in self._frames.items():
+            # Everything before the bin of the first new bar is final
+            start = bin_starts(pd.DatetimeIndex([first], tz=dates.tz), timeframe)[0]
+            keep = frame[pd.DatetimeIndex(frame["Date"]) < start].assign(Complete=True)
+            tail = resample_bars(self.base.iloc[dates.searchsorted(start, side="left"):], timeframe,
+                                 self.base_interval)
+            self._frames[timeframe] = pd.concat([keep, tail], ignore_index=True)
+        return self
+
+    def get(self, timeframe):
+        """OHLCV bars in `timeframe` (the base bars themselves for the base interval)."""
+        check_timeframe(timeframe, self.base_interval)
+        if INTERVALS[timeframe] == INTERVALS[self.base_interval]:
+            return self.base
+        frame = self._frames.get(timeframe)
+        if frame is None:
+            frame = self._frames[timeframe] = resample_bars(self.base, timeframe, self.base_interval)
+        return frame
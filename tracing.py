@@ -0,0 +1,302 @@
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+# ---------------- TRACING ----------------
+# Lightweight spans for one Run Analysis: every pipeline stage, engine step and
+# external call (Yahoo, NSE, Gemini) opens a span recording its duration, payload
+# size, cache hit/miss and error. Spans find their parent through a context
+# variable, so code without an active trace (background pollers, the batch runner,
+# a session with tracing off) gets a shared no-op span and pays one lookup.
+#
+#   with tracer.trace("run_analysis", symbol="^NSEI") as trace:
+#       with span("indicators", "compute", rows=len(df)) as sp:
+#           sp.result(add_indicators(df))
+#
+# Threads started inside a trace must run in `contextvars.copy_context()` to join it.
+
+SPAN_FIELDS = ["id", "parent", "name", "kind", "offset_ms", "duration_ms", "size", "cache", "error", "attrs"]
+
+_active = contextvars.ContextVar("tracing_span", default=None)
+_ids = itertools.count(1)
+
+
+def payload_size(value):
+    """Approximate bytes in a result: frames and arrays by buffer size, text by UTF-8 length."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=False).sum())
+    if isinstance(value, (pd.Series, np.ndarray)):
+        return int(value.nbytes)
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    return None
+
+
+class Span:
+    """One timed operation. Use as a context manager; errors propagate after being recorded."""
+
+    __slots__ = ("trace", "id", "parent", "name", "kind", "start", "duration", "size", "cache", "error",
+                 "attrs", "_token")
+
+    def __init__(self, trace, name, kind, parent=None, attrs=None):
+        self.trace = trace
+        self.id = next(_ids)
+        self.parent = parent
+        self.name = name
+        self.kind = kind
+        self.start = None
+        self.duration = None
+        self.size = None
+        self.cache = None
+        self.error = None
+        self.attrs = dict(attrs or {})
+        self._token = None
+
+    def set(self, size=None, cache=None, error=None, **attrs):
+        if size is not None:
+            self.size = size
+        if cache is not None:
+            self.cache = cache
+        if error is not None:
+            self.error = str(error)
+        self.attrs.update(attrs)
+        return self
+
+    def result(self, value):
+        """Record the payload size of `value` (if not set already) and return it."""
+        if self.size is None:
+            self.size = payload_size(value)
+        return value
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self._token = _active.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        # st.stop() and KeyboardInterrupt are control flow, not failures
+        if isinstance(exc, Exception) and self.error is None:
+            self.error = f"{type(exc).__name__}: {exc}"
+        try:
+            _active.reset(self._token)
+        except ValueError:
+            pass  # a generator closed from another context (e.g. garbage-collected)
+        self.trace._finish(self)
+        return False
+
+    def to_dict(self, origin):
+        return {
+            "id": self.id,
+            "parent": self.parent.id if self.parent is not None else None,
+            "name": self.name,
+            "kind": self.kind,
+            "offset_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round(self.duration * 1000, 3),
+            "size": self.size,
+            "cache": self.cache,
+            "error": self.error,
+            "attrs": {k: v if isinstance(v, (int, float, str, bool, type(None))) else str(v)
+                      for k, v in self.attrs.items()},
+        }
+
+
+class _NullSpan:
+    """Stands in for a Span when nothing is being traced."""
+
+    def set(self, **attrs):
+        return self
+
+    def result(self, value):
+        return value
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+def span(name, kind="stage", **attrs):
+    """A child of the active span, or NULL_SPAN outside a trace."""
+    parent = _active.get()
+    if parent is None:
+        return NULL_SPAN
+    return Span(parent.trace, name, kind, parent, attrs)
+
+
+def annotate(**attrs):
+    """Set fields (size, cache, error, ...) on the active span, if any."""
+    current = _active.get()
+    if current is not None:
+        current.set(**attrs)
+
+
+class Trace:
+    """The spans of one traced run. Spans may keep arriving after it ends (e.g. a streamed report)."""
+
+    def __init__(self, name, tracer=None, **attrs):
+        self.name = name
+        self.tracer = tracer
+        self.started_at = pd.Timestamp.now()
+        self.root = Span(self, name, "trace", attrs=attrs)
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self.root.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return self.root.__exit__(exc_type, exc, tb)
+
+    def _finish(self, finished):
+        with self._lock:
+            self.spans.append(finished)
+        if self.tracer is not None:
+            self.tracer._observe(finished, finished is self.root)
+
+    @property
+    def duration(self):
+        return self.root.duration
+
+    def records(self):
+        """Finished spans as dicts, in start order, with offsets from the start of the trace."""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start)
+        return [s.to_dict(self.root.start) for s in spans]
+
+    def frame(self):
+        """Finished spans as a DataFrame with each span's depth below the root."""
+        df = pd.DataFrame(self.records(), columns=SPAN_FIELDS)
+        parents = dict(zip(df["id"], df["parent"]))
+        depth = []
+        for parent in df["parent"]:
+            d = 0
+            while parent is not None and not pd.isna(parent):
+                d += 1
+                parent = parents.get(parent)
+            depth.append(d)
+        df["depth"] = depth
+        return df
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": None if self.duration is None else round(self.duration * 1000, 3),
+            "attrs": {k: str(v) for k, v in self.root.attrs.items()},
+            "spans": self.records(),
+        }
+
+    def to_json(self, indent=1):
+        return json.dumps(self.to_dict(), indent=indent, default=str)
+
+
+def _label_value(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class Tracer:
+    """
+    Process-wide collector: the most recent `keep` traces plus running totals per
+    (span name, kind) for Prometheus. With `textfile` set (env TRACING_TEXTFILE), the
+    totals are rewritten there after each trace, for node_exporter's textfile collector.
+    """
+
+    def __init__(self, enabled=True, keep=20, textfile=None):
+        self.enabled = enabled
+        self.textfile = textfile if textfile is not None else os.environ.get("TRACING_TEXTFILE")
+        self._traces = deque(maxlen=keep)
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def trace(self, name, enabled=True, **attrs):
+        """A new Trace to use as a context manager, or NULL_SPAN when tracing is off."""
+        if not (self.enabled and enabled):
+            return NULL_SPAN
+        trace = Trace(name, self, **attrs)
+        with self._lock:
+            self._traces.append(trace)
+        return trace
+
+    def traces(self):
+        """Recent traces, newest first."""
+        with self._lock:
+            return list(reversed(self._traces))
+
+    def _observe(self, finished, is_root):
+        key = (finished.name, finished.kind)
+        with self._lock:
+            totals = self._totals.get(key)
+            if totals is None:
+                totals = self._totals[key] = {"count": 0, "seconds": 0.0, "errors": 0, "bytes": 0, "cache": {}}
+            totals["count"] += 1
+            totals["seconds"] += finished.duration
+            totals["errors"] += finished.error is not None
+            totals["bytes"] += finished.size or 0
+            if finished.cache is not None:
+                totals["cache"][finished.cache] = totals["cache"].get(finished.cache, 0) + 1
+        if is_root and self.textfile:
+            from price_store import _atomic_write
+
+            def write(path):
+                with open(path, "w") as f:
+                    f.write(self.prometheus())
+
+            try:
+                _atomic_write(self.textfile, write)
+            except OSError:
+                pass
+
+    def totals(self):
+        """Count, total/mean time, errors, bytes and cache results per (name, kind)."""
+        with self._lock:
+            rows = [{"name": name, "kind": kind, "count": t["count"], "total_s": t["seconds"],
+                     "mean_ms": 1000 * t["seconds"] / t["count"], "errors": t["errors"], "bytes": t["bytes"],
+                     **{f"cache_{k}": v for k, v in t["cache"].items()}}
+                    for (name, kind), t in self._totals.items()]
+        return pd.DataFrame(rows)
+
+    def prometheus(self, prefix="trading_bot"):
+        """The totals in Prometheus text exposition format."""
+        with self._lock:
+            totals = {key: dict(t, cache=dict(t["cache"])) for key, t in sorted(self._totals.items())}
+        lines = [
+            f"# HELP {prefix}_span_duration_seconds Time spent in traced spans.",
+            f"# TYPE {prefix}_span_duration_seconds summary",
+        ]
+        for (name, kind), t in totals.items():
+            labels = f'name="{_label_value(name)}",kind="{_label_value(kind)}"'
+            lines.append(f"{prefix}_span_duration_seconds_sum{{{labels}}} {t['seconds']:.6f}")
+            lines.append(f"{prefix}_span_duration_seconds_count{{{labels}}} {t['count']}")
+        for metric, field, text in (("span_errors_total", "errors", "Traced spans that raised."),
+                                    ("span_payload_bytes_total", "bytes", "Payload bytes returned by spans.")):
+            lines += [f"# HELP {prefix}_{metric} {text}", f"# TYPE {prefix}_{metric} counter"]
+            for (name, kind), t in totals.items():
+                labels = f'name="{_label_value(name)}",kind="{_label_value(kind)}"'
+                lines.append(f"{prefix}_{metric}{{{labels}}} {t[field]}")
+        lines += [f"# HELP {prefix}_span_cache_total Cache results of traced lookups.",
+                  f"# TYPE {prefix}_span_cache_total counter"]
+        for (name, kind), t in totals.items():
+            for result, count in sorted(t["cache"].items()):
+                labels = f'name="{_label_value(name)}",kind="{_label_value(kind)}",result="{_label_value(result)}"'
+                lines.append(f"{prefix}_span_cache_total{{{labels}}} {count}")
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        with self._lock:
+            self._traces.clear()
+            self._totals.clear()
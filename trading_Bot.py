@@ -4,15 +4,40 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import yfinance as yf
-import pandas_ta as ta
 import datetime
 import plotly.graph_objects as go
 import google.generativeai as genai
-from nsepython import option_chain
+import os
 import re
+import threading
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from ai_cache import ResponseCache, generate_cached, genai_model_factory, stream_cached
+from ai_stream import ReportStream
+from backtest_engine import fingerprint
+from data_hub import build_hub
+from downsample import DEFAULT_POINTS, chart_frame, downsample_columns, visible_window
+from engine import Engine, EngineConfig, backtest_frame, run_universe
+from feature_store import FeatureStore
+from greeks import chain_greeks, expiry_summary, iv_smile, iv_surface
+from india_vix import VixHistory, india_vix
+from live import LiveHub, yf_previous_close
+from monte_carlo import (DEFAULT_PATHS, MODELS, STRATEGIES, VOL_SOURCES, chain_quotes, log_returns,
+                         realized_vol, run_simulation)
+from option_chain import (ChainFeed, SnapshotStore, max_pain, oi_buildup,
+                          pcr_by_expiry, pcr_by_strike_band, total_pcr)
+from optimizer import DEFAULT_GRID, grid_sets, heatmap_table, optimize, random_sets, walk_forward
+from pipeline import Stage, run_stages
+from portfolio import WEIGHTINGS, backtest_universe
+from price_store import PriceStore
+from signal_engine import column_values, signal_codes
+from timeframes import INTERVALS, TIMEFRAMES
+from tracing import Trace, Tracer, span
+from transport import FetchResult, Transport
+from screener import scan_universe
+from universe import full_universe, nse_indices, nse_indices_exp, nse_largecaps
 # default_expiry = datetime.datetime.today
 
-@st.cache_data  # Cache the data
+@st.cache_data(ttl=60)  # Cache the data for a minute; live mode streams instead
 def get_price_and_delta(symbol):
     """
     Fetches the last traded price and the delta (change from previous close).
@@ -20,31 +45,30 @@ def get_price_and_delta(symbol):
         (float, float): A tuple of (current_price, delta)
     """
     try:
-        ticker = yf.Ticker(symbol)
-        
-        # 1. Get 2 days of *daily* data to find the previous close
-        # data_hist.iloc[0] will be yesterday's close
-        data_hist = ticker.history(period="2d", interval="1d")
-        
+        hub = get_data_hub()
+
+        # 1. Previous session's close from daily bars
+        previous_close = yf_previous_close(symbol, hub.history)
+
         # 2. Get 1 day of *live* 1-minute data to find the current price
-        data_live = ticker.history(period="1d", interval="1m")
+        live = hub.intraday_result(symbol)
+        if live.status == "stale":
+            st.warning(f"⚠️ Live price unavailable ({live.error}); showing bars fetched {live.age:.0f}s ago.")
+        data_live = live.value if live.usable else pd.DataFrame()
 
         # Check if we got data (e.g., market might be closed)
-        if data_hist.empty or data_live.empty:
+        if np.isnan(previous_close) or data_live.empty:
             st.warning(f"Could not fetch live data for {symbol} (market likely closed).")
             # Fallback: return the last *daily* close and a 0 delta
-            if not data_hist.empty:
-                return data_hist['Close'].iloc[-1], 0.0
+            if not np.isnan(previous_close):
+                return previous_close, 0.0
             else:
                 return 0.0, 0.0 # Complete failure
 
         # --- Calculate ---
         
         # Get the *absolute last traded price* from 1-min data
-        current_price = data_live['Close'].iloc[-1]
-        
-        # Get the *previous day's close* from daily data
-        previous_close = data_hist['Close'].iloc[0]
+        current_price = float(np.ravel(data_live['Close'].to_numpy())[-1])
         
         delta = current_price - previous_close
         
@@ -72,9 +96,26 @@ if "config" not in st.session_state:
         "today_date": datetime.date.today() ,
         "model_sentiment": "gemini-pro-latest",
         # "model_sentiment": {print(Symbol.get_name)},
-        "model_signals": "gemini-flash-latest"
+        "model_signals": "gemini-flash-latest",
+        "stream_report": True,
+        "point_in_time_features": True,
+        "live_refresh_seconds": 15,
+        "tracing": True,
+        "chart_points": DEFAULT_POINTS,
+        "interval": "1d",
+        "timeframe": None,
+        "confirm_timeframe": None,
+        "mc_model": "gbm",
+        "mc_vol_source": "iv",
+        "mc_paths": DEFAULT_PATHS,
+        "mc_lookback": 60,
+        "mc_flat_band": 0.5,
     }
 
+# Per-stage timeouts (seconds) for the Run Analysis pipeline
+STAGE_TIMEOUTS = {"price": 30, "ai": 30, "vix": 30, "pcr": 20, "simulation": 30, "report": 120}
+REPORT_UNAVAILABLE = "Detailed AI report unavailable due to an error."
+
 
 if "data" not in st.session_state:
     st.session_state.data = None
@@ -88,17 +129,16 @@ st.markdown("""
 <style>
 body { background: linear-gradient(145deg,#0e1117 0%,#131722 100%); color:#e0e0e0; font-family:'Poppins',sans-serif; }
 [data-testid="stSidebar"] { background-color:#E5E7EB; }
-.stTabs [role="tablist"] { border-bottom:1px solid #222; }
-.stTabs [role="tab"] { background-color:transparent; color:#aaa; font-weight:600; }
-.stTabs [aria-selected="true"] { color:#00b386; border-bottom:3px solid #00b386; }
+.st-key-active_view { border-bottom:1px solid #222; padding-bottom:0.3rem; }
+.st-key-active_view label p { color:#aaa; font-weight:600; }
 .stButton>button { background-color:#00b386; color:white; border:none; border-radius:10px; padding:0.5rem 1rem; font-weight:600; }
 .stButton>button:hover { background-color:#01d095; }
 div[data-testid="stMetricValue"] { font-size:1.4rem; color:#00b386; }
 [data-testid="stMetricLabel"] { color:#aaa; }
 hr { border:0.5px solid #222; }
-/* Style for AI report in tab3 */
-.stTabs [data-testid="stMarkdownContainer"] h3 { color: #00b386; margin-top: 20px; }
-.stTabs [data-testid="stMarkdownContainer"] strong { color: #01d095; }
+/* Style for the AI report (and the other views) */
+.st-key-view_body [data-testid="stMarkdownContainer"] h3 { color: #00b386; margin-top: 20px; }
+.st-key-view_body [data-testid="stMarkdownContainer"] strong { color: #01d095; }
 </style>
 """, unsafe_allow_html=True)
 
@@ -116,26 +156,43 @@ def configure_genai():
         st.error(f"🚨 Failed to configure Gemini API: {e}")
         return False
 
+# ---------------- AI RESPONSE CACHE ----------------
+@st.cache_resource
+def get_ai_cache():
+    """One disk-backed Gemini response cache shared by every session."""
+    return ResponseCache()
+
+def generate_ai_text(kind, model_name, prompt, **key_config):
+    """Call Gemini through the shared cache. Tests can set session_state.ai_model_factory to a stub."""
+    return generate_cached(
+        get_ai_cache(), kind, model_name, prompt, key_config,
+        force_refresh=st.session_state.get("force_ai_refresh", False),
+        model_factory=st.session_state.get("ai_model_factory", genai_model_factory),
+    )
+
 # ---------------- AI FUNCTIONS ----------------
 def ai_sentiment_score(symbol_name):
-    """Get AI-based sentiment score (0-100) using Gemini Pro."""
+    """
+    Get AI-based sentiment score (0-100) using Gemini Pro. Raises on a failed call or a
+    reply without a number, so the "ai" stage falls back to 50 and nothing is recorded.
+    """
     try:
         model_name = st.session_state.config["model_sentiment"]
-        model = genai.GenerativeModel(model_name)
         prompt = (
             f"Rate the investor sentiment for {symbol_name} in the Indian stock market between 0 and 100. "
             f"0 means very bearish, 100 means very bullish. Only output the number."
         )
-        resp = model.generate_content(prompt)
-        score = int(''.join(filter(str.isdigit, resp.text or '50')) or 50)
-        return max(0, min(score, 100))
+        text = generate_ai_text("sentiment", model_name, prompt, day=datetime.date.today())
+        digits = ''.join(filter(str.isdigit, text or ''))
+        if not digits:
+            raise ValueError(f"no score in the response {text!r}")
+        return max(0, min(int(digits), 100))
     except Exception as e:
-        st.warning(f"⚠️ Gemini sentiment error: {e}")
-        return 50
+        st.warning(f"⚠️ Gemini sentiment error: {e}; using a neutral 50.")
+        raise
 
-def get_ai_detailed_report(symbol_name, current_price):
-    """Get AI-based detailed financial report using the user's complex prompt."""
-    
+def build_report_prompt(symbol_name, current_price, options_context="", technical_context="", probability_context=""):
+    """Build the detailed-report prompt from the price, configured dates and chain/weekly-chart/simulation numbers."""
     price_scalar = current_price
     if isinstance(current_price, pd.Series):
         price_scalar = current_price.iloc[0]
@@ -151,6 +208,9 @@ def get_ai_detailed_report(symbol_name, current_price):
     prompt = f"""
     You are an expert financial analyst specializing in the Indian equity and derivatives markets, especially {symbol_name} options. 
     Now the {symbol_name} index stands at "{price_str}". 
+    {options_context}
+    {technical_context}
+    {probability_context}
     
     Before producing the report, perform a deep search using available tools (e.g., web searches, X (Twitter) searches for real-time sentiment, browsing financial websites for charts/data/news, and any other relevant sources) to gather the latest technical indicators, fundamental data, macroeconomic releases, FII/DII flows, sectoral news, RBI updates, geopolitical events, and option chain details (including Greeks and implied volatility). Use this deep search to inform a comprehensive analysis.
 
@@ -192,28 +252,45 @@ def get_ai_detailed_report(symbol_name, current_price):
     
     Format the entire response clearly using Markdown headings, bullet points, and bold text.
     """
-    
+    return prompt
+
+def get_ai_detailed_report(symbol_name, current_price, options_context="", technical_context="",
+                           probability_context=""):
+    """Get AI-based detailed financial report using the user's complex prompt."""
+    prompt = build_report_prompt(symbol_name, current_price, options_context, technical_context, probability_context)
     try:
         model_name = st.session_state.config["model_sentiment"]
-        model = genai.GenerativeModel(model_name)
-        resp = model.generate_content(prompt)
-        return resp.text.strip()
+        text = generate_ai_text("report", model_name, prompt,
+                                expiry=st.session_state.config["expiry_date"],
+                                today=st.session_state.config["today_date"])
+        return text.strip()
     except Exception as e:
         st.warning(f"⚠️ Gemini report error: {e}")
-        return "Detailed AI report unavailable due to an error."
+        return REPORT_UNAVAILABLE
+
+def start_ai_report_stream(symbol_name, current_price, options_context="", technical_context="",
+                           probability_context=""):
+    """Start streaming the detailed report in the background and return its ReportStream."""
+    prompt = build_report_prompt(symbol_name, current_price, options_context, technical_context, probability_context)
+    chunks = stream_cached(
+        get_ai_cache(), "report", st.session_state.config["model_sentiment"], prompt,
+        {"expiry": st.session_state.config["expiry_date"], "today": st.session_state.config["today_date"]},
+        force_refresh=st.session_state.get("force_ai_refresh", False),
+        model_factory=st.session_state.get("ai_model_factory", genai_model_factory),
+    )
+    return ReportStream(chunks, fallback_text=REPORT_UNAVAILABLE)
 
 
 def ai_vix_estimate():
-    """Estimate India VIX using Gemini Flash when real data unavailable."""
+    """Estimate India VIX using Gemini Flash when the option chain is unavailable."""
     try:
         model_name = st.session_state.config["model_signals"]
-        model = genai.GenerativeModel(model_name)
         prompt = (
             "Give the current estimated India VIX (Volatility Index) value as a number only. "
             "If unavailable, estimate based on recent Indian market volatility."
         )
-        resp = model.generate_content(prompt)
-        match = re.search(r"\d+(\.\d+)?", resp.text or "")
+        text = generate_ai_text("vix", model_name, prompt, day=datetime.date.today())
+        match = re.search(r"\d+(\.\d+)?", text or "")
         if match:
             return float(match.group())
         else:
@@ -224,117 +301,173 @@ def ai_vix_estimate():
         return np.nan
 
 # ---------------- MARKET DATA ----------------
+@st.cache_resource
+def get_data_hub():
+    """
+    Every Yahoo/NSE request of every session goes through this one hub: identical
+    requests are coalesced, and the transport under it pools connections, rate limits,
+    retries and trips a circuit breaker per upstream, process-wide.
+    """
+    # MARKET_DATA_OFFLINE=1 swaps in synthetic bars; OPTION_CHAIN_RECORDING points at
+    # recorded NSE JSON to run without NSE
+    return build_hub(get_transport(), offline=bool(os.environ.get("MARKET_DATA_OFFLINE")),
+                     chain_recording=os.environ.get("OPTION_CHAIN_RECORDING"))
+
+@st.cache_resource
+def get_transport():
+    """Pooled sessions, rate limits, retries and circuit breakers for Yahoo and NSE."""
+    return Transport()
+
+@st.cache_resource
+def get_tracer():
+    """Recent Run Analysis traces and per-span totals, process-wide (see the Diagnostics tab)."""
+    return Tracer()
+
+def note_status(name, result):
+    """Remember whether an input was fresh, stale or missing (shown next to its metric)."""
+    st.session_state.setdefault("data_status", {})[name] = FetchResult(None, result.status, result.error, result.age)
+
+@st.cache_resource
+def get_price_store():
+    """One on-disk OHLCV store shared by every session of this process."""
+    return PriceStore(downloader=get_data_hub().history)
+
 def fetch_price(symbol, start, end):
+    # Cached bars come from disk; only missing ranges go to Yahoo Finance
+    result = get_engine(start, end).fetch(symbol)
+    note_status("price", result)
+    if not result.usable:
+        st.warning(f"⚠️ No price data received from Yahoo Finance ({result.error}).")
+        return pd.DataFrame()
+    if result.status == "stale":
+        st.warning(f"⚠️ Price fetch error ({result.error}); using cached bars up to "
+                   f"{pd.Timestamp(result.value['Date'].iloc[-1]):%Y-%m-%d}.")
+    return result.value
+
+@st.cache_resource
+def get_live_hub():
+    """Intraday 1-minute bar poller shared by every session (one thread, one ring buffer per symbol)."""
+    hub = get_data_hub()
+    # Seed with a few sessions so the indicators are warmed up at the open
+    return LiveHub(source=hub.intraday, seed_source=lambda symbol: hub.intraday(symbol, period="5d"),
+                   previous_close=lambda symbol: yf_previous_close(symbol, hub.history))
+
+@st.cache_resource
+def get_chain_feed():
+    """Parsed option chains shared across sessions, re-fetched at most once a minute."""
+    return ChainFeed(get_data_hub().option_chain, SnapshotStore(), ttl=60)
+
+@st.cache_resource
+def get_vix_history():
+    """India VIX values computed from past chain snapshots (for per-date backtests)."""
+    return VixHistory()
+
+def fetch_chain(symbol):
+    """The option chain as a FetchResult: fresh, the last parsed chain (stale) or missing."""
+    feed = get_chain_feed()
     try:
-        df = yf.download(symbol, start=start, end=end)
-        if df is None or df.empty:
-            st.warning("⚠️ No price data received from Yahoo Finance.")
-            return pd.DataFrame()
-        df.reset_index(inplace=True)
-        return df
+        return FetchResult(feed.get(symbol), "ok")
     except Exception as e:
-        st.warning(f"⚠️ Price fetch error: {e}")
-        return pd.DataFrame()
+        chain = feed.peek(symbol)
+        if chain is None:
+            return FetchResult(None, "missing", e)
+        return FetchResult(chain, "stale", e, (pd.Timestamp.now() - chain.timestamp).total_seconds())
+
+def fetch_india_vix():
+    """India VIX computed from the NIFTY option chain; the Gemini estimate is a last resort."""
+    chain = fetch_chain("NIFTY")
+    try:
+        if not chain.usable:
+            raise chain.error
+        result = india_vix(chain.value)
+        if chain.ok:
+            get_vix_history().append(result)
+        st.session_state.vix_source = "NSE chain"
+        note_status("vix", chain)
+        return round(float(result["VIX"]), 2)
+    except Exception as e:
+        st.warning(f"⚠️ Could not compute India VIX from the option chain ({e}); using the AI estimate.")
+        st.session_state.vix_source = "AI estimate"
+        vix = ai_vix_estimate()
+        note_status("vix", FetchResult(vix, "missing" if np.isnan(vix) else "ok", e))
+        return vix
 
 def fetch_pcr(symbol="NIFTY"):
-    """Fetch PCR with full safety."""
+    """PCR from the parsed option chain."""
+    chain = fetch_chain(symbol)
+    note_status("pcr", chain)
+    if not chain.usable:
+        st.warning(f"⚠️ PCR fetch error for {symbol}: {chain.error}")
+        return np.nan
+    if chain.status == "stale":
+        st.warning(f"⚠️ PCR fetch error for {symbol} ({chain.error}); using the chain from "
+                   f"{chain.value.timestamp:%d-%b %H:%M}.")
     try:
-        data = option_chain(symbol)
-        if not data or "records" not in data or "data" not in data["records"]:
-            st.warning(f"⚠️ Invalid PCR data from NSE for {symbol}.")
-            return np.nan
-        records = data["records"]["data"]
-        ce_oi = sum(row["CE"]["openInterest"] for row in records if "CE" in row)
-        pe_oi = sum(row["PE"]["openInterest"] for row in records if "PE" in row)
-        return round(pe_oi / ce_oi, 2) if ce_oi > 0 else np.nan
-    except Exception as e:
-        st.warning(f"⚠️ PCR fetch error for {symbol}: {e}")
+        return total_pcr(chain.value)
+    except ValueError:
+        st.warning(f"⚠️ Invalid PCR data from NSE for {symbol}.")
+        note_status("pcr", FetchResult(None, "missing", "invalid PCR data"))
         return np.nan
 
-# ---------------- INDICATORS ----------------
-def add_indicators(df):
-    if df.empty:
-        return df
-    df["EMA20"] = ta.ema(df["Close"], length=20)
-    df["RSI"] = ta.rsi(df["Close"], length=14)
-    adx = ta.adx(df["High"], df["Low"], df["Close"], length=14)
-    df["ADX"] = adx["ADX_14"] if adx is not None and "ADX_14" in adx else np.nan
-    return df
-
-# ---------------- SIGNAL ENGINE ----------------
-def signal_logic(df, ai, vix, pcr):
-    if df.empty:
-        return df
-    
-    required_cols = ["Close", "EMA20", "RSI", "ADX"]
-    for col in required_cols:
-        if col not in df.columns:
-            st.error(f"Missing column: {col}. Cannot generate signals.")
-            return df
-
-    df = df.copy() # Operate on a copy
-    df["signal"] = "HOLD"
-    
-    ai_t = st.session_state.config["ai_threshold"]
-    vix_t = st.session_state.config["vix_threshold"]
-    pcr_t = st.session_state.config["pcr_threshold"]
-
-    # Clean NaNs or None from indicators
-    df["EMA20"] = df["EMA20"].fillna(method="bfill").fillna(method="ffill")
-    df["RSI"] = df["RSI"].fillna(50)  # Neutral RSI
-    df["ADX"] = df["ADX"].fillna(20)  # Neutral ADX
-
-    # Handle NaNs in external factors
-    ai = ai if not np.isnan(ai) else 50
-    vix = vix if not np.isnan(vix) else 15 # Neutral VIX
-    pcr = pcr if not np.isnan(pcr) else 1.0 # Neutral PCR
-
-    for i in range(1, len(df)):
-        try:
-            close = float(df["Close"].iloc[i])
-            ema = float(df["EMA20"].iloc[i])
-            rsi = float(df["RSI"].iloc[i])
-            adx = float(df["ADX"].iloc[i])
-        except (ValueError, TypeError):
-            continue  # Skip invalid rows
-
-        buy = (
-            (close > ema)
-            and (rsi > 55)
-            and (adx > 20)
-            and (ai > ai_t + 5) # e.g., > 55
-            and (pcr > pcr_t)   # e.g., > 1.0
-            and (vix < vix_t)   # e.g., < 17
-        )
-        sell = (
-            (close < ema)
-            and (rsi < 45)
-            and (adx > 20)
-            and (ai < ai_t - 5) # e.g., < 45
-            and (pcr < pcr_t)   # e.g., < 1.0
-            and (vix > vix_t)   # e.g., > 17
-        )
+@st.cache_resource
+def get_feature_store():
+    """Recorded AI sentiment / VIX / PCR per symbol, shared by every session."""
+    return FeatureStore()
 
-        if buy:
-            df.at[df.index[i], "signal"] = "BUY"
-        elif sell:
-            df.at[df.index[i], "signal"] = "SELL"
+def record_features(symbol, results):
+    """Store this run's AI/VIX/PCR for `symbol`; failed stages are left unrecorded."""
+    values = {name: results[name].value if results[name].ok else None for name in ("ai", "vix", "pcr")}
+    try:
+        get_feature_store().record(symbol, **values)
+    except OSError as e:
+        st.warning(f"⚠️ Could not record features for {symbol}: {e}")
+
+# ---------------- ANALYSIS ENGINE ----------------
+def engine_config(start, end):
+    """The session's settings as an EngineConfig (the batch runner reads the same keys from JSON)."""
+    config = st.session_state.config
+    return EngineConfig(
+        start=start, end=end,
+        thresholds={name: config[name] for name in ("ai_threshold", "vix_threshold", "pcr_threshold")},
+        point_in_time_features=config.get("point_in_time_features", True),
+        interval=config.get("interval", "1d"),
+        timeframe=config.get("timeframe"),
+        confirm_timeframe=config.get("confirm_timeframe"),
+    )
 
-    return df
+def get_engine(start, end):
+    """The shared stores plus this session's incremental indicator cache."""
+    return Engine(
+        engine_config(start, end),
+        store=get_price_store(),
+        feature_store=get_feature_store(),
+        state_cache=st.session_state.setdefault("indicator_cache", {}),
+        warn=lambda message: st.warning(f"⚠️ {message}"),
+        timeframe_cache=st.session_state.setdefault("timeframe_cache", {}),
+    )
 
+def weekly_context(symbol, bars):
+    """Weekly RSI/ADX/EMA20 resampled from the fetched bars, as a line for the report prompt."""
+    engine = get_engine(start, end)
+    try:
+        weekly = engine.indicators(symbol, engine.resample(symbol, bars, "1wk"), "1wk")
+    except ValueError:
+        return ""
+    if weekly.empty or np.isnan(weekly["RSI"].iloc[-1]):
+        return ""
+    last = weekly.iloc[-1]
+    if np.isnan(last["EMA20"]):
+        trend = "the 20-week EMA is not formed yet"
+    else:
+        trend = f"the close is {'above' if last['Close'] > last['EMA20'] else 'below'} the 20-week EMA ({last['EMA20']:,.0f})"
+    return (f"On the weekly chart ({len(weekly)} weeks up to the week of {pd.Timestamp(last['Date']):%d %b %Y}), "
+            f"RSI(14) is {last['RSI']:.1f}, ADX(14) is {last['ADX']:.1f} and {trend}.")
 
 def backtest(df):
     """Calculates cumulative return. Does NOT modify the input df."""
     if df.empty or "Close" not in df.columns:
         return 0
-    
-    df = df.copy() # Use a copy to avoid side effects
-    
-    df["returns"] = df["Close"].pct_change()
-    df["position"] = df["signal"].shift(1).map({"BUY": 1, "SELL": -1}).fillna(0)
-    df["strategy"] = df["returns"] * df["position"]
-    
-    return (1 + df["strategy"]).cumprod().iloc[-1] - 1
+    return backtest_frame(df).total_return
 
 # ---------------- SIDEBAR ----------------
 st.sidebar.image("https://upload.wikimedia.org/wikipedia/en/f/fb/Groww_app_logo.png", width=120)
@@ -342,46 +475,6 @@ st.sidebar.title("Groww-style AI Trader 💹")
 # ---------------- SYMBOL SELECTION ----------------
 st.sidebar.header("📈 Market Selection")
 
-# Indices and Large-Cap Stock List
-nse_indices = {
-    "NIFTY 50": "^NSEI",
-    "BANK NIFTY": "^NSEBANK",
-    "SENSEX": "^BSESN",
-    "NIFTY IT": "^CNXIT",
-    "NIFTY FMCG": "^CNXFMCG",
-    "NIFTY PHARMA": "^CNXPHARMA",
-    "NIFTY AUTO": "^CNXAUTO",
-    "NIFTY METAL": "^CNXMETAL",
-}
-
-nse_indices_exp = {     
-    "NIFTY 50": "NIFTY",
-    "BANK NIFTY": "BANKNIFTY",
-    "NIFTY IT": "NIFTYIT",
-    "NIFTY PHARMA": "NIFTYPHARMA",
-}
-
-nse_largecaps = {
-    "Reliance Industries": "RELIANCE.NS",
-    "HDFC Bank": "HDFCBANK.NS",
-    "ICICI Bank": "ICICIBANK.NS",
-    "Infosys": "INFY.NS",
-    "Tata Consultancy Services": "TCS.NS",
-    "Bharti Airtel": "BHARTIARTL.NS",
-    "State Bank of India": "SBIN.NS",
-    "ITC Ltd": "ITC.NS",
-    "Larsen & Toubro": "LT.NS",
-    "Axis Bank": "AXISBANK.NS",
-    "Bajaj Finance": "BAJFINANCE.NS",
-    "Hindustan Unilever": "HINDUNILVR.NS",
-    "Kotak Mahindra Bank": "KOTAKBANK.NS",
-    "Maruti Suzuki": "MARUTI.NS",
-    "Sun Pharma": "SUNPHARMA.NS",
-    "Tata Motors": "TATAMOTORS.NS",
-    "Power Grid": "POWERGRID.NS",
-    "NTPC Ltd": "NTPC.NS",
-}
-
 # Sidebar Group Toggle
 category = st.sidebar.radio("Choose Category:", ["Indices", "Large Cap Stocks"], horizontal=True)
 
@@ -400,71 +493,522 @@ st.sidebar.caption(f"Ticker: {symbol}")
 start = st.sidebar.date_input("Start Date", datetime.date(2023, 1, 1))
 end = st.sidebar.date_input("End Date", datetime.date.today())
 
+def _attach_script_ctx():
+    """Let pipeline worker threads use st.* calls and session_state."""
+    ctx = get_script_run_ctx()
+    return lambda: add_script_run_ctx(threading.current_thread(), ctx)
+
+def chain_symbol_for(symbol_name):
+    """NSE option chain used for PCR/IV context (Bank Nifty has its own, everything else uses Nifty)."""
+    return "BANKNIFTY" if "BANK NIFTY" in symbol_name.upper() else "NIFTY"
+
+def option_chain_context(chain_symbol):
+    """IV, skew and ATM Greeks from the local option-chain engine, as prompt text ('' if unavailable)."""
+    try:
+        chain = get_chain_feed().get(chain_symbol)
+        with span("greeks", "compute"):
+            summary = expiry_summary(chain_greeks(chain)).head(2)
+    except Exception:
+        return ""
+    if summary.empty:
+        return ""
+    pain_strike, _ = max_pain(chain)
+    lines = [
+        f"Use these figures computed from the live {chain_symbol} option chain "
+        f"(as of {chain.timestamp:%d-%b-%Y %H:%M}) as the authoritative IV and Greeks:",
+        f"- Spot {chain.underlying:,.2f}, PCR {total_pcr(chain)}, max pain {pain_strike:,.0f} (nearest expiry)",
+    ]
+    for row in summary.to_dict("records"):
+        lines.append(
+            f"- Expiry {row['Expiry']:%d-%b-%Y} ({row['Days']:.1f} days): forward {row['Forward']:,.0f}, "
+            f"ATM strike {row['ATM Strike']:,.0f}, ATM IV {row['ATM IV']*100:.1f}%, "
+            f"25-delta put/call IV {row['25D Put IV']*100:.1f}%/{row['25D Call IV']*100:.1f}% "
+            f"(skew {row['Skew']*100:+.1f} pts), ATM straddle ₹{row['ATM Straddle']:,.0f}, "
+            f"ATM call delta {row['ATM Delta']:.2f}, gamma {row['ATM Gamma']:.5f}, "
+            f"vega ₹{row['ATM Vega']:.1f}/vol pt, theta ₹{row['ATM Theta']:.1f}/day"
+        )
+    return "\n    ".join(lines)
+
+# The chain only prices the simulation when its underlying is this symbol (close to its last close)
+SAME_UNDERLYING = 0.03
+
+def expiry_simulation(symbol, bars, chain_symbol):
+    """
+    Monte Carlo of the close at the configured expiry (monte_carlo.py), or None if it
+    cannot run. Spot, ATM IV and premiums come from the option chain when it is this
+    symbol's; otherwise realized volatility and Black-76 premiums are used.
+    """
+    config = st.session_state.config
+    vol_source = config.get("mc_vol_source", "iv")
+    lookback = int(config.get("mc_lookback", 60))
+    with span("monte_carlo", "compute", model=config.get("mc_model", "gbm"), paths=config.get("mc_paths")) as sp:
+        if config.get("interval", "1d") != "1d":
+            bars = get_engine(start, end).resample(symbol, bars, "1d")
+        close = column_values(bars, "Close")
+        close = close[np.isfinite(close)]
+        if not len(close):
+            return None
+        spot, now, expiry = float(close[-1]), pd.Timestamp.now(), config["expiry_date"]
+        strikes = call = put = None
+        sigma = np.nan
+        fetched = fetch_chain(chain_symbol)
+        chain = fetched.value if fetched.usable else None
+        if chain is not None and not chain.empty and abs(chain.underlying / spot - 1.0) < SAME_UNDERLYING:
+            try:
+                expiry, strikes, call, put = chain_quotes(chain, expiry)
+                spot, now = chain.underlying, chain.timestamp
+                if vol_source == "iv":
+                    summary = expiry_summary(chain_greeks(chain))
+                    sigma = summary.loc[summary["Expiry"] == expiry, "ATM IV"].mean()
+            except ValueError:
+                strikes = call = put = None
+        if not np.isfinite(sigma) or sigma <= 0:
+            # No chain IV for this symbol: fall back to the realized volatility
+            vol_source, sigma = "realized", realized_vol(close, lookback)
+        try:
+            result = run_simulation(
+                spot, expiry, now, sigma, strikes, call, put, model=config.get("mc_model", "gbm"),
+                vol_source=vol_source, returns=log_returns(close)[-lookback:],
+                paths=int(config.get("mc_paths", DEFAULT_PATHS)),
+                flat_band=config.get("mc_flat_band", 0.5) / 100,
+            )
+        except ValueError as e:
+            sp.set(error=e)
+            return None
+        sp.set(vol_source=vol_source, sigma=round(sigma, 4))
+        return result
+
+def simulation_context(result):
+    """Outcome probabilities and the best strike per strategy from the simulation, as prompt text ('' if none)."""
+    if result is None:
+        return ""
+    source = "ATM implied volatility" if result.vol_source == "iv" else "realized volatility"
+    model = "lognormal (GBM)" if result.model == "gbm" else "bootstrapped historical daily returns"
+    p = result.probabilities
+    band = result.flat_band * 100
+    lines = [
+        f"A Monte Carlo simulation ({result.paths:,} paths, {model}, {result.sigma*100:.1f}% {source}, "
+        f"{result.sessions} sessions to the {result.expiry:%d-%b-%Y} expiry) gives these expiry outcomes. "
+        f"Use them as the quantitative baseline for your probabilities and explain any adjustment:",
+        f"- Upside (close > {result.spot*(1 + result.flat_band):,.0f}, +{band:.1f}%): {p['Upside']*100:.1f}%; "
+        f"Downside (close < {result.spot*(1 - result.flat_band):,.0f}): {p['Downside']*100:.1f}%; "
+        f"Flat (within ±{band:.1f}%): {p['Flat']*100:.1f}%",
+        f"- Simulated close: 5th percentile {result.close_quantiles[0.05]:,.0f}, median "
+        f"{result.close_quantiles[0.5]:,.0f}, 95th percentile {result.close_quantiles[0.95]:,.0f}",
+    ]
+    for row in result.best().to_dict("records"):
+        strikes = " / ".join(f"{row[k]:,.0f}" for k in ("Put Strike", "Call Strike") if np.isfinite(row[k]))
+        lines.append(
+            f"- Best {row['Strategy']} ({strikes}, premium ₹{row['Premium']:,.1f}): expected P&L "
+            f"₹{row['Expected P&L']:,.1f} ({row['Return']*100:+.0f}% on premium), P(profit) "
+            f"{row['P(Profit)']*100:.0f}%"
+        )
+    return "\n    ".join(lines)
+
+def _report_stage(price, simulation=None):
+    if price.empty:
+        raise ValueError("no price data")
+    options_context = option_chain_context(chain_symbol_for(symbol_name))
+    technical_context = weekly_context(symbol, price)
+    probability_context = simulation_context(simulation)
+    if st.session_state.config.get("stream_report", True):
+        # Returns at once; the AI Insights view renders the text as it arrives
+        return start_ai_report_stream(symbol_name, price["Close"].iloc[-1], options_context, technical_context,
+                                      probability_context)
+    return get_ai_detailed_report(symbol_name, price["Close"].iloc[-1], options_context, technical_context,
+                                  probability_context)
+
+st.sidebar.toggle("📡 Live mode", key="live_mode",
+                  help="Stream 1-minute bars on the Dashboard; only the price panel refreshes.")
+
+st.sidebar.checkbox("🔄 Force fresh AI responses", key="force_ai_refresh",
+                    help="Skip the shared Gemini response cache on the next run.")
+
 if st.sidebar.button("🚀 Run Analysis"):
-    with st.spinner("Fetching data and analyzing..."):
-        
-        if not configure_genai():
-            st.stop()  
-        
-        df = fetch_price(symbol, start, end)
-        
+    if not configure_genai():
+        st.stop()
+
+    pcr_symbol = chain_symbol_for(symbol_name)
+
+    # Only the report depends on the price; everything else runs side by side
+    stages = [
+        Stage("price", lambda: fetch_price(symbol, start, end), timeout=STAGE_TIMEOUTS["price"],
+              fallback=pd.DataFrame(), label="📈 Price history"),
+        Stage("ai", lambda: ai_sentiment_score(symbol_name), timeout=STAGE_TIMEOUTS["ai"],
+              fallback=50, label="🤖 AI sentiment"),
+        Stage("vix", fetch_india_vix, timeout=STAGE_TIMEOUTS["vix"],
+              fallback=np.nan, label="🌡️ India VIX"),
+        Stage("pcr", lambda: fetch_pcr(pcr_symbol), timeout=STAGE_TIMEOUTS["pcr"],
+              fallback=np.nan, label=f"📊 PCR ({pcr_symbol})"),
+        Stage("simulation", lambda price: expiry_simulation(symbol, price, pcr_symbol) if not price.empty else None,
+              deps=["price"], timeout=STAGE_TIMEOUTS["simulation"], fallback=None, label="🎲 Expiry simulation"),
+        Stage("report", _report_stage, deps=["price", "simulation"], timeout=STAGE_TIMEOUTS["report"],
+              fallback=REPORT_UNAVAILABLE, label="🧠 AI report"),
+    ]
+
+    # Every stage and external call of this run becomes a span (🩺 Diagnostics tab)
+    trace = get_tracer().trace("run_analysis", enabled=st.session_state.config.get("tracing", True),
+                               symbol=symbol)
+    if isinstance(trace, Trace):
+        traces = st.session_state.setdefault("traces", [])
+        traces.insert(0, trace)
+        del traces[10:]
+
+    with trace, st.status("Fetching data and analyzing...", expanded=True) as status:
+        progress = st.progress(0.0)
+        finished = []
+
+        def on_stage_done(result):
+            finished.append(result)
+            icon = "✅" if result.ok else "⚠️"
+            note = "" if result.ok else f" — {result.status}, using fallback"
+            status.write(f"{icon} {result.label} ({result.elapsed:.1f}s){note}")
+            progress.progress(len(finished) / len(stages))
+
+        st.session_state.data_status = {}
+        results = run_stages(stages, on_done=on_stage_done, initializer=_attach_script_ctx())
+        for name in ("price", "vix", "pcr"):
+            if not results[name].ok:
+                # Timed out or crashed before reporting: the fallback is a missing value
+                note_status(name, FetchResult(None, "missing", results[name].error or results[name].status))
+
+        df = results["price"].value
         if df.empty:
+            status.update(label="Analysis failed", state="error")
             st.error("Failed to fetch price data. Analysis stopped.")
             st.stop()
-        
-        current_price = df["Close"].iloc[-1]
-        
-        ai_score = ai_sentiment_score(symbol_name) 
-        vix = ai_vix_estimate()
-        
-        pcr_symbol = "NIFTY"
-        if "BANK NIFTY" in symbol_name.upper():
-            pcr_symbol = "BANKNIFTY"
-        pcr = fetch_pcr(pcr_symbol)
-        
-        df = add_indicators(df)
-        df = signal_logic(df, ai_score, vix, pcr) 
-        
+
+        ai_score, vix, pcr = results["ai"].value, results["vix"].value, results["pcr"].value
+        record_features(symbol, results)
+        try:
+            df = get_engine(start, end).analyze_frame(symbol, df, ai_score, vix, pcr).frame
+        except ValueError as e:
+            status.update(label="Analysis failed", state="error")
+            st.error(f"{e}")
+            st.stop()
+
         st.session_state.data = df
+        st.session_state.chart_window = None
         st.session_state.ai, st.session_state.vix, st.session_state.pcr = ai_score, vix, pcr
-        
-        with st.spinner("🧠 Generating detailed AI report..."):
-            st.session_state.summary = get_ai_detailed_report(symbol_name, current_price)
-
-# ---------------- DASHBOARD ----------------
-tab1, tab2, tab3, tab4 = st.tabs(["📊 Dashboard", "📈 Backtest", "🧠 AI Insights", "⚙️ Setting"])
+        st.session_state.chain_symbol = pcr_symbol
+        st.session_state.simulation = results["simulation"].value
+        report = results["report"].value
+        if isinstance(report, ReportStream):
+            st.session_state.report_stream = report
+            st.session_state.summary = "Run analysis to get AI insights."
+        else:
+            st.session_state.report_stream = None
+            st.session_state.report_ttft = None
+            st.session_state.summary = report
+        status.update(label="Analysis complete", state="complete", expanded=False)
+
+# ---------------- VIEWS ----------------
+# Only the selected view is computed and rendered (st.tabs would run every tab's body
+# on every rerun); its figures and tables are memoized on a hash of their inputs.
+VIEW_NAMES = ["📊 Dashboard", "📈 Backtest", "🧠 AI Insights", "🔎 Screener", "🧾 Option Chain",
+              "🩺 Diagnostics", "⚙️ Setting"]
+
+# Initial values of view widgets that must survive switching to another view
+PERSISTENT_WIDGETS = {
+    "bt_cost_bps": 0.0, "bt_slippage_bps": 0.0, "bt_hold": False,
+    "opt_search": "Grid", "opt_samples": 2000, "opt_objective": "sharpe", "opt_folds": 0,
+    "opt_heatmap_x": list(DEFAULT_GRID)[0], "opt_heatmap_y": list(DEFAULT_GRID)[2],
+    "screener_universe": "All",
+    "pf_weighting": "equal", "pf_max_weight": 0.2, "pf_vol_lookback": 20,
+    "mc_strategy": "Long Call",
+}
 
-with tab1:
-    # Get the current price and use it as the default for a number_input
-    current_price, price_delta = get_price_and_delta(symbol)
+def keep_widget_state(defaults):
+    """
+    Streamlit drops the value of a widget that was not rendered, so hidden views would
+    reset; re-assigning the values each run keeps them (widgets take no `value=`).
+    """
+    for key, default in defaults.items():
+        st.session_state[key] = st.session_state.get(key, default)
+
+keep_widget_state(PERSISTENT_WIDGETS)
+active_view = st.radio("View", VIEW_NAMES, horizontal=True, key="active_view", label_visibility="collapsed")
+
+# ---------------- MEMOIZED FIGURES ----------------
+# Keyed on a hash of the inputs, so reruns and view switches reuse them. Chain-derived
+# values are keyed on (symbol, snapshot time); the chain object itself is not hashed.
+# Frames are keyed on `frame_key` (a hash of every row of the plotted columns) and
+# passed unhashed: Streamlit hashes only a sample of the rows of large frames, so a
+# changed last bar of a long history would otherwise serve the old chart.
+# cache_resource hands back the same objects (unpickling a Figure re-validates it),
+# so results are shared between sessions and must not be mutated.
+#
+# Long histories are downsampled to about `chart_points` points (the chart's pixel
+# width) before they reach the browser, and drawn with WebGL (Scattergl) when they
+# were, so payload and render time stay bounded however much history is loaded.
+SIGNAL_CHART_COLUMNS = ["Date", "Close", "EMA20", "signal"]
+CURVE_COLUMNS = ["Strategy Returns", "Buy & Hold Returns", "Drawdown"]
+
+def frame_key(df, columns, index=False):
+    """Content hash of the `columns` (and optionally the index) of `df`, over all rows."""
+    arrays = []
+    for values in ([df.index] if index else []) + [df[c] for c in columns]:
+        if pd.api.types.is_datetime64_any_dtype(values):
+            arrays.append(pd.DatetimeIndex(values).asi8)
+        elif pd.api.types.is_numeric_dtype(values):
+            arrays.append(np.asarray(values, dtype=np.float64))
+        else:
+            arrays.append(signal_codes(values))
+    return fingerprint(*arrays, columns=list(columns))
+
+def scatter_trace(rows, points):
+    """go.Scattergl for a series that had to be downsampled, go.Scatter (SVG) otherwise."""
+    return go.Scattergl if rows > points else go.Scatter
+
+def thinned_markers(df, markers):
+    """Caption for a chart whose BUY/SELL markers were thinned by `chart_frame` (None if none were)."""
+    total = int(np.count_nonzero(signal_codes(df["signal"]))) if "signal" in df.columns else 0
+    if len(markers) >= total:
+        return None
+    return (f"{len(markers):,} of {total:,} BUY/SELL bars marked: above the chart resolution only the "
+            f"first bar of each run of signals is marked, then at most one per bucket.")
+
+def price_traces(fig, line, markers, scatter, marker_size):
+    """Close and EMA20 lines plus BUY/SELL markers (markers come from the full-resolution rows)."""
+    fig.add_trace(scatter(x=line["Date"], y=line["Close"], name="Close", line=dict(width=2, color="#00b386")))
+    fig.add_trace(scatter(x=line["Date"], y=line["EMA20"], name="EMA20", line=dict(dash="dot", color="#888")))
+    buy = markers[markers["signal"] == "BUY"]
+    sell = markers[markers["signal"] == "SELL"]
+    fig.add_trace(scatter(x=buy["Date"], y=buy["Close"], mode="markers", name="BUY",
+                          marker_symbol="triangle-up", marker_color="#00ff99", marker_size=marker_size))
+    fig.add_trace(scatter(x=sell["Date"], y=sell["Close"], mode="markers", name="SELL",
+                          marker_symbol="triangle-down", marker_color="#ff4c4c", marker_size=marker_size))
+
+@st.cache_resource(max_entries=16, show_spinner=False)
+def signals_figure(key, _df, symbol_name, window=None, points=DEFAULT_POINTS):
+    """
+    (figure, thinned-markers caption or None) for the signals chart of the rows inside
+    `window` (all for None), downsampled to `points`; `key` is `frame_key(df)`.
+    """
+    view = visible_window(_df, window)
+    line, markers = chart_frame(view, points)
+    fig = go.Figure()
+    price_traces(fig, line, markers, scatter_trace(len(view), points), 10)
+    title = f"{symbol_name} — Trading Signals"
+    if len(view) > points:
+        title += f" ({len(line):,} of {len(view):,} bars shown)"
+    # Box select instead of zoom: the selected range is re-drawn from the full data
+    fig.update_layout(template="plotly_dark", paper_bgcolor="#0e1117", plot_bgcolor="#0e1117",
+                      title=title, xaxis_title="Date", yaxis_title="Price", dragmode="select",
+                      uirevision=f"{symbol_name}|{window}")
+    return fig, thinned_markers(view, markers)
+
+@st.cache_resource(max_entries=16, show_spinner=False)
+def backtest_figures(key, _curves, points=DEFAULT_POINTS):
+    """Strategy vs. Buy & Hold and drawdown charts of `BacktestResult.curves`; `key` is `frame_key(curves)`."""
+    scatter = scatter_trace(len(_curves), points)
+    # Min/max per bucket, so the deepest drawdown and the equity peaks survive
+    curves = downsample_columns(_curves, ["Strategy Returns", "Buy & Hold Returns", "Drawdown"], points)
+    equity = go.Figure()
+    equity.add_trace(scatter(x=curves.index, y=curves["Strategy Returns"], name="Strategy Returns",
+                             line=dict(color="#00b386")))
+    equity.add_trace(scatter(x=curves.index, y=curves["Buy & Hold Returns"], name="Buy & Hold Returns",
+                             line=dict(color="#888")))
+    equity.update_layout(template="plotly_dark", height=380, margin=dict(l=10, r=10, t=10, b=10))
+    drawdown = go.Figure(scatter(x=curves.index, y=curves["Drawdown"], name="Drawdown", fill="tozeroy",
+                                 line=dict(color="#ff4c4c")))
+    drawdown.update_layout(template="plotly_dark", height=250, margin=dict(l=10, r=10, t=10, b=10))
+    return equity, drawdown
+
+@st.cache_resource(max_entries=16, show_spinner=False)
+def optimizer_heatmap(ranked, x, y, objective):
+    table = heatmap_table(ranked, x, y, objective)
+    fig = go.Figure(go.Heatmap(
+        z=table.to_numpy(), x=[str(v) for v in table.columns], y=[str(v) for v in table.index],
+        colorscale="RdYlGn", colorbar=dict(title=objective),
+    ))
+    fig.update_layout(template="plotly_dark", height=400, xaxis_title=x, yaxis_title=y)
+    return fig
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def vix_figure(key, _vix_history, points=DEFAULT_POINTS):
+    scatter = scatter_trace(len(_vix_history), points)
+    vix_history = downsample_columns(_vix_history, ["VIX"], points)
+    fig = go.Figure(scatter(x=vix_history["Timestamp"], y=vix_history["VIX"], name="India VIX",
+                            line=dict(color="#ffcc00")))
+    fig.update_layout(template="plotly_dark", height=300, margin=dict(l=10, r=10, t=10, b=10))
+    return fig
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def chain_analytics(chain_symbol, timestamp, _chain):
+    """Greeks (one IV solve per quote), expiry summary, PCR by expiry and the IV surface of a snapshot."""
+    greeks_table = chain_greeks(_chain)
+    surface = iv_surface(greeks_table)
+    surface_fig = None
+    if surface.shape[1] > 1:
+        days = (pd.to_datetime(surface.columns) + pd.Timedelta(hours=15, minutes=30) - _chain.timestamp) / pd.Timedelta(days=1)
+        surface_fig = go.Figure(go.Surface(z=surface.to_numpy() * 100, x=days, y=surface.index,
+                                           colorscale="Viridis", colorbar=dict(title="IV %")))
+        surface_fig.update_layout(template="plotly_dark", height=420, title="IV Surface (OTM)",
+                                  scene=dict(xaxis_title="Days", yaxis_title="Strike", zaxis_title="IV (%)"))
+    return greeks_table, expiry_summary(greeks_table), pcr_by_expiry(_chain), surface_fig
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def chain_expiry_views(chain_symbol, timestamp, expiry, _chain):
+    """Max pain, the OI/pain chart, PCR by strike band and the IV smile for one expiry of a snapshot."""
+    pain_strike, pain = max_pain(_chain, expiry)
+    expiry_chain = _chain.for_expiry(expiry)
+    oi_fig = go.Figure()
+    oi_fig.add_bar(x=expiry_chain["strike"], y=expiry_chain["ce_oi"], name="CE OI", marker_color="#ff4c4c")
+    oi_fig.add_bar(x=expiry_chain["strike"], y=expiry_chain["pe_oi"], name="PE OI", marker_color="#00ff99")
+    oi_fig.add_scatter(x=pain["Strike"], y=pain["Total Pain"], name="Total Pain", yaxis="y2",
+                       line=dict(color="#ffcc00"))
+    oi_fig.add_vline(x=_chain.underlying, line_dash="dash", line_color="#aaa", annotation_text="Spot")
+    oi_fig.update_layout(template="plotly_dark", height=450, barmode="group", xaxis_title="Strike",
+                         yaxis=dict(title="Open Interest"),
+                         yaxis2=dict(title="Writer Payout", overlaying="y", side="right", showgrid=False))
+
+    greeks_table = chain_analytics(chain_symbol, timestamp, _chain)[0]
+    smile = iv_smile(greeks_table, expiry)
+    smile_fig = go.Figure()
+    for col, color in (("CE IV", "#ff4c4c"), ("PE IV", "#00ff99"), ("OTM IV", "#ffcc00")):
+        smile_fig.add_scatter(x=smile["Strike"], y=smile[col] * 100, name=col, mode="lines+markers",
+                              line=dict(color=color, width=3 if col == "OTM IV" else 1), marker=dict(size=4))
+    smile_fig.add_vline(x=_chain.underlying, line_dash="dash", line_color="#aaa")
+    smile_fig.update_layout(template="plotly_dark", height=420, title=f"IV Smile — {expiry:%d-%b-%Y}",
+                            xaxis_title="Strike", yaxis_title="IV (%)")
+    return pain_strike, oi_fig, pcr_by_strike_band(_chain, expiry=expiry), smile_fig
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def simulation_figure(key, _result):
+    """Histogram of the simulated expiry closes with the spot and the flat band; `key` is the result's id."""
+    counts, edges = _result.histogram
+    centers = 0.5 * (edges[1:] + edges[:-1])
+    share = counts / _result.paths * 100
+    lo, hi = _result.spot * (1 - _result.flat_band), _result.spot * (1 + _result.flat_band)
+    colors = np.where(centers > hi, "#00ff99", np.where(centers < lo, "#ff4c4c", "#aaaaaa"))
+    fig = go.Figure(go.Bar(x=centers, y=share, marker_color=colors, name="Paths (%)"))
+    fig.add_vrect(x0=lo, x1=hi, fillcolor="#ffcc00", opacity=0.15, line_width=0)
+    fig.add_vline(x=_result.spot, line_dash="dash", line_color="#aaa", annotation_text="Spot")
+    fig.update_layout(template="plotly_dark", height=320, bargap=0.02, margin=dict(l=10, r=10, t=30, b=10),
+                      title=f"Simulated close on {_result.expiry:%d-%b-%Y}", xaxis_title="Close",
+                      yaxis_title="Paths (%)")
+    return fig
+
+def chart_points():
+    return int(st.session_state.config.get("chart_points", DEFAULT_POINTS))
+
+def selected_window(event):
+    """(start, end) of the box dragged on the signals chart, or None."""
+    boxes = (event or {}).get("selection", {}).get("box") or []
+    if not boxes or len(boxes[0].get("x", [])) < 2:
+        return None
+    # Date axes report ISO strings; numbers are milliseconds since the epoch
+    ends = [pd.to_datetime(v, unit="ms") if isinstance(v, (int, float)) else pd.Timestamp(v)
+            for v in boxes[0]["x"][:2]]
+    return min(ends), max(ends)
+
+def live_thresholds():
+    return {name: st.session_state.config[name] for name in ("ai_threshold", "vix_threshold", "pcr_threshold")}
+
+def live_overview(symbol, symbol_name):
+    """Price metric and intraday chart from the shared ring buffer (re-run on a timer)."""
+    hub = get_live_hub()
+    series = hub.watch(symbol)
+    # The series is shared by every session; signals use this session's latest Run
+    # Analysis values (neutral before the first run)
+    df, price, delta = series.snapshot(live_thresholds(), st.session_state.ai, st.session_state.vix,
+                                       st.session_state.pcr)
+    if symbol in hub.errors:
+        st.warning(f"⚠️ Live feed error: {hub.errors[symbol]}")
+    if df.empty:
+        st.info("Waiting for intraday bars (market may be closed).")
+        return
+
+    last = df.iloc[-1]
+    m1, m2, m3, m4 = st.columns(4)
+    m1.metric(label=f"Live {symbol_name} Price", value=f"{price:,.2f}",
+              delta=f"{delta:,.2f}" if not np.isnan(delta) else None)
+    m2.metric("Live Signal", str(last["signal"]))
+    m3.metric("RSI (1m)", f"{last['RSI']:.2f}" if not np.isnan(last["RSI"]) else "N/A")
+    m4.metric("ADX (1m)", f"{last['ADX']:.2f}" if not np.isnan(last["ADX"]) else "N/A")
+
+    points = chart_points()
+    line, markers = chart_frame(df, points)
+    fig = go.Figure()
+    price_traces(fig, line, markers, scatter_trace(len(df), points), 8)
+    fig.update_layout(template="plotly_dark", paper_bgcolor="#0e1117", plot_bgcolor="#0e1117",
+                      title=f"{symbol_name} — Intraday (1m)", xaxis_title="Time", yaxis_title="Price",
+                      uirevision=symbol)
+    st.plotly_chart(fig, use_container_width=True)
+    markers_note = thinned_markers(df, markers)
+    if markers_note:
+        st.caption(markers_note)
+    updated = datetime.datetime.fromtimestamp(series.updated_at).strftime("%H:%M:%S") if series.updated_at else "-"
+    st.caption(f"{len(df)} bars buffered · last bar {last['Date']:%H:%M} · updated {updated} · "
+               f"polling every {series.interval:g}s")
+
+def dashboard_view():
     st.subheader(f"Market Overview: {symbol_name}")
-    st.metric(label= f"Current {symbol_name} Price", value=f"{current_price:,.2f}", delta=f"{price_delta:,.2f}" )
+    if st.session_state.get("live_mode"):
+        refresh = st.session_state.config.get("live_refresh_seconds", 15)
+        get_live_hub().watch(symbol, refresh)
+        st.fragment(live_overview, run_every=refresh)(symbol, symbol_name)
+    else:
+        current_price, price_delta = get_price_and_delta(symbol)
+        st.metric(label= f"Current {symbol_name} Price", value=f"{current_price:,.2f}", delta=f"{price_delta:,.2f}" )
     # Define a global date variable
     # default_expiry = get_live_nearest_expiry({symbol})
     
 
     if st.session_state.data is not None and not st.session_state.data.empty:
+        data_status = st.session_state.get("data_status", {})
+
+        def status_note(name):
+            result = data_status.get(name)
+            if result is None or result.ok:
+                return ""
+            if result.status == "stale":
+                return f" · stale {result.age / 60:.0f}m"
+            return " · missing"
+
         col1, col2, col3 = st.columns(3)
         col1.metric("AI Sentiment", f"{st.session_state.ai}/100")
-        col2.metric("India VIX (Est.)", round(st.session_state.vix,2) if not np.isnan(st.session_state.vix) else "N/A")
+        vix_source = st.session_state.get("vix_source", "AI estimate")
+        col2.metric(("India VIX" if vix_source == "NSE chain" else "India VIX (Est.)") + status_note("vix"),
+                    round(st.session_state.vix,2) if not np.isnan(st.session_state.vix) else "N/A",
+                    help=f"Source: {vix_source}")
         pcr_label = "PCR (BANKNIFTY)" if "BANK" in symbol_name.upper() else "PCR (NIFTY)"
-        col3.metric(pcr_label, st.session_state.pcr if not np.isnan(st.session_state.pcr) else "N/A")
+        col3.metric(pcr_label + status_note("pcr"),
+                    st.session_state.pcr if not np.isnan(st.session_state.pcr) else "N/A")
+        missing = [label for name, label in (("vix", "India VIX"), ("pcr", "PCR"))
+                   if getattr(data_status.get(name), "status", None) == "missing"]
+        if missing:
+            st.warning(f"⚠️ {' and '.join(missing)} unavailable: the latest signal treats "
+                       f"{'them' if len(missing) > 1 else 'it'} as neutral.")
+        if getattr(data_status.get("price"), "status", None) == "stale":
+            st.caption(f"Price history is stale (last download failed: {data_status['price'].error}).")
 
         df = st.session_state.data
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(x=df["Date"], y=df["Close"], name="Close", line=dict(width=2, color="#00b386")))
-        fig.add_trace(go.Scatter(x=df["Date"], y=df["EMA20"], name="EMA20", line=dict(dash="dot", color="#888")))
-        buy = df[df["signal"] == "BUY"]
-        sell = df[df["signal"] == "SELL"]
-        fig.add_trace(go.Scatter(x=buy["Date"], y=buy["Close"], mode="markers", name="BUY",
-                                marker_symbol="triangle-up", marker_color="#00ff99", marker_size=10))
-        fig.add_trace(go.Scatter(x=sell["Date"], y=sell["Close"], mode="markers", name="SELL",
-                                marker_symbol="triangle-down", marker_color="#ff4c4c", marker_size=10))
-        fig.update_layout(template="plotly_dark", paper_bgcolor="#0e1117", plot_bgcolor="#0e1117",
-                          title=f"{symbol_name} — Trading Signals", xaxis_title="Date", yaxis_title="Price")
-        st.plotly_chart(fig, use_container_width=True)
+        fig, markers_note = signals_figure(frame_key(df, SIGNAL_CHART_COLUMNS), df, symbol_name,
+                                           st.session_state.get("chart_window"), chart_points())
+        event = st.plotly_chart(fig, use_container_width=True, key="signals_chart", on_select="rerun",
+                                selection_mode="box")
+        if markers_note:
+            st.caption(markers_note)
+        # A new box zooms in (re-downsampled from the full data); the same box again is ignored
+        box = selected_window(event)
+        if box is not None and box != st.session_state.get("chart_box"):
+            st.session_state.chart_box = box
+            st.session_state.chart_window = box
+            st.rerun()
+        if st.session_state.get("chart_window") is not None:
+            start_at, end_at = st.session_state.chart_window
+            z1, z2 = st.columns([4, 1])
+            z1.caption(f"Zoomed to {start_at:%d-%b-%Y %H:%M} – {end_at:%d-%b-%Y %H:%M}. "
+                       "Drag a box to zoom further.")
+            if z2.button("🔍 Reset zoom", width="stretch"):
+                st.session_state.chart_window = None
+                st.rerun()
+        else:
+            st.caption("Drag a box over the chart to zoom in at full resolution.")
         
-        display_cols = ["Date", "Close", "EMA20", "RSI", "ADX", "signal"]
+        display_cols = ["Date", "Close", "EMA20", "RSI", "ADX", "Trend", "signal"]
         
         valid_display_cols = [col for col in display_cols if col in df.columns]
         df_display = df.tail(15)[valid_display_cols]
@@ -480,73 +1024,445 @@ with tab1:
     else:
         st.info("Run analysis to load dashboard.")
 
-# ----------------
-# THIS TAB CONTAINS THE FIX
-# ----------------
-with tab2:
+def backtest_view():
     if st.session_state.data is not None and not st.session_state.data.empty:
-        perf = backtest(st.session_state.data)
-        st.metric("Backtest Cumulative Return", f"{perf*100:.2f}%")
-        
-        df_strategy = st.session_state.data.copy()
-        
-        if 'Date' not in df_strategy.columns:
+        df = st.session_state.data
+
+        c1, c2, c3 = st.columns(3)
+        cost_bps = c1.slider("Transaction cost (bps per side)", 0.0, 50.0, step=0.5, key="bt_cost_bps")
+        slippage_bps = c2.slider("Slippage (bps per side)", 0.0, 50.0, step=0.5, key="bt_slippage_bps")
+        hold = c3.toggle("Hold until opposite signal", key="bt_hold",
+                         help="Off: each BUY/SELL is held for one bar, as before.")
+
+        result = backtest_frame(df, cost_bps=cost_bps, slippage_bps=slippage_bps, hold=hold)
+        m = result.metrics
+
+        st.metric("Backtest Cumulative Return", f"{m['total_return']*100:.2f}%",
+                  delta=f"{(m['total_return'] - m['buy_hold_return'])*100:.2f}% vs Buy & Hold")
+        k1, k2, k3, k4, k5 = st.columns(5)
+        k1.metric("Max Drawdown", f"{m['max_drawdown']*100:.2f}%")
+        k2.metric("Sharpe", f"{m['sharpe']:.2f}" if not np.isnan(m['sharpe']) else "N/A")
+        k3.metric("Sortino", f"{m['sortino']:.2f}" if not np.isnan(m['sortino']) else "N/A")
+        k4.metric("Win Rate", f"{m['win_rate']*100:.1f}%" if not np.isnan(m['win_rate']) else "N/A")
+        k5.metric("Trades", f"{m['trades']}", delta=f"costs {m['total_costs']*100:.2f}%", delta_color="off")
+
+        if 'Date' not in df.columns:
             st.error("Critical Error: 'Date' column is missing from data.")
         else:
-            df_strategy['Date'] = pd.to_datetime(df_strategy['Date'])
-
-            df_strategy["returns"] = df_strategy["Close"].pct_change()
-            df_strategy["position"] = df_strategy["signal"].shift(1).map({"BUY": 1, "SELL": -1}).fillna(0)
-            df_strategy["strategy"] = df_strategy["returns"] * df_strategy["position"]
-            
-            df_strategy["Strategy Returns"] = (1 + df_strategy["strategy"].fillna(0)).cumprod()
-            df_strategy["Buy & Hold Returns"] = (1 + df_strategy["returns"].fillna(0)).cumprod()
-            
+            curves = result.curves(pd.to_datetime(df["Date"]))
+            equity_fig, drawdown_fig = backtest_figures(frame_key(curves, CURVE_COLUMNS, index=True), curves,
+                                                        chart_points())
             st.subheader("Strategy vs. Buy & Hold")
-            
-            # ----------------
-            # FIX for KeyError:
-            # Set 'Date' as the index, then pass the DataFrame and *explicitly*
-            # tell line_chart which columns to use for the 'y' axis.
-            # ----------------
-            
-            df_chart = df_strategy.set_index('Date')
-            
-            # Add this debug line before the error:
-            st.write("Inspecting df_chart columns:", df_chart.columns)
-
-            if 'Date' in df_chart.columns:
-                df_chart = df_chart.set_index('Date')
-            elif 'date' in df_chart.columns: # Or check for lowercase
-                df_chart = df_chart.set_index('date')
-
-                # --- Add this code to fix your columns ---
-
-                # This flattens the MultiIndex tuples into single string names.
-                # e.g., ('Strategy Returns', '') becomes 'Strategy Returns'
-                # e.g., ('Close', '^NSEI') becomes 'Close_^NSEI'
-                df_chart.columns = ['_'.join(col).strip('_') for col in df_chart.columns.values]
-
-                # (Optional) You can uncomment this to see the new, flattened column names
-                # st.write("New columns:", df_chart.columns)
-
-                # --- Your corrected plot call ---
-
-                # Now, use the *correct* capitalized names with spaces
-                st.line_chart(df_chart, y=["Strategy Returns", "Buy & Hold Returns"])
-            
+            st.plotly_chart(equity_fig, use_container_width=True)
+            st.subheader("Drawdown")
+            st.plotly_chart(drawdown_fig, use_container_width=True)
+
+            st.subheader("Trades")
+            st.dataframe(
+                result.trades.style.format({"Return": "{:+.2%}"}),
+                hide_index=True,
+                width="stretch",
+            )
+
+        with st.expander("🧪 Optimize thresholds"):
+            st.caption("Sweeps RSI/ADX/AI/VIX/PCR thresholds over the loaded history with the "
+                       "cost and hold settings above, using the same per-bar AI/VIX/PCR as the signals.")
+            o1, o2, o3, o4 = st.columns(4)
+            search = o1.radio("Search", ["Grid", "Random"], horizontal=True, key="opt_search")
+            samples = o2.number_input("Random samples", 100, 20000, step=100, key="opt_samples",
+                                      disabled=search == "Grid")
+            objective = o3.selectbox("Objective", ["sharpe", "total_return", "max_drawdown"], key="opt_objective")
+            n_splits = o4.number_input("Walk-forward folds", 0, 10, key="opt_folds",
+                                       help="0 ranks on the full history only.")
+            if st.button("🚀 Run Optimizer"):
+                features = (
+                    column_values(df, "Close"), column_values(df, "EMA20"),
+                    column_values(df, "RSI"), column_values(df, "ADX"),
+                    column_values(df, "AI"), column_values(df, "VIX"), column_values(df, "PCR"),
+                )
+                sets = grid_sets() if search == "Grid" else random_sets(int(samples))
+                costs = dict(cost_bps=cost_bps, slippage_bps=slippage_bps, hold=hold)
+                with st.spinner(f"Evaluating {len(sets)} parameter sets..."):
+                    try:
+                        st.session_state.optimizer = {
+                            "objective": objective,
+                            "ranked": optimize(features, sets, objective, **costs),
+                            "walk_forward": walk_forward(features, sets, int(n_splits), objective=objective,
+                                                         **costs) if n_splits else None,
+                        }
+                    except Exception as e:
+                        st.error(f"Optimizer failed: {e}")
+
+            opt = st.session_state.get("optimizer")
+            if opt is not None:
+                ranked = opt["ranked"]
+                st.markdown("**Top parameter sets**")
+                st.dataframe(ranked.head(20), hide_index=True, width="stretch")
+
+                params = list(DEFAULT_GRID)
+                h1, h2 = st.columns(2)
+                x = h1.selectbox("Heatmap X", params, key="opt_heatmap_x")
+                y = h2.selectbox("Heatmap Y", params, key="opt_heatmap_y")
+                if x != y:
+                    st.plotly_chart(optimizer_heatmap(ranked, x, y, opt["objective"]), use_container_width=True)
+
+                if opt["walk_forward"] is not None:
+                    folds, summary = opt["walk_forward"]
+                    if summary.empty:
+                        st.warning("Not enough bars for the requested walk-forward folds.")
+                    else:
+                        st.markdown("**Walk-forward (out-of-sample)**")
+                        st.dataframe(summary, hide_index=True, width="stretch")
+                        with st.expander("Per-fold detail"):
+                            st.dataframe(folds, hide_index=True, width="stretch")
+
     else:
         st.info("Run analysis to backtest signals.")
 
+    st.divider()
+    portfolio_section()
+
+def portfolio_section():
+    st.subheader("📦 Portfolio Backtest (Large Caps)")
+    st.caption("Runs the strategy on every large-cap stock and trades them as one portfolio. Signals use "
+               "the AI/VIX/PCR values from the last Run Analysis (neutral if none); costs, slippage and "
+               "hold come from the backtest settings above.")
+    p1, p2, p3 = st.columns(3)
+    weighting = p1.radio("Allocation", WEIGHTINGS, horizontal=True, key="pf_weighting",
+                         format_func=lambda w: {"equal": "Equal weight", "volatility": "Volatility-scaled"}[w])
+    max_weight = p2.slider("Max weight per position", 0.05, 1.0, step=0.05, key="pf_max_weight",
+                           help="Weight above the cap stays in cash.")
+    vol_lookback = p3.number_input("Volatility lookback (bars)", 5, 250, step=5, key="pf_vol_lookback",
+                                   disabled=weighting != "volatility")
+    if st.button("📦 Run Portfolio Backtest"):
+        with st.spinner(f"Analysing {len(nse_largecaps)} symbols..."):
+            try:
+                summary, frames = run_universe(
+                    nse_largecaps, engine_config(start, end), ai=st.session_state.ai, vix=st.session_state.vix,
+                    pcr=st.session_state.pcr, workers=1, batch_downloader=get_data_hub().batch_history,
+                    store=get_price_store(),
+                )
+                # Kept so allocation changes only re-run the (millisecond) portfolio pass
+                st.session_state.portfolio_frames = frames
+            except Exception as e:
+                st.error(f"Portfolio backtest failed: {e}")
+
+    frames = st.session_state.get("portfolio_frames")
+    if not frames:
+        return
+    try:
+        result = backtest_universe(
+            frames, weighting=weighting, max_weight=max_weight, vol_lookback=int(vol_lookback),
+            cost_bps=st.session_state.bt_cost_bps, slippage_bps=st.session_state.bt_slippage_bps,
+            hold=st.session_state.bt_hold,
+        )
+    except ValueError as e:
+        st.warning(f"⚠️ {e}")
+        return
+    m = result.metrics
+    st.metric("Portfolio Return", f"{m['total_return']*100:.2f}%",
+              delta=f"{(m['total_return'] - m['buy_hold_return'])*100:.2f}% vs Equal-weight Buy & Hold")
+    k1, k2, k3, k4, k5 = st.columns(5)
+    k1.metric("Max Drawdown", f"{m['max_drawdown']*100:.2f}%")
+    k2.metric("Sharpe", f"{m['sharpe']:.2f}" if not np.isnan(m['sharpe']) else "N/A")
+    k3.metric("Avg Positions", f"{m['avg_positions']:.1f}", delta=f"exposure {m['exposure']*100:.0f}%",
+              delta_color="off")
+    k4.metric("Turnover (annual)", f"{m['turnover']:.1f}x")
+    k5.metric("Trades", f"{m['trades']}", delta=f"costs {m['total_costs']*100:.2f}%", delta_color="off")
+    curves = result.curves()
+    equity_fig, drawdown_fig = backtest_figures(frame_key(curves, CURVE_COLUMNS, index=True), curves, chart_points())
+    st.plotly_chart(equity_fig, use_container_width=True)
+    st.plotly_chart(drawdown_fig, use_container_width=True)
+    st.dataframe(
+        result.symbol_summary(), hide_index=True, width="stretch",
+        column_config={"Contribution": _number(format="percent"), "Avg Weight": _number(format="percent"),
+                       "Max Weight": _number(format="percent")},
+    )
+
+
+def _finish_report_stream(stream):
+    """Move a completed stream's text into the summary."""
+    if stream.error is not None:
+        st.warning(f"⚠️ Gemini report error: {stream.error}")
+    st.session_state.summary = stream.result()
+    st.session_state.report_ttft = stream.time_to_first_token
+    st.session_state.report_stream = None
+
+@st.fragment(run_every=0.3)
+def live_report_view():
+    """Re-render only this block while the report streams in; the stream survives reruns."""
+    stream = st.session_state.get("report_stream")
+    if stream is None:
+        return
+    if stream.done:
+        _finish_report_stream(stream)
+        st.rerun()  # full rerun so the finished report renders without polling
+    partial = stream.text
+    if partial:
+        st.caption(f"Streaming… first token after {stream.time_to_first_token:.2f}s")
+        st.markdown(partial + " ▌")
+    else:
+        st.info("🧠 Waiting for the AI report…")
 
-with tab3:
+def ai_insights_view():
     st.subheader("🧠 AI-Generated Financial Report")
-    if "summary" in st.session_state and st.session_state.summary != "Run analysis to get AI insights.":
+    stream = st.session_state.get("report_stream")
+    if stream is not None and stream.done:
+        _finish_report_stream(stream)
+        stream = None
+    if stream is not None:
+        live_report_view()
+    elif "summary" in st.session_state and st.session_state.summary != "Run analysis to get AI insights.":
+        if st.session_state.get("report_ttft") is not None:
+            st.caption(f"First token after {st.session_state.report_ttft:.2f}s")
         st.markdown(st.session_state.summary)
     else:
         st.info("Run analysis to get AI insights.")
+    st.divider()
+    simulation_section()
+
+def simulation_section():
+    st.subheader("🎲 Expiry Probabilities (Monte Carlo)")
+    result = st.session_state.get("simulation")
+    if result is None:
+        st.info("Run analysis to simulate the close at the configured expiry.")
+        return
+    source = "chain ATM IV" if result.vol_source == "iv" else "realized vol"
+    model = "GBM" if result.model == "gbm" else "bootstrap"
+    st.caption(f"{result.paths:,} {model} paths · σ {result.sigma*100:.1f}% ({source}) · "
+               f"{result.sessions} sessions to {result.expiry:%d-%b-%Y} · {result.elapsed*1000:.0f} ms. "
+               "Also given to the AI report as its probability baseline; change the model in ⚙️ Settings.")
+    p = result.probabilities
+    band = result.flat_band * 100
+    m1, m2, m3 = st.columns(3)
+    m1.metric(f"Upside (> +{band:.1f}%)", f"{p['Upside']*100:.1f}%")
+    m2.metric(f"Downside (< -{band:.1f}%)", f"{p['Downside']*100:.1f}%")
+    m3.metric(f"Flat (±{band:.1f}%)", f"{p['Flat']*100:.1f}%")
+    st.plotly_chart(simulation_figure(result.id, result), use_container_width=True)
+
+    # P&L per unit of the underlying at expiry, before costs
+    columns = {
+        "Premium": _number(format="₹%.1f"), "Expected P&L": _number(format="₹%.1f"),
+        "Return": _number(format="percent"), "P(Profit)": _number(format="percent"),
+        "P5": _number(format="₹%.1f"), "Median": _number(format="₹%.1f"), "P95": _number(format="₹%.1f"),
+        "Put Strike": _number(format="%.0f"), "Call Strike": _number(format="%.0f"),
+        "Breakeven Low": _number(format="%.0f"), "Breakeven High": _number(format="%.0f"),
+    }
+    st.markdown("**Best strike per strategy** (highest expected P&L per unit at expiry, before costs)")
+    st.dataframe(result.best(), hide_index=True, width="stretch", column_config=columns)
+    with st.expander("All strikes"):
+        strategy = st.selectbox("Strategy", STRATEGIES, key="mc_strategy")
+        table = result.strategies
+        st.dataframe(table[table["Strategy"] == strategy], hide_index=True, width="stretch",
+                     column_config=columns)
+
+def screener_view():
+    st.subheader("🔎 Market Screener")
+    st.caption("Scans every symbol with one batched download. Signals use the AI/VIX/PCR "
+               "values from the last Run Analysis (neutral if none).")
+    universe_choice = st.radio("Universe", ["All", "Indices", "Large Cap Stocks"], horizontal=True,
+                               key="screener_universe")
+    if st.button("🔎 Scan Universe"):
+        universe = {"All": full_universe(), "Indices": nse_indices, "Large Cap Stocks": nse_largecaps}[universe_choice]
+        with st.spinner(f"Scanning {len(universe)} symbols..."):
+            try:
+                st.session_state.screener = scan_universe(
+                    universe, start, end, get_price_store(),
+                    ai=st.session_state.ai, vix=st.session_state.vix, pcr=st.session_state.pcr,
+                    thresholds={
+                        "ai_threshold": st.session_state.config["ai_threshold"],
+                        "vix_threshold": st.session_state.config["vix_threshold"],
+                        "pcr_threshold": st.session_state.config["pcr_threshold"],
+                    },
+                    batch_downloader=get_data_hub().batch_history,
+                )
+            except Exception as e:
+                st.error(f"Screener failed: {e}")
+
+    screener = st.session_state.get("screener")
+    if screener is not None and not screener.empty:
+        st.dataframe(
+            screener.style.map(
+                lambda val: 'color: #00ff99' if val in ('BUY', 'Bullish') else ('color: #ff4c4c' if val in ('SELL', 'Bearish') else ''),
+                subset=['Signal', 'Trend'],
+            ).format(
+                {"Close": "{:,.2f}", "Change %": "{:+.2f}%", "RSI": "{:.1f}", "ADX": "{:.1f}",
+                 "EMA20": "{:,.2f}", "EMA20 Dist %": "{:+.2f}%", "Date": "{:%Y-%m-%d}"},
+                na_rep="-",
+            ),
+            hide_index=True,
+            width="stretch",
+        )
+    elif screener is not None:
+        st.warning("No data returned for the selected universe.")
+    else:
+        st.info("Click 'Scan Universe' to screen all symbols.")
+
+BUILDUP_COLORS = {"Long Buildup": "#00ff99", "Short Buildup": "#ff4c4c",
+                  "Long Unwinding": "#ffa500", "Short Covering": "#4da6ff"}
+
+# Number formats for the chain tables, applied in the browser (a Styler is formatted
+# server-side on every rerun)
+_number = st.column_config.NumberColumn
+CHAIN_COLUMNS = {
+    "Expiry": st.column_config.DateColumn(format="DD-MMM-YYYY"), "Days": _number(format="%.1f"),
+    "CE OI": _number(format="localized"), "PE OI": _number(format="localized"), "OI": _number(format="localized"),
+    "PCR": _number(format="%.2f"), "Strike": _number(format="localized"), "ATM Strike": _number(format="localized"),
+    "Forward": _number(format="%.1f"), "Price": _number(format="%.2f"),
+    "IV": _number(format="percent"), "ATM IV": _number(format="percent"), "25D Put IV": _number(format="percent"),
+    "25D Call IV": _number(format="percent"), "Skew": _number(format="percent"),
+    "ATM Straddle": _number(format="₹%.2f"), "Delta": _number(format="%.3f"), "ATM Delta": _number(format="%.3f"),
+    "Gamma": _number(format="%.5f"), "ATM Gamma": _number(format="%.5f"), "Vega": _number(format="%.2f"),
+    "ATM Vega": _number(format="%.2f"), "Theta": _number(format="%.2f"), "ATM Theta": _number(format="%.2f"),
+}
+
+def option_chain_view():
+    st.subheader("🧾 Option Chain Analytics")
+    chain_options = ["NIFTY", "BANKNIFTY"]
+    default_chain = st.session_state.get("chain_symbol", "NIFTY")
+    cc1, cc2 = st.columns([3, 1])
+    chain_symbol = cc1.radio("Underlying", chain_options, index=chain_options.index(default_chain),
+                             horizontal=True)
+    feed = get_chain_feed()
+    if cc2.button("🔄 Refresh Chain"):
+        with st.spinner(f"Fetching {chain_symbol} option chain..."):
+            try:
+                feed.get(chain_symbol, refresh=True)
+            except Exception as e:
+                st.error(f"Option chain fetch failed: {e}")
+
+    # Only show what is already fetched; opening the tab never calls NSE by itself
+    chain = feed.peek(chain_symbol)
+    if chain is None or chain.empty:
+        st.info("Run analysis or click 'Refresh Chain' to load the option chain.")
+    else:
+        expiries = [pd.Timestamp(e) for e in chain.expiries]
+        nearest = chain.nearest_expiry()
+        expiry = st.selectbox("Expiry", expiries, index=expiries.index(nearest),
+                              format_func=lambda d: d.strftime("%d-%b-%Y"))
+        greeks_table, summary, expiry_pcr, surface_fig = chain_analytics(chain_symbol, chain.timestamp, chain)
+        pain_strike, oi_fig, band_pcr, smile_fig = chain_expiry_views(chain_symbol, chain.timestamp, expiry, chain)
+
+        m1, m2, m3, m4 = st.columns(4)
+        m1.metric("Spot", f"{chain.underlying:,.2f}")
+        m2.metric("PCR (all expiries)", total_pcr(chain))
+        m3.metric("Max Pain", f"{pain_strike:,.0f}", delta=f"{pain_strike - chain.underlying:+,.0f} vs spot",
+                  delta_color="off")
+        m4.metric("Snapshot", chain.timestamp.strftime("%d-%b %H:%M"))
+
+        st.plotly_chart(oi_fig, use_container_width=True)
+
+        p1, p2 = st.columns(2)
+        p1.markdown("**PCR by Expiry**")
+        p1.dataframe(expiry_pcr, column_config=CHAIN_COLUMNS, hide_index=True, width="stretch")
+        p2.markdown("**PCR by Strike Band** (distance from spot)")
+        p2.dataframe(band_pcr, column_config=CHAIN_COLUMNS, hide_index=True, width="stretch")
+
+        st.markdown("**OI Buildup**")
+        snapshots = [t for t in feed.store.timestamps(chain_symbol) if t < chain.timestamp]
+        baseline = st.selectbox(
+            "Compare against", ["NSE day change"] + snapshots[::-1],
+            format_func=lambda t: t if isinstance(t, str) else f"Snapshot {t:%d-%b %H:%M}",
+        )
+        since = None if isinstance(baseline, str) else feed.store.load(chain_symbol, baseline)
+        st.dataframe(
+            oi_buildup(chain, expiry, since).style.map(
+                lambda val: f"color: {BUILDUP_COLORS[val]}" if val in BUILDUP_COLORS else "",
+                subset=['CE Buildup', 'PE Buildup'],
+            ).format(precision=2, na_rep="-"),
+            hide_index=True,
+            width="stretch",
+        )
+
+        st.markdown("**Implied Volatility & Greeks**")
+        st.dataframe(summary, column_config=CHAIN_COLUMNS, hide_index=True, width="stretch")
+
+        g1, g2 = st.columns(2)
+        g1.plotly_chart(smile_fig, use_container_width=True)
+        if surface_fig is not None:
+            g2.plotly_chart(surface_fig, use_container_width=True)
+        else:
+            g2.info("The IV surface needs more than one expiry.")
+
+        vix_history = get_vix_history().frame()
+        if not vix_history.empty:
+            st.markdown("**India VIX (computed from the NIFTY chain)**")
+            st.plotly_chart(vix_figure(frame_key(vix_history, ["Timestamp", "VIX"]), vix_history, chart_points()),
+                            use_container_width=True)
+
+        with st.expander("Per-strike Greeks"):
+            st.dataframe(greeks_table[greeks_table["Expiry"] == expiry].drop(columns=["Expiry"]),
+                         column_config=dict(CHAIN_COLUMNS, Days=st.column_config.NumberColumn(format="%.2f")),
+                         hide_index=True, width="stretch")
+
+SPAN_COLORS = {"stage": "#00b386", "external": "#f5a623", "transport": "#ffcf70", "cache": "#9b59b6",
+               "compute": "#4a90e2", "disk": "#95a5a6"}
+
+def trace_label(trace):
+    duration = "running" if trace.duration is None else f"{trace.duration:.2f}s"
+    return f"{trace.started_at:%H:%M:%S} · {trace.root.attrs.get('symbol', '')} · {duration}"
+
+@st.cache_resource(max_entries=16, show_spinner=False)
+def trace_waterfall(trace_id, span_count, _spans):
+    """
+    Horizontal bars from each span's start offset, nested names indented, one colour per
+    kind. Keyed on the trace and its span count (spans only ever get added).
+    """
+    spans = _spans
+    fig = go.Figure()
+    rows = [f"{'· ' * max(d - 1, 0)}{name} #{i}" for d, name, i in zip(spans["depth"], spans["name"], spans["id"])]
+    for kind in spans["kind"].unique():
+        part = spans["kind"] == kind
+        fig.add_trace(go.Bar(
+            y=[r for r, p in zip(rows, part) if p], x=spans.loc[part, "duration_ms"], base=spans.loc[part, "offset_ms"],
+            orientation="h", name=kind, marker_color=SPAN_COLORS.get(kind, "#cccccc"),
+            customdata=spans.loc[part, ["cache", "error"]].fillna("").to_numpy(),
+            hovertemplate="%{y}<br>start %{base:.1f} ms, %{x:.1f} ms<br>%{customdata[0]} %{customdata[1]}<extra></extra>",
+        ))
+    fig.update_layout(template="plotly_dark", height=max(250, 22 * len(rows) + 80), barmode="overlay",
+                      xaxis_title="ms since Run Analysis", margin=dict(l=10, r=10, t=30, b=10))
+    fig.update_yaxes(categoryorder="array", categoryarray=rows[::-1])
+    return fig
+
+def diagnostics_view():
+    st.subheader("🩺 Run Analysis Diagnostics")
+    if not st.session_state.config.get("tracing", True):
+        st.info("Tracing is off; enable it in ⚙️ Setting to record the next run.")
+    traces = st.session_state.get("traces", [])
+    if not traces:
+        st.info("Run Analysis to see where the time went: every stage, Yahoo/NSE/Gemini call and "
+                "engine step, with payload sizes and cache hits.")
+    else:
+        chosen = st.selectbox("Run", range(len(traces)), format_func=lambda i: trace_label(traces[i]))
+        trace = traces[chosen]
+        spans = trace.frame()
+        spans = spans[spans["kind"] != "trace"]
+        lookups = spans["cache"].notna()
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Total", "running" if trace.duration is None else f"{trace.duration:.2f}s")
+        c2.metric("Spans", len(spans))
+        c3.metric("Errors", int(spans["error"].notna().sum()))
+        c4.metric("Cache hits", f"{int((spans['cache'] == 'hit').sum())} / {int(lookups.sum())}")
+        if not spans.empty:
+            st.plotly_chart(trace_waterfall(trace.root.id, len(spans), spans), use_container_width=True)
+            table = spans.assign(name=["  " * max(d - 1, 0) + n for d, n in zip(spans["depth"], spans["name"])],
+                                 attrs=spans["attrs"].map(lambda a: ", ".join(f"{k}={v}" for k, v in a.items())))
+            st.dataframe(table[["name", "kind", "offset_ms", "duration_ms", "size", "cache", "error", "attrs"]],
+                         hide_index=True, width="stretch")
+        st.download_button("⬇️ Trace (JSON)", trace.to_json(), mime="application/json",
+                           file_name=f"trace_{trace.started_at:%Y%m%dT%H%M%S}.json")
+
+    st.markdown("**All traced runs in this process**")
+    tracer = get_tracer()
+    totals = tracer.totals()
+    if totals.empty:
+        st.caption("No spans recorded yet.")
+    else:
+        st.dataframe(totals.sort_values("total_s", ascending=False), hide_index=True, width="stretch")
+        st.download_button("⬇️ Metrics (Prometheus text)", tracer.prometheus(), mime="text/plain",
+                           file_name="trading_bot_metrics.prom")
 
-with tab4:
+def settings_view():
     st.subheader("⚙️ Configuration Panel")
     
     api_key = st.text_input(
@@ -570,8 +1486,80 @@ with tab4:
     st.subheader("AI Model & Date Settings")
     model_sentiment = st.text_input("Sentiment Model", st.session_state.config["model_sentiment"])
     model_signals = st.text_input("Signals/VIX Model", st.session_state.config["model_signals"])
-    
- 
+    stream_report = st.checkbox("Stream the AI report as it is generated",
+                                value=st.session_state.config.get("stream_report", True))
+    point_in_time = st.checkbox(
+        "Point-in-time AI/VIX/PCR in signals and backtests",
+        value=st.session_state.config.get("point_in_time_features", True),
+        help="Each bar uses the values recorded on or before that day (neutral before the first "
+             "record). Off: today's values are applied to every bar.",
+    )
+    tracing_on = st.checkbox(
+        "Trace Run Analysis (🩺 Diagnostics tab)", value=st.session_state.config.get("tracing", True),
+        help="Time every stage and external call of each run. Off: no spans are recorded at all.",
+    )
+    live_refresh = st.number_input(
+        "Live mode refresh interval (seconds)", min_value=5, max_value=300,
+        value=int(st.session_state.config.get("live_refresh_seconds", 15)), step=5,
+        help="How often the live poller fetches 1-minute bars and the Dashboard price panel redraws.",
+    )
+    st.subheader("Timeframes & Charts")
+    current = st.session_state.config
+    intervals = ["1d", "1h", "15m", "5m"]
+    interval = st.selectbox(
+        "Download interval", intervals, index=intervals.index(current.get("interval", "1d")),
+        help="Resolution of the bars fetched from Yahoo Finance (intraday history is limited: "
+             "730 days for 1h, 60 days for 15m/5m). Coarser timeframes are resampled from it.",
+    )
+    coarser = [tf for tf in TIMEFRAMES if INTERVALS[tf] > INTERVALS[interval]]
+    timeframe_options = ["As downloaded"] + coarser
+    timeframe = st.selectbox(
+        "Signal timeframe", timeframe_options,
+        index=timeframe_options.index(current.get("timeframe") or "As downloaded")
+        if (current.get("timeframe") or "As downloaded") in timeframe_options else 0,
+        help="Indicators, signals and the backtest run on these bars, resampled without re-downloading.",
+    )
+    signal_interval = interval if timeframe == "As downloaded" else timeframe
+    confirm_options = ["Off"] + [tf for tf in TIMEFRAMES if INTERVALS[tf] > INTERVALS[signal_interval]]
+    confirm_timeframe = st.selectbox(
+        "Confirm with higher timeframe", confirm_options,
+        index=confirm_options.index(current.get("confirm_timeframe") or "Off")
+        if (current.get("confirm_timeframe") or "Off") in confirm_options else 0,
+        help="Keep a BUY only while that timeframe's close is above its EMA20 (SELL only below), "
+             "using its last completed bar at each signal. Signals are dropped until its EMA20 "
+             "has 20 bars.",
+    )
+    chart_points_input = st.number_input(
+        "Chart resolution (points per series)", min_value=200, max_value=20000,
+        value=chart_points(), step=100,
+        help="Longer series are downsampled to this many points (LTTB for prices, min/max for "
+             "equity and drawdown) and drawn with WebGL. Past this many BUY/SELL bars, only the "
+             "first bar of each run of signals is marked (then one per bucket).",
+    )
+
+    st.subheader("Expiry Simulation (Monte Carlo)")
+    mc1, mc2 = st.columns(2)
+    mc_model = mc1.selectbox(
+        "Model", MODELS, index=MODELS.index(current.get("mc_model", "gbm")),
+        format_func=lambda m: {"gbm": "GBM (lognormal)", "bootstrap": "Bootstrap of daily returns"}[m],
+        help="Bootstrap resamples the last daily returns (keeping their fat tails and skew), "
+             "rescaled to the chosen volatility.",
+    )
+    mc_vol_source = mc2.selectbox(
+        "Volatility", VOL_SOURCES, index=VOL_SOURCES.index(current.get("mc_vol_source", "iv")),
+        format_func=lambda v: {"iv": "Option chain ATM IV", "realized": "Realized volatility"}[v],
+        help="ATM IV of the expiry from the live chain; realized volatility is used when the chain "
+             "is not this symbol's.",
+    )
+    mc3, mc4, mc5 = st.columns(3)
+    mc_paths = mc3.number_input("Paths", min_value=10_000, max_value=5_000_000, step=100_000,
+                                value=int(current.get("mc_paths", DEFAULT_PATHS)))
+    mc_lookback = mc4.number_input("History (daily returns)", min_value=20, max_value=750, step=10,
+                                   value=int(current.get("mc_lookback", 60)),
+                                   help="Returns for realized volatility and the bootstrap.")
+    mc_flat_band = mc5.number_input("Flat band (±%)", min_value=0.1, max_value=5.0, step=0.1,
+                                    value=float(current.get("mc_flat_band", 0.5)),
+                                    help="Closes within this distance of spot count as Flat.")
 
     expiry_date_input = st.date_input(
         "Expiry Date (for AI prompt)", 
@@ -583,6 +1571,27 @@ with tab4:
     )
 
 
+    st.subheader("AI Response Cache")
+    ai_cache = get_ai_cache()
+    cache_stats = ai_cache.stats()
+    st.caption(f"{ai_cache.size()} cached responses shared across sessions.")
+    if cache_stats:
+        st.dataframe(pd.DataFrame(cache_stats).T)
+    if st.button("🧹 Clear AI Cache"):
+        ai_cache.clear()
+        st.success("AI response cache cleared.")
+
+    st.subheader("Market Data Hub")
+    data_hub = get_data_hub()
+    st.caption(f"{data_hub.size()} cached upstream responses shared across sessions. "
+               "Coalesced requests joined one already in flight.")
+    st.dataframe(data_hub.stats())
+    st.caption("Per upstream: circuit state, retries, per-attempt latency and rate-limit waits.")
+    st.dataframe(get_transport().stats())
+    if st.button("🧹 Clear Market Data Cache"):
+        data_hub.clear()
+        st.success("Market data cache cleared.")
+
     if st.button("💾 Save Settings"):
         st.session_state.config.update({
             "gemini_api_key": api_key,
@@ -592,6 +1601,19 @@ with tab4:
             "pcr_threshold": pcr_t,
             "model_sentiment": model_sentiment,
             "model_signals": model_signals,
+            "stream_report": stream_report,
+            "point_in_time_features": point_in_time,
+            "live_refresh_seconds": live_refresh,
+            "tracing": tracing_on,
+            "chart_points": int(chart_points_input),
+            "interval": interval,
+            "timeframe": None if timeframe == "As downloaded" else timeframe,
+            "confirm_timeframe": None if confirm_timeframe == "Off" else confirm_timeframe,
+            "mc_model": mc_model,
+            "mc_vol_source": mc_vol_source,
+            "mc_paths": int(mc_paths),
+            "mc_lookback": int(mc_lookback),
+            "mc_flat_band": float(mc_flat_band),
             "expiry_date": expiry_date_input, 
             "today_date": today_date_input,   
         })
@@ -600,3 +1622,8 @@ with tab4:
             st.success("Settings saved! New settings will apply on the next 'Run Analysis'.")
         else:
             st.warning("Settings saved, but the API key could not be configured. Please check it.")
+
+VIEWS = dict(zip(VIEW_NAMES, [dashboard_view, backtest_view, ai_insights_view, screener_view, option_chain_view,
+                              diagnostics_view, settings_view]))
+with st.container(key="view_body"):
+    VIEWS[active_view]()
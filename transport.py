@@ -0,0 +1,406 @@
+import json
+import threading
+import time
+from collections import deque
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from tenacity import Retrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+
+import tracing
+
+# ---------------- TRANSPORT ----------------
+# The layer under the data hub: one Upstream per remote service (Yahoo, NSE) with a
+# pooled HTTP session, explicit timeouts, a token-bucket rate limit, jittered
+# exponential retry for transient errors and a circuit breaker that fails fast while
+# the service is down. Every attempt's latency is recorded so throughput and tail
+# latency can be measured (e.g. against `MockServer`).
+
+DEFAULT_TIMEOUT = 10.0  # seconds per HTTP request
+DEFAULT_LIMITS = {"yahoo": (2.0, 5), "nse": (1.0, 3)}  # (requests per second, burst)
+NSE_BASE_URL = "https://www.nseindia.com"
+NSE_INDICES = {"NIFTY", "BANKNIFTY", "FINNIFTY", "MIDCPNIFTY", "NIFTYNXT50"}
+NSE_HEADERS = {
+    "accept": "application/json,text/html;q=0.9,*/*;q=0.8",
+    "accept-language": "en-US,en;q=0.9",
+    "user-agent": ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                   "(KHTML, like Gecko) Chrome/129.0.0.0 Safari/537.36"),
+}
+
+
+class TransientError(ConnectionError):
+    """A failure worth retrying: throttling, 5xx, timeouts, a blocked or empty response."""
+
+
+class CircuitOpenError(ConnectionError):
+    """Raised without calling the upstream while its circuit breaker is open."""
+
+
+def is_transient(error):
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    # requests / curl_cffi exceptions, without importing either here
+    return type(error).__module__.split(".")[0] in ("requests", "urllib3", "curl_cffi")
+
+
+class TokenBucket:
+    """Blocking rate limiter: `rate` requests per second with bursts up to `burst`."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.waited = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take one token, sleeping until one is available. Returns the seconds waited."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1.0
+            # A negative balance is this caller's place in the queue
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            self.waited += wait
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failed calls; after `reset_timeout`
+    seconds one trial call is let through (half-open) and its outcome closes or
+    re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self.failures, self.opened_at, self._trial = 0, None, False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.failure_threshold:
+                self.opened_at, self._trial = time.monotonic(), False
+
+
+class LatencyStats:
+    """Per-attempt latencies (last `window` of them) and outcome counters."""
+
+    def __init__(self, window=2000):
+        self.latencies = deque(maxlen=window)
+        self.counts = {"calls": 0, "attempts": 0, "retries": 0, "failures": 0, "rejected": 0}
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counts[name] += n
+
+    def record(self, seconds):
+        with self._lock:
+            self.latencies.append(seconds)
+            self.counts["attempts"] += 1
+
+    def summary(self):
+        with self._lock:
+            latencies = np.array(self.latencies, dtype=np.float64)
+            counts = dict(self.counts)
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000 if len(latencies) else (np.nan,) * 3
+        elapsed = time.monotonic() - self.started
+        return {**counts, "p50 ms": p50, "p95 ms": p95, "p99 ms": p99,
+                "attempts/s": counts["attempts"] / elapsed if elapsed > 0 else np.nan}
+
+
+class Upstream:
+    """Rate limit, retry and circuit breaker around the calls to one remote service."""
+
+    def __init__(self, name, rate=2.0, burst=5, attempts=3, backoff=0.5, max_backoff=8.0,
+                 failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.stats = LatencyStats()
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def _attempt(self, fn, args, kwargs):
+        with tracing.span(self.name, "transport") as sp:
+            queued = time.perf_counter()
+            self.bucket.acquire()
+            started = time.perf_counter()
+            sp.set(rate_limit_wait_ms=round((started - queued) * 1000, 3), breaker=self.breaker.state)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.stats.record(time.perf_counter() - started)
+
+    def call(self, fn, *args, **kwargs):
+        """
+        `fn(*args, **kwargs)` with retries on transient errors. Raises CircuitOpenError
+        without calling `fn` while the breaker is open, else the last error.
+        """
+        self.stats.count("calls")
+        if not self.breaker.allow():
+            self.stats.count("rejected")
+            raise CircuitOpenError(f"{self.name} is unavailable (circuit open after repeated failures).")
+        retrying = Retrying(
+            stop=stop_after_attempt(self.attempts),
+            wait=wait_random_exponential(multiplier=self.backoff, max=self.max_backoff),
+            retry=retry_if_exception(is_transient),
+            before_sleep=lambda _: self.stats.count("retries"),
+            reraise=True,
+        )
+        try:
+            result = retrying(self._attempt, fn, args, kwargs)
+        except Exception as e:
+            self.stats.count("failures")
+            # Only outages count against the breaker; e.g. a bad symbol is an answer
+            if is_transient(e):
+                self.breaker.failure()
+            else:
+                self.breaker.success()
+            raise
+        self.breaker.success()
+        return result
+
+    def wrap(self, fn):
+        return partial(self.call, fn)
+
+    def summary(self):
+        return {"state": self.breaker.state, **self.stats.summary(),
+                "rate-limit wait (s)": round(self.bucket.waited, 2)}
+
+
+class Transport:
+    """The Upstream of every remote service, built from {name: (rate, burst)} limits."""
+
+    def __init__(self, limits=None, timeout=DEFAULT_TIMEOUT, **upstream_kwargs):
+        self.timeout = timeout
+        self.upstreams = {name: Upstream(name, rate, burst, **upstream_kwargs)
+                          for name, (rate, burst) in dict(DEFAULT_LIMITS, **(limits or {})).items()}
+
+    def wrap(self, clients, routes):
+        """Wrap {endpoint: fn} so each call goes through the Upstream `routes[endpoint]`."""
+        return {endpoint: self.upstreams[routes[endpoint]].wrap(fn) for endpoint, fn in clients.items()}
+
+    def stats(self):
+        import pandas as pd
+
+        return pd.DataFrame({name: u.summary() for name, u in self.upstreams.items()}).T
+
+
+# ---------------- POOLED CLIENTS ----------------
+def http_session(pool_size=16):
+    """A requests Session keeping up to `pool_size` connections per host alive."""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    # Retries are the Upstream's job, so the adapter never retries on its own
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class NseClient:
+    """
+    NSE option-chain API over one pooled session. NSE only answers API calls that
+    carry the cookies set by its web pages, so those are fetched once and again
+    whenever a request is refused.
+    """
+
+    def __init__(self, base_url=NSE_BASE_URL, session=None, timeout=DEFAULT_TIMEOUT):
+        self.base_url = base_url.rstrip("/")
+        self.session = session or http_session()
+        self.session.headers.update(NSE_HEADERS)
+        self.timeout = timeout
+        self._warm = False
+        self._lock = threading.Lock()
+
+    def _warm_up(self):
+        with self._lock:
+            if not self._warm:
+                self.session.get(self.base_url + "/option-chain", timeout=self.timeout)
+                self._warm = True
+
+    def get_json(self, path, params=None):
+        self._warm_up()
+        response = self.session.get(self.base_url + path, params=params, timeout=self.timeout)
+        tracing.annotate(size=len(response.content), http_status=response.status_code)
+        if response.status_code in (401, 403):
+            self._warm = False  # cookies expired: warm up again on the retry
+        if response.status_code in (401, 403, 429) or response.status_code >= 500:
+            raise TransientError(f"NSE returned HTTP {response.status_code} for {path}")
+        response.raise_for_status()
+        try:
+            data = response.json()
+        except ValueError:
+            self._warm = False
+            raise TransientError(f"NSE returned a non-JSON response for {path}") from None
+        if not data:
+            raise TransientError(f"NSE returned an empty payload for {path}")
+        return data
+
+    def option_chain(self, symbol):
+        """Same payload as `nsepython.option_chain(symbol)`."""
+        symbol = symbol.upper().replace("&", "%26")
+        kind = "indices" if symbol in NSE_INDICES else "equities"
+        return self.get_json(f"/api/option-chain-{kind}", {"symbol": symbol})
+
+
+def yahoo_session():
+    """Shared curl_cffi session for yfinance (which requires one) with pooled connections."""
+    from curl_cffi import requests as curl_requests
+
+    return curl_requests.Session(impersonate="chrome")
+
+
+def pooled_clients(timeout=DEFAULT_TIMEOUT, nse_base_url=NSE_BASE_URL):
+    """The real upstream clients ({endpoint: fn}, as `data_hub.yf_upstreams`) on pooled sessions."""
+    from live import yf_intraday_source
+    from price_store import yf_batch_downloader, yf_downloader
+
+    yahoo = yahoo_session()
+    nse = NseClient(nse_base_url, timeout=timeout)
+    return {
+        "history": partial(yf_downloader, session=yahoo, timeout=timeout),
+        "batch_history": partial(yf_batch_downloader, session=yahoo, timeout=timeout),
+        "intraday": partial(yf_intraday_source, session=yahoo, timeout=timeout),
+        "option_chain": nse.option_chain,
+    }
+
+
+# ---------------- FETCH RESULTS ----------------
+class FetchResult:
+    """
+    Outcome of a fetch: status is 'ok' (fresh), 'stale' (an older value served because
+    the upstream failed; `age` seconds old) or 'missing' (nothing usable; `error` says why).
+    """
+
+    def __init__(self, value, status, error=None, age=0.0):
+        self.value = value
+        self.status = status
+        self.error = error
+        self.age = age
+
+    @property
+    def ok(self):
+        return self.status == "ok"
+
+    @property
+    def usable(self):
+        return self.status != "missing"
+
+    def __repr__(self):
+        return f"FetchResult(status={self.status!r}, age={self.age:.0f}s, error={self.error!r})"
+
+
+# ---------------- MOCK SERVER ----------------
+class MockServer:
+    """
+    Local HTTP server for load tests: answers every GET with `payload` as JSON after
+    `latency` seconds, failing a random `error_rate` share of requests with HTTP 503.
+    Use as a context manager; `url` is its base URL (e.g. for `NseClient`).
+    """
+
+    def __init__(self, payload=None, latency=0.0, error_rate=0.0, seed=0):
+        rng = np.random.default_rng(seed)
+        body = json.dumps(payload if payload is not None else {"records": {"data": []}}).encode()
+        lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, so pooled connections are reused
+
+            def do_GET(self):
+                time.sleep(latency)
+                with lock:
+                    fail = rng.random() < error_rate
+                if fail:
+                    self.send_response(503)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def load_test(fn, requests=200, concurrency=16):
+    """
+    Call `fn()` `requests` times from `concurrency` threads. Returns throughput,
+    end-to-end latency percentiles (ms) and the error count.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    def timed(_):
+        started = time.perf_counter()
+        try:
+            fn()
+            return time.perf_counter() - started, None
+        except Exception as e:
+            return time.perf_counter() - started, e
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(timed, range(requests)))
+    elapsed = time.perf_counter() - started
+    latencies = np.array([r[0] for r in results]) * 1000
+    return {
+        "requests": requests,
+        "errors": sum(r[1] is not None for r in results),
+        "req/s": requests / elapsed,
+        "p50 ms": np.percentile(latencies, 50),
+        "p95 ms": np.percentile(latencies, 95),
+        "p99 ms": np.percentile(latencies, 99),
+    }
@@ -0,0 +1,45 @@
+# ---------------- SYMBOL UNIVERSE ----------------
+# Indices and Large-Cap Stock List (Yahoo Finance tickers)
+nse_indices = {
+    "NIFTY 50": "^NSEI",
+    "BANK NIFTY": "^NSEBANK",
+    "SENSEX": "^BSESN",
+    "NIFTY IT": "^CNXIT",
+    "NIFTY FMCG": "^CNXFMCG",
+    "NIFTY PHARMA": "^CNXPHARMA",
+    "NIFTY AUTO": "^CNXAUTO",
+    "NIFTY METAL": "^CNXMETAL",
+}
+
+nse_indices_exp = {
+    "NIFTY 50": "NIFTY",
+    "BANK NIFTY": "BANKNIFTY",
+    "NIFTY IT": "NIFTYIT",
+    "NIFTY PHARMA": "NIFTYPHARMA",
+}
+
+nse_largecaps = {
+    "Reliance Industries": "RELIANCE.NS",
+    "HDFC Bank": "HDFCBANK.NS",
+    "ICICI Bank": "ICICIBANK.NS",
+    "Infosys": "INFY.NS",
+    "Tata Consultancy Services": "TCS.NS",
+    "Bharti Airtel": "BHARTIARTL.NS",
+    "State Bank of India": "SBIN.NS",
+    "ITC Ltd": "ITC.NS",
+    "Larsen & Toubro": "LT.NS",
+    "Axis Bank": "AXISBANK.NS",
+    "Bajaj Finance": "BAJFINANCE.NS",
+    "Hindustan Unilever": "HINDUNILVR.NS",
+    "Kotak Mahindra Bank": "KOTAKBANK.NS",
+    "Maruti Suzuki": "MARUTI.NS",
+    "Sun Pharma": "SUNPHARMA.NS",
+    "Tata Motors": "TATAMOTORS.NS",
+    "Power Grid": "POWERGRID.NS",
+    "NTPC Ltd": "NTPC.NS",
+}
+
+
+def full_universe():
+    """Every index and large-cap stock as one {name: ticker} dict."""
+    return {**nse_indices, **nse_largecaps}